@@ -0,0 +1 @@
+"""Offline micro-benchmark suite of the Accurate Solar Forecast integration (``python -m benchmarks``)."""
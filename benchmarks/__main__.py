@@ -0,0 +1,51 @@
+"""Command line entry point: ``python -m benchmarks`` from the repository root.
+
+Prints the results as JSON (or writes them with ``--output``). With ``--baseline``
+the per-operation times are compared with a previous run and the exit code is 1
+if any case got slower than the tolerance.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+
+# custom_components/ importable al ejecutar desde cualquier directorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.suite import async_run, compare  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="fewer iterations and smaller catalogues")
+    parser.add_argument("--only", nargs="+", metavar="CASE", help="case name prefixes to run (e.g. event_pipeline)")
+    parser.add_argument("--output", metavar="FILE", help="write the JSON results to FILE")
+    parser.add_argument("--baseline", metavar="FILE", help="JSON results of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs. the baseline (default 0.25)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    results = asyncio.run(async_run(quick=args.quick, only=args.only))
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+        results["regressions"] = compare(results, baseline, args.tolerance)
+        status = 1 if results["regressions"] else 0
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+    if status:
+        print(f"Regressions: {', '.join(results['regressions'])}", file=sys.stderr)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
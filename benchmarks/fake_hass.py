@@ -0,0 +1,153 @@
+"""Minimal offline stand-in for ``HomeAssistant`` used by the benchmarks.
+
+It only provides what the integration touches on its hot paths and in
+``PVDatabase``: a state machine whose ``async_set`` fires ``state_changed`` on a
+synchronous bus (so ``async_track_state_change_event`` dispatches for real),
+``hass.data``, ``hass.config``, executor jobs and the entity/device registries
+(as plain dicts). No core, no recorder, no network.
+"""
+import asyncio
+import os
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from homeassistant.const import EVENT_STATE_CHANGED
+from homeassistant.core import CoreState, Event, State
+from homeassistant.helpers import device_registry as dr, entity_registry as er
+
+
+class FakeStates:
+    """``hass.states`` with explicit ``last_updated`` (the benchmark clock)."""
+
+    def __init__(self, bus):
+        self._bus = bus
+        self._states = {}
+
+    def get(self, entity_id):
+        return self._states.get(entity_id)
+
+    def async_set(self, entity_id, new_state, attributes=None, force_update=False, context=None, timestamp=None):
+        when = datetime.fromtimestamp(timestamp, timezone.utc) if timestamp is not None else None
+        old = self._states.get(entity_id)
+        state = State(entity_id, str(new_state), attributes or {}, last_changed=when, last_updated=when)
+        self._states[entity_id] = state
+        self._bus.async_fire(EVENT_STATE_CHANGED, {"entity_id": entity_id, "old_state": old, "new_state": state})
+
+
+class FakeBus:
+    """Synchronous event bus: listeners run inside ``async_fire`` (coroutines become tasks)."""
+
+    def __init__(self):
+        self._listeners = {}
+        self._tasks = set()
+
+    def async_listen(self, event_type, listener, event_filter=None, run_immediately=False):
+        entry = (listener, event_filter)
+        self._listeners.setdefault(event_type, []).append(entry)
+
+        def remove():
+            listeners = self._listeners.get(event_type, [])
+            if entry in listeners:
+                listeners.remove(entry)
+
+        return remove
+
+    def async_listen_once(self, event_type, listener):
+        return self.async_listen(event_type, listener)
+
+    def async_fire(self, event_type, event_data=None, origin=None, context=None):
+        listeners = self._listeners.get(event_type)
+        if not listeners:
+            return
+        event = Event(event_type, event_data or {})
+        for listener, event_filter in list(listeners):
+            if event_filter is not None and not _matches(event_filter, event):
+                continue
+            _track(self._tasks, listener(event))
+
+
+def _track(tasks, result):
+    # Los trabajos corrutina (p. ej. las escrituras diferidas del Store) se ejecutan como tareas
+    if asyncio.iscoroutine(result):
+        task = asyncio.get_running_loop().create_task(result)
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        return task
+    return result
+
+
+def _matches(event_filter, event):
+    try:
+        return event_filter(event)
+    except TypeError:
+        # Los filtros de Home Assistant >= 2024.4 reciben solo los datos del evento
+        return event_filter(event.data)
+
+
+class FakeEntityRegistry:
+    def __init__(self):
+        self.entities = {}
+
+    def async_get(self, entity_id):
+        return self.entities.get(entity_id)
+
+
+class FakeDeviceRegistry:
+    def __init__(self):
+        self.devices = {}
+
+    def async_get(self, device_id):
+        return self.devices.get(device_id)
+
+
+class FakeConfigEntries:
+    def async_entries(self, domain=None):
+        return []
+
+    def async_update_entry(self, entry, **kwargs):
+        for key, value in kwargs.items():
+            setattr(entry, key, value)
+        return True
+
+
+class FakeHass:
+    """Just enough of ``HomeAssistant`` for the integration's sensors, coordinator and database."""
+
+    def __init__(self, config_dir, latitude=40.4, longitude=-3.7, elevation=650):
+        self.loop = asyncio.get_running_loop()
+        self.data = {}
+        self.state = CoreState.running
+        self.bus = FakeBus()
+        self.states = FakeStates(self.bus)
+        self.config_entries = FakeConfigEntries()
+        self.config = SimpleNamespace(
+            latitude=latitude,
+            longitude=longitude,
+            elevation=elevation,
+            config_dir=config_dir,
+            path=lambda *parts: os.path.join(config_dir, *parts),
+        )
+        self.entity_registry = self.data[er.DATA_REGISTRY] = FakeEntityRegistry()
+        self.device_registry = self.data[dr.DATA_REGISTRY] = FakeDeviceRegistry()
+
+    def async_run_hass_job(self, job, *args, **kwargs):
+        return _track(self.bus._tasks, job.target(*args))
+
+    def async_create_task(self, target, name=None, eager_start=False):
+        return self.loop.create_task(target)
+
+    def async_create_background_task(self, target, name=None, eager_start=False):
+        return self.loop.create_task(target)
+
+    def async_add_executor_job(self, target, *args):
+        return self.loop.run_in_executor(None, target, *args)
+
+    def add_entity(self, entity_id, device_id=None, device_name=None):
+        """Da de alta una entidad (y su dispositivo) en los registros simulados."""
+        self.entity_registry.entities[entity_id] = SimpleNamespace(entity_id=entity_id, device_id=device_id)
+        if device_id is not None and device_id not in self.device_registry.devices:
+            self.device_registry.devices[device_id] = SimpleNamespace(
+                id=device_id,
+                identifiers={("bench", device_id)},
+                name=device_name or device_id,
+                name_by_user=None,
+            )
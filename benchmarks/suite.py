@@ -0,0 +1,323 @@
+"""Offline micro-benchmarks of the Accurate Solar Forecast hot paths.
+
+Cases (every result is the median over ``repeat`` runs, in microseconds per operation):
+
+* ``event_pipeline[strings=N]``: one reference sensor state change through the whole
+  integration (state machine → coordinator → batch evaluation → string sensors,
+  energy integration, aggregation, performance sensors → state writes) for
+  1, 10, 100 and 1000 strings sharing one sensor group.
+* ``cos_incidence``: ``Surface.cos_incidence`` (the former ``calculate_cos_incidence``).
+* ``weather_parse[items=N]``: ``parse_hourly_forecast`` on a weather entity's hourly forecast.
+* ``registry_lookup[cold|cached]``: device resolution of a linked entity, walking the
+  entity and device registries vs. served by the ``DeviceResolver`` cache.
+* ``pv_database_save|load|lookup[models=N]``: catalogue write, start-up load and
+  model lookups by name with large catalogues.
+"""
+import math
+import platform
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from homeassistant.const import __version__ as HA_VERSION
+from custom_components.accurate_solar_forecast.const import *
+from custom_components.accurate_solar_forecast import engine
+from custom_components.accurate_solar_forecast.aggregation import get_aggregation_hub
+from custom_components.accurate_solar_forecast.device_resolver import DeviceResolver
+from custom_components.accurate_solar_forecast.engine import Surface, sun_trig
+from custom_components.accurate_solar_forecast.forecast import parse_hourly_forecast
+from custom_components.accurate_solar_forecast.pv_database import DEFAULT_MODEL, PVDatabase
+from custom_components.accurate_solar_forecast.sensor import SolarStringPerformanceSensor, SolarStringSensor
+from custom_components.accurate_solar_forecast.string_context import StringContext
+from .fake_hass import FakeHass
+
+STRING_COUNTS = (1, 10, 100, 1000)
+WEATHER_ITEMS = (48, 240)
+CATALOGUE_SIZES = (1000, 10000, 50000)
+QUICK_CATALOGUE_SIZES = (1000, 10000)
+REGISTRY_ENTITIES = 10000
+
+# Mediodía del equinoccio en Madrid: el camino diurno completo
+BENCH_START = datetime(2026, 3, 20, 12, 0, tzinfo=timezone.utc).timestamp()
+BENCH_EVENT_STEP = 10  # s entre muestras del sensor de referencia
+
+
+def measure(func, number, repeat):
+    """Mediana y mínimo (µs por operación) de ``repeat`` tandas de ``number`` llamadas."""
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        runs.append((time.perf_counter() - start) / number * 1e6)
+    return {"per_op_us": round(statistics.median(runs), 3), "min_us": round(min(runs), 3), "ops": number * repeat}
+
+
+# --- EVENT PIPELINE ---
+class _BenchWrites:
+    """State writes go to the fake state machine at the benchmark clock."""
+
+    bench_clock = [BENCH_START]
+    bench_writes = [0]
+
+    def async_write_ha_state(self):
+        self.bench_writes[0] += 1
+        self.hass.states.async_set(
+            self.entity_id, self._attr_native_value, self._attr_extra_state_attributes, timestamp=self.bench_clock[0]
+        )
+
+
+class BenchStringSensor(_BenchWrites, SolarStringSensor):
+    pass
+
+
+class BenchPerformanceSensor(_BenchWrites, SolarStringPerformanceSensor):
+    pass
+
+
+async def _async_setup_db(config_dir):
+    hass = FakeHass(config_dir)
+    db = PVDatabase(hass)
+    await db.async_load()
+    hass.data[DOMAIN] = {"db": db}
+    return hass, db
+
+
+async def bench_event_pipeline(config_dir, strings, events, repeat):
+    hass, db = await _async_setup_db(config_dir)
+    clock = _BenchWrites.bench_clock
+    clock[0] = BENCH_START
+    group = {
+        CONF_SENSOR_GROUP_NAME: "bench",
+        CONF_REF_SENSOR: "sensor.bench_irradiance",
+        CONF_TEMP_SENSOR: "sensor.bench_temperature",
+        CONF_WIND_SENSOR: "sensor.bench_wind",
+        CONF_REF_TILT: 0,
+        CONF_REF_ORIENTATION: 180,
+        # Sin ventana de agrupación: cada evento recorre el camino completo al instante
+        CONF_UPDATE_WINDOW: 0,
+        CONF_MIN_UPDATE_INTERVAL: 0,
+    }
+    hass.states.async_set(group[CONF_REF_SENSOR], 600, timestamp=clock[0])
+    hass.states.async_set(group[CONF_TEMP_SENSOR], 18, timestamp=clock[0])
+    hass.states.async_set(group[CONF_WIND_SENSOR], 2, timestamp=clock[0])
+
+    panel = dict(DEFAULT_MODEL)
+    hub = get_aggregation_hub(hass)
+    for i in range(strings):
+        data = {
+            CONF_STRING_NAME: f"Bench {i}",
+            CONF_TILT: 10 + i % 40,
+            CONF_AZIMUTH: 90 + (i * 7) % 180,
+            CONF_NUM_PANELS: 10,
+            CONF_NUM_STRINGS: 1,
+            CONF_PANEL_MODEL: panel["name"],
+            "selected_sensor_group": "bench",
+            CONF_REAL_PRODUCTION_SENSOR: f"sensor.bench_real_{i}",
+        }
+        hass.states.async_set(data[CONF_REAL_PRODUCTION_SENSOR], 3000, timestamp=clock[0])
+        entry = SimpleNamespace(entry_id=f"bench_{i}", data=data, title=data[CONF_STRING_NAME])
+        context = StringContext(hass, entry, panel)
+        context.async_register()
+        hub.async_register_string(context)
+        sensor = BenchStringSensor(hass, data, db, group, "bench", panel, context)
+        sensor.entity_id = f"sensor.bench_{i}"
+        performance = BenchPerformanceSensor(hass, data, db, group, None, context)
+        performance.entity_id = f"sensor.bench_{i}_performance"
+        await sensor.async_added_to_hass()
+        await performance.async_added_to_hass()
+
+    step = [0]
+
+    def event():
+        step[0] += 1
+        clock[0] += BENCH_EVENT_STEP
+        irradiance = 600 + 150 * math.sin(step[0] / 7)
+        hass.states.async_set(group[CONF_REF_SENSOR], round(irradiance, 1), timestamp=clock[0])
+
+    for _ in range(min(events, 20)):
+        event() # calentamiento (lote vectorizado, cachés)
+    writes = _BenchWrites.bench_writes
+    writes[0] = 0
+    result = measure(event, events, repeat)
+    result["per_string_us"] = round(result["per_op_us"] / strings, 3)
+    result["writes_per_event"] = round(writes[0] / result["ops"], 2)
+    return result
+
+
+# --- MOTOR ---
+def bench_cos_incidence(number, repeat):
+    surface = Surface(30, 180)
+    suns = [sun_trig(90 + i * 3, 10 + i % 60) for i in range(60)]
+    index = [0]
+
+    def run():
+        index[0] = (index[0] + 1) % 60
+        surface.cos_incidence(suns[index[0]])
+
+    return measure(run, number, repeat)
+
+
+# --- WEATHER ---
+def _weather_items(count):
+    start = datetime(2026, 3, 20, tzinfo=timezone.utc)
+    conditions = ("sunny", "partlycloudy", "cloudy", "rainy")
+    return [
+        {
+            "datetime": (start + timedelta(hours=i)).isoformat(),
+            "condition": conditions[i % 4],
+            # Una de cada cuatro horas sin cobertura: se estima desde la condición
+            "cloud_coverage": None if i % 4 == 3 else (i * 13) % 100,
+            "temperature": 10 + i % 15,
+            "wind_speed": 3.5,
+        }
+        for i in range(count)
+    ]
+
+
+def bench_weather_parse(items, number, repeat):
+    forecast = _weather_items(items)
+    return measure(lambda: parse_hourly_forecast(forecast, "°C"), number, repeat)
+
+
+# --- REGISTROS ---
+async def bench_registry_lookup(config_dir, number, repeat):
+    hass, _ = await _async_setup_db(config_dir)
+    for i in range(REGISTRY_ENTITIES):
+        hass.add_entity(f"sensor.inverter_{i}_power", f"device_{i // 4}", f"Inverter {i // 4}")
+    resolver = DeviceResolver(hass)
+    rng = random.Random(1)
+    entities = [f"sensor.inverter_{rng.randrange(REGISTRY_ENTITIES)}_power" for _ in range(256)]
+    index = [0]
+
+    def cold():
+        index[0] = (index[0] + 1) % 256
+        resolver.async_invalidate("entry")
+        resolver.async_resolve("entry", entities[index[0]])
+
+    def cached():
+        resolver.async_resolve("entry", entities[0])
+
+    return {
+        "registry_lookup[cold]": measure(cold, number, repeat),
+        "registry_lookup[cached]": measure(cached, number, repeat),
+    }
+
+
+# --- BASE DE DATOS ---
+def _catalogue(size):
+    brands = [f"Brand {i}" for i in range(max(1, size // 100))]
+    models = {}
+    for i in range(size):
+        name = f"Bench Module {i:06d}"
+        models[name.lower().replace(" ", "_")] = {
+            "name": name,
+            "brand": brands[i % len(brands)],
+            "p_stc": 400 + i % 200,
+            "gamma": -0.35,
+            "noct": 45,
+            "voc": 49.5,
+            "isc": 11.2,
+            "vmp": 41.7,
+            "imp": 10.8,
+        }
+    return models
+
+
+async def bench_pv_database(size, repeat):
+    models = _catalogue(size)
+    names = [model["name"] for model in models.values()]
+    rng = random.Random(size)
+    save_runs, load_runs, lookup_runs = [], [], []
+    lookups = 200
+
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as config_dir:
+            hass, db = await _async_setup_db(config_dir)
+            start = time.perf_counter()
+            await db.catalogue.async_set_models(models)
+            await db.async_flush()
+            save_runs.append(time.perf_counter() - start)
+
+            # Arranque: otra instancia lee lo escrito (solo el índice del catálogo)
+            hass = FakeHass(config_dir)
+            db = PVDatabase(hass)
+            start = time.perf_counter()
+            await db.async_load()
+            load_runs.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            for name in rng.sample(names, lookups):
+                await db.async_get_model_by_name(name)
+            lookup_runs.append((time.perf_counter() - start) / lookups)
+
+    def summary(runs, scale=1e6):
+        return {"per_op_us": round(statistics.median(runs) * scale, 3), "min_us": round(min(runs) * scale, 3), "ops": len(runs)}
+
+    return {
+        f"pv_database_save[models={size}]": summary(save_runs),
+        f"pv_database_load[models={size}]": summary(load_runs),
+        f"pv_database_lookup[models={size}]": summary(lookup_runs),
+    }
+
+
+# --- EJECUCIÓN ---
+async def async_run(quick=False, only=None):
+    """Ejecuta los casos y devuelve ``{"meta": ..., "results": {caso: métricas}}``."""
+    repeat = 3 if quick else 5
+    scale = 0.2 if quick else 1.0
+    results = {}
+
+    def wanted(name):
+        return only is None or any(name.startswith(prefix) for prefix in only)
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        if wanted("event_pipeline"):
+            for strings in STRING_COUNTS:
+                events = max(5, int(2000 / strings * scale))
+                results[f"event_pipeline[strings={strings}]"] = await bench_event_pipeline(
+                    config_dir, strings, events, repeat
+                )
+        if wanted("cos_incidence"):
+            results["cos_incidence"] = bench_cos_incidence(int(100000 * scale), repeat)
+        if wanted("weather_parse"):
+            for items in WEATHER_ITEMS:
+                results[f"weather_parse[items={items}]"] = bench_weather_parse(items, max(10, int(500 * scale)), repeat)
+        if wanted("registry_lookup"):
+            results.update(await bench_registry_lookup(config_dir, int(20000 * scale), repeat))
+
+    if wanted("pv_database"):
+        for size in QUICK_CATALOGUE_SIZES if quick else CATALOGUE_SIZES:
+            results.update(await bench_pv_database(size, repeat))
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "homeassistant": HA_VERSION,
+            "numpy": engine.np is not None,
+            "quick": quick,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Casos cuyo ``per_op_us`` empeora más de ``tolerance`` (fracción) frente a la referencia."""
+    regressions = {}
+    for name, metrics in results["results"].items():
+        reference = baseline.get("results", {}).get(name)
+        if not reference or not reference.get("per_op_us"):
+            continue
+        ratio = metrics["per_op_us"] / reference["per_op_us"]
+        if ratio > 1 + tolerance:
+            regressions[name] = {
+                "baseline_us": reference["per_op_us"],
+                "current_us": metrics["per_op_us"],
+                "ratio": round(ratio, 2),
+            }
+    return regressions
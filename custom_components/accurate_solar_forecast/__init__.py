@@ -1,6 +1,8 @@
+from homeassistant.config_entries import ConfigEntryState
 from homeassistant.core import HomeAssistant
 from .const import DOMAIN, CONF_SENSOR_GROUP_NAME
 from .pv_database import PVDatabase
+from .services import async_setup_services
 import logging
 
 _LOGGER = logging.getLogger(__name__)
@@ -30,11 +32,26 @@ async def async_setup(hass: HomeAssistant, config):
         db = PVDatabase(hass)
         await db.async_load()
         hass.data[DOMAIN]["db"] = db
+
+    async_setup_services(hass)
     return True
 
 async def async_unload_entry(hass: HomeAssistant, entry):
     """Unload a config entry."""
-    return await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    if not unload_ok:
+        return False
+
+    # Última entrada descargada: retirar los listeners compartidos (se recrean al volver a cargar)
+    others = [
+        other for other in hass.config_entries.async_entries(DOMAIN)
+        if other.entry_id != entry.entry_id and other.state is ConfigEntryState.LOADED
+    ]
+    if not others:
+        resolver = hass.data.get(DOMAIN, {}).pop("device_resolver", None)
+        if resolver is not None:
+            resolver.async_shutdown()
+    return True
 
 async def async_remove_entry(hass: HomeAssistant, entry) -> None:
     """Handle removal of an entry."""
@@ -48,9 +65,7 @@ async def async_remove_entry(hass: HomeAssistant, entry) -> None:
             group_name = entry.data[CONF_SENSOR_GROUP_NAME]
             group_id = group_name.lower().replace(" ", "_")
             _LOGGER.info(f"Removing Sensor Group from DB: {group_id}")
-            result = db.delete_sensor_group(group_id)
-            if result:
-               await result
+            await db.delete_sensor_group(group_id)
                
         # Case B: String (Does it have a DB entry? No, strings are just ConfigEntries)
         return
\ No newline at end of file
@@ -0,0 +1,239 @@
+"""Incremental roof, inverter and site totals of the estimated string power.
+
+Each string publishes its estimate through its ``StringContext``; the hub keeps,
+per aggregate, the last value of every member and a running total, so a string
+update only applies its delta (O(1)) instead of re-summing every member.
+
+* Roof: strings whose ``roof_name`` is one of the roofs of ``PVDatabase``.
+* Inverter: strings whose real production sensor belongs to the same device. The
+  total is clipped to the optional AC limit configured on those strings.
+* Site: every inverter (clipped) plus the strings without an inverter.
+
+The site total is also integrated into an estimated energy total. The entities
+are created through the ``async_add_entities`` of the first sensor group entry
+(like the PV database sensor), including aggregates that appear later. Every
+loaded sensor group entry registers as a candidate: when the owner is unloaded,
+the next one takes over and the entities are added again through it.
+"""
+import logging
+import time
+from homeassistant.core import callback
+from .const import *
+from .energy import EnergyIntegrator
+
+_LOGGER = logging.getLogger(__name__)
+
+AGGREGATE_ROOF = "roof"
+AGGREGATE_INVERTER = "inverter"
+AGGREGATE_SITE = "site"
+
+
+def get_aggregation_hub(hass):
+    """Devuelve el agregador compartido, creándolo si no existe."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    hub = domain_data.get("aggregation")
+    if hub is None:
+        hub = domain_data["aggregation"] = AggregationHub(hass)
+    return hub
+
+
+class Aggregate:
+    """Running total of the members' power (W), optionally clipped to an AC limit."""
+
+    def __init__(self, kind, key, name, device_identifiers=None):
+        self.kind = kind
+        self.key = key
+        self.name = name
+        self.device_identifiers = device_identifiers
+        self.parent = None
+        self.ac_limit = None
+        self.total = 0.0
+        self.members = {}
+        self.entity_created = False
+        self._listeners = []
+
+    @property
+    def value(self):
+        """Total publicado (recortado al límite AC si lo hay)."""
+        if self.ac_limit:
+            return min(self.total, self.ac_limit)
+        return self.total
+
+    @callback
+    def async_set_member(self, member, value):
+        old = self.members.get(member)
+        if old == value:
+            return
+        self.members[member] = value
+        self.total += value - (old or 0.0)
+        self._async_changed()
+
+    @callback
+    def async_remove_member(self, member):
+        old = self.members.pop(member, None)
+        if old is None:
+            return
+        self.total -= old
+        if not self.members:
+            self.total = 0.0 # sin deriva de coma flotante acumulada
+        self._async_changed()
+
+    @callback
+    def async_set_ac_limit(self, ac_limit):
+        if ac_limit != self.ac_limit:
+            self.ac_limit = ac_limit
+            self._async_changed()
+
+    @callback
+    def _async_changed(self):
+        if self.parent is not None:
+            self.parent.async_set_member((self.kind, self.key), self.value)
+        for update_callback in list(self._listeners):
+            update_callback()
+
+    @callback
+    def async_add_listener(self, update_callback):
+        self._listeners.append(update_callback)
+
+        @callback
+        def remove_listener():
+            if update_callback in self._listeners:
+                self._listeners.remove(update_callback)
+
+        return remove_listener
+
+
+class AggregationHub:
+    """Owns the aggregates and routes each string's estimate into them."""
+
+    def __init__(self, hass):
+        self.hass = hass
+        self.site = Aggregate(AGGREGATE_SITE, AGGREGATE_SITE, "Instalación")
+        self.site_energy = EnergyIntegrator()
+        self.site.async_add_listener(self._async_site_changed)
+        self._aggregates = {}     # (kind, key) -> Aggregate
+        self._strings = {}        # entry_id -> (roof, inverter, ac_limit)
+        # Entradas de grupo cargadas: (entry_id, async_add_entities, fábrica); la primera crea las entidades
+        self._adders = []
+
+    @callback
+    def _async_site_changed(self):
+        self.site_energy.add(time.time(), self.site.value)
+
+    # --- ENTIDADES ---
+    @property
+    def owner(self):
+        """entry_id de la entrada que crea las entidades (o None)."""
+        return self._adders[0][0] if self._adders else None
+
+    @callback
+    def async_add_entity_adder(self, entry_id, async_add_entities, entity_factory):
+        """Candidata a crear las entidades (la primera lo hace). Devuelve la función de baja.
+
+        ``entity_factory(aggregates)`` devuelve las entidades de esos agregados.
+        """
+        self._adders.append((entry_id, async_add_entities, entity_factory))
+        if len(self._adders) == 1:
+            self._async_add_aggregate_entities([self.site, *self._aggregates.values()])
+
+        @callback
+        def remove_adder():
+            self._async_remove_entity_adder(entry_id)
+
+        return remove_adder
+
+    @callback
+    def _async_remove_entity_adder(self, entry_id):
+        was_owner = self.owner == entry_id
+        self._adders = [adder for adder in self._adders if adder[0] != entry_id]
+        if not was_owner:
+            return
+        # Las entidades desaparecen con la entrada propietaria: la siguiente las vuelve a crear
+        aggregates = [self.site, *self._aggregates.values()]
+        for aggregate in aggregates:
+            aggregate.entity_created = False
+        if self._adders:
+            _LOGGER.debug(f"Aggregate entities handed over to entry {self.owner}")
+            self._async_add_aggregate_entities(aggregates)
+
+    @callback
+    def _async_add_aggregate_entities(self, aggregates):
+        if not self._adders:
+            return
+        _, add_entities, entity_factory = self._adders[0]
+        new = [aggregate for aggregate in aggregates if not aggregate.entity_created]
+        for aggregate in new:
+            aggregate.entity_created = True
+        entities = entity_factory(new)
+        if entities:
+            # El sensor de latencias (sondeado) publica su primer estado al darse de alta
+            add_entities(entities, update_before_add=True)
+
+    # --- AGREGADOS ---
+    @callback
+    def async_get_aggregate(self, kind, key, name, device_identifiers=None):
+        aggregate = self._aggregates.get((kind, key))
+        if aggregate is None:
+            aggregate = Aggregate(kind, key, name, device_identifiers)
+            if kind == AGGREGATE_INVERTER:
+                aggregate.parent = self.site
+            self._aggregates[(kind, key)] = aggregate
+            self._async_add_aggregate_entities([aggregate])
+        return aggregate
+
+    @callback
+    def async_add_roofs(self, roofs):
+        """Un agregado por tejado de la DB (``{roof_id: datos}``)."""
+        for roof_id, roof in roofs.items():
+            self.async_get_aggregate(AGGREGATE_ROOF, roof_id, roof.get("name", roof_id))
+
+    # --- STRINGS ---
+    @callback
+    def async_register_string(self, context, roof_id=None, inverter=None, ac_limit=None):
+        """Engancha el string a sus agregados. ``inverter`` es ``(clave, nombre, identificadores)``.
+
+        Devuelve la función para darlo de baja.
+        """
+        entry_id = context.entry_id
+        roof = self._aggregates.get((AGGREGATE_ROOF, roof_id)) if roof_id else None
+        inverter_aggregate = None
+        if inverter is not None:
+            inverter_aggregate = self.async_get_aggregate(AGGREGATE_INVERTER, *inverter)
+        self._strings[entry_id] = (roof, inverter_aggregate, ac_limit or None)
+        if inverter_aggregate is not None:
+            self._async_update_ac_limit(inverter_aggregate)
+
+        # Sin inversor, el string cuenta directamente en el total del sitio
+        target = inverter_aggregate or self.site
+
+        @callback
+        def update_power():
+            power = context.power or 0.0
+            target.async_set_member(entry_id, power)
+            if roof is not None:
+                roof.async_set_member(entry_id, power)
+
+        remove_listener = context.async_add_power_listener(update_power)
+        if context.power is not None:
+            update_power()
+
+        @callback
+        def unregister():
+            remove_listener()
+            self._strings.pop(entry_id, None)
+            target.async_remove_member(entry_id)
+            if roof is not None:
+                roof.async_remove_member(entry_id)
+            if inverter_aggregate is not None:
+                self._async_update_ac_limit(inverter_aggregate)
+
+        return unregister
+
+    @callback
+    def _async_update_ac_limit(self, inverter):
+        """Límite AC del inversor: el menor de los configurados en sus strings."""
+        limits = [
+            limit for roof, aggregate, limit in self._strings.values()
+            if aggregate is inverter and limit
+        ]
+        inverter.async_set_ac_limit(min(limits) if limits else None)
@@ -0,0 +1,128 @@
+"""Attribute policy (verbosity and recorder exclusion) for the Accurate Solar Forecast sensors.
+
+Every attribute a sensor publishes is stored by the recorder in ``state_attributes``
+whenever it changes, and most of ours are intermediate values (irradiance
+components, cell temperature, linked sensor states) that change on every update.
+Each sensor declares a level per attribute:
+
+* ``minimal``: always published and recorded (e.g. the forecast summary);
+* ``standard``: the usual diagnostic values;
+* ``debug``: intermediate values of the model, only useful to trace it.
+
+The integration-wide verbosity decides which levels are produced at all. Each
+sensor class also declares everything above ``minimal`` in its
+``_unrecorded_attributes`` (see ``diagnostic_attributes``), so those values are
+visible in the UI but kept out of the recorder. Home Assistant only reads that set
+from the class, so when the "unrecorded attributes" setting is off the sensors are
+created from a subclass that records everything (see ``sensor_class``).
+"""
+from .const import *
+
+_LEVELS = {level: index for index, level in enumerate(ATTRIBUTE_VERBOSITY_LEVELS)}
+
+
+def diagnostic_attributes(levels):
+    """Atributos por encima de ``minimal`` (para el ``_unrecorded_attributes`` de la clase)."""
+    return frozenset(key for key, level in levels.items() if _LEVELS[level] > 0)
+
+
+_RECORDED_VARIANTS = {}
+
+
+def sensor_class(cls, settings):
+    """Clase con la que crear un sensor según el ajuste de atributos no grabados.
+
+    ``cls`` itself when diagnostic attributes stay out of the recorder; otherwise a
+    subclass (built once per class) with an empty ``_unrecorded_attributes``.
+    """
+    if settings.get(CONF_UNRECORDED_ATTRIBUTES, DEFAULT_UNRECORDED_ATTRIBUTES):
+        return cls
+    variant = _RECORDED_VARIANTS.get(cls)
+    if variant is None:
+        variant = _RECORDED_VARIANTS[cls] = type(
+            cls.__name__, (cls,), {"__module__": cls.__module__, "_unrecorded_attributes": frozenset()}
+        )
+    return variant
+
+
+class AttributePolicy:
+    """Filters the attributes of one sensor class according to the integration settings.
+
+    ``levels`` maps attribute name → level; attributes not listed are ``minimal``.
+    """
+
+    def __init__(self, settings, levels):
+        self._settings = settings
+        self._levels = {key: _LEVELS[level] for key, level in levels.items()}
+
+    def _verbosity(self):
+        return _LEVELS.get(self._settings.get(CONF_ATTRIBUTE_VERBOSITY), _LEVELS[DEFAULT_ATTRIBUTE_VERBOSITY])
+
+    def includes(self, key):
+        """True si el atributo se publica con la verbosidad actual."""
+        return self._levels.get(key, 0) <= self._verbosity()
+
+    def filter(self, attributes):
+        """Copia de ``attributes`` sin los atributos que la verbosidad actual excluye."""
+        verbosity = self._verbosity()
+        if verbosity == len(_LEVELS) - 1:
+            return attributes
+        levels = self._levels
+        return {key: value for key, value in attributes.items() if levels.get(key, 0) <= verbosity}
+
+
+# Niveles por atributo de cada tipo de sensor
+STRING_ATTRIBUTE_LEVELS = {
+    "estado_solar": ATTRIBUTE_VERBOSITY_MINIMAL,
+    "energia_prevista_hoy": ATTRIBUTE_VERBOSITY_MINIMAL,
+    "energia_prevista_manana": ATTRIBUTE_VERBOSITY_MINIMAL,
+    "irradiancia_referencia": ATTRIBUTE_VERBOSITY_STANDARD,
+    "irradiancia_incidente_estimada": ATTRIBUTE_VERBOSITY_STANDARD,
+    "temperatura_celula": ATTRIBUTE_VERBOSITY_STANDARD,
+    "temperatura_ambiente": ATTRIBUTE_VERBOSITY_STANDARD,
+    "voltaje_total_estimado": ATTRIBUTE_VERBOSITY_STANDARD,
+    "corriente_total_estimada": ATTRIBUTE_VERBOSITY_STANDARD,
+    "irradiancia_global_horizontal": ATTRIBUTE_VERBOSITY_DEBUG,
+    "irradiancia_directa_normal": ATTRIBUTE_VERBOSITY_DEBUG,
+    "irradiancia_difusa_horizontal": ATTRIBUTE_VERBOSITY_DEBUG,
+    "factor_transposicion": ATTRIBUTE_VERBOSITY_DEBUG,
+    "irradiancia_cielo_despejado": ATTRIBUTE_VERBOSITY_DEBUG,
+    "indice_cielo_despejado": ATTRIBUTE_VERBOSITY_DEBUG,
+    "sun_elevation": ATTRIBUTE_VERBOSITY_DEBUG,
+}
+
+SENSOR_GROUP_ATTRIBUTE_LEVELS = {
+    "irradiance": ATTRIBUTE_VERBOSITY_STANDARD,
+    "temperature": ATTRIBUTE_VERBOSITY_STANDARD,
+    "panel_temperature": ATTRIBUTE_VERBOSITY_STANDARD,
+    "wind_speed": ATTRIBUTE_VERBOSITY_STANDARD,
+    "cloud_coverage": ATTRIBUTE_VERBOSITY_STANDARD,
+    "weather_condition": ATTRIBUTE_VERBOSITY_STANDARD,
+    "irradiance_unit": ATTRIBUTE_VERBOSITY_DEBUG,
+    "temperature_unit": ATTRIBUTE_VERBOSITY_DEBUG,
+    "panel_temperature_unit": ATTRIBUTE_VERBOSITY_DEBUG,
+    "wind_speed_unit": ATTRIBUTE_VERBOSITY_DEBUG,
+    "weather_entity": ATTRIBUTE_VERBOSITY_DEBUG,
+    "ref_tilt": ATTRIBUTE_VERBOSITY_DEBUG,
+    "ref_orientation": ATTRIBUTE_VERBOSITY_DEBUG,
+}
+
+PERFORMANCE_ATTRIBUTE_LEVELS = {
+    "rendimiento_hoy": ATTRIBUTE_VERBOSITY_MINIMAL,
+    "rendimiento_1h": ATTRIBUTE_VERBOSITY_MINIMAL,
+    "rendimiento_15min": ATTRIBUTE_VERBOSITY_STANDARD,
+    "rendimiento_ewma": ATTRIBUTE_VERBOSITY_STANDARD,
+    "rendimiento_min_hoy": ATTRIBUTE_VERBOSITY_STANDARD,
+    "rendimiento_max_hoy": ATTRIBUTE_VERBOSITY_STANDARD,
+}
+
+PV_DATABASE_ATTRIBUTE_LEVELS = {
+    "model_list": ATTRIBUTE_VERBOSITY_DEBUG,
+}
+
+AGGREGATE_ATTRIBUTE_LEVELS = {
+    "miembros": ATTRIBUTE_VERBOSITY_STANDARD,
+    "potencia_dc": ATTRIBUTE_VERBOSITY_STANDARD,
+    "limite_ac": ATTRIBUTE_VERBOSITY_STANDARD,
+    "recorte": ATTRIBUTE_VERBOSITY_STANDARD,
+}
@@ -0,0 +1,262 @@
+"""Sharded, lazily loaded PV module catalogue for ``PVDatabase``.
+
+A module library can hold tens of thousands of models while only a handful are
+used by strings. The catalogue is therefore split in two:
+
+* a small index (``model_id -> (name, brand)``), resident, that answers every
+  selector and name/brand lookup;
+* the full model records, spread over ``CATALOGUE_SHARDS`` stores by a stable hash
+  of the model id. Shards are loaded on demand and kept in an LRU of
+  ``CATALOGUE_CACHE_SHARDS``; modified shards stay resident until written.
+
+Models referenced by strings are pinned, so the hot path never touches disk.
+"""
+import logging
+import zlib
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from functools import partial
+from homeassistant.core import callback
+from homeassistant.helpers.storage import Store
+
+_LOGGER = logging.getLogger(__name__)
+
+CATALOGUE_VERSION = 1
+CATALOGUE_SHARDS = 32
+CATALOGUE_CACHE_SHARDS = 4
+
+
+def model_id_for(name):
+    """Id de un modelo a partir de su nombre (mismo criterio que siempre)."""
+    return name.lower().replace(" ", "_")
+
+
+class ModuleCatalogue:
+    """Index of every PV model plus on-demand access to the full records."""
+
+    def __init__(self, hass, storage_key, shards=CATALOGUE_SHARDS, cache_size=CATALOGUE_CACHE_SHARDS):
+        self.hass = hass
+        self._storage_key = storage_key
+        self._num_shards = shards
+        self.cache_size = cache_size
+        self._index_store = Store(hass, CATALOGUE_VERSION, f"{storage_key}_catalogue_index")
+        self._shard_stores = {}
+        self._index = {}        # model_id -> (name, brand)
+        self._name_index = {}   # name -> model_id
+        self._brand_index = {}  # brand -> {model_id: name}
+        self._brands = []       # marcas ordenadas
+        self._pinned = {}       # model_id -> datos (modelos usados por strings)
+        self._shards = OrderedDict() # LRU: shard -> {model_id: datos}
+        self._dirty_shards = set()
+        self._index_dirty = False
+        self.hits = 0
+        self.misses = 0
+
+    # --- CARGA Y VOLCADO ---
+    async def async_load(self):
+        """Carga el índice. Devuelve False si el catálogo aún no existe en disco."""
+        data = await self._index_store.async_load()
+        if data is None:
+            return False
+        for model_id, (name, brand) in data.get("models", {}).items():
+            self._index_entry(model_id, name, brand)
+        return True
+
+    @callback
+    def async_schedule_save(self, delay):
+        """Programa la escritura diferida de los shards modificados y del índice."""
+        for shard in self._dirty_shards:
+            self._shard_store(shard).async_delay_save(partial(self._shard_data, shard), delay)
+        if self._index_dirty:
+            self._index_store.async_delay_save(self._index_data, delay)
+
+    @callback
+    def _shard_data(self, shard):
+        # El Store lo llama al escribir: desde ese momento el shard ya se puede descartar
+        self._dirty_shards.discard(shard)
+        data = {"models": dict(self._shards[shard])}
+        self._trim()
+        return data
+
+    @callback
+    def _index_data(self):
+        self._index_dirty = False
+        return {"models": {model_id: list(entry) for model_id, entry in self._index.items()}}
+
+    async def async_flush(self):
+        """Escribe ahora los shards modificados y el índice (cancela su escritura diferida)."""
+        # Se copia todo antes de esperar al disco: los cambios que lleguen mientras tanto
+        # vuelven a marcar su shard y se escriben en el siguiente volcado
+        pending = {shard: dict(self._shards[shard]) for shard in sorted(self._dirty_shards)}
+        self._dirty_shards.clear()
+        index = None
+        if self._index_dirty:
+            self._index_dirty = False
+            index = {model_id: list(entry) for model_id, entry in self._index.items()}
+        self._trim()
+
+        try:
+            for shard, models in pending.items():
+                await self._shard_store(shard).async_save({"models": models})
+            if index is not None:
+                await self._index_store.async_save({"models": index})
+        except Exception:
+            # Se reintentará en el próximo volcado
+            for shard, models in pending.items():
+                self._shards.setdefault(shard, models)
+                self._dirty_shards.add(shard)
+            self._index_dirty = self._index_dirty or index is not None
+            raise
+
+    @property
+    def dirty(self):
+        return self._index_dirty or bool(self._dirty_shards)
+
+    @property
+    def resident_models(self):
+        """Modelos completos en memoria (shards cargados)."""
+        return sum(len(models) for models in self._shards.values())
+
+    def stats(self):
+        return {
+            "models": len(self._index),
+            "pinned": len(self._pinned),
+            "resident_shards": len(self._shards),
+            "dirty_shards": len(self._dirty_shards),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    # --- SHARDS ---
+    def shard_for(self, model_id):
+        # crc32 es estable entre reinicios (hash() de Python no lo es)
+        return zlib.crc32(model_id.encode("utf-8")) % self._num_shards
+
+    def _shard_store(self, shard):
+        store = self._shard_stores.get(shard)
+        if store is None:
+            store = Store(self.hass, CATALOGUE_VERSION, f"{self._storage_key}_catalogue_{shard:02d}")
+            self._shard_stores[shard] = store
+        return store
+
+    async def _async_shard(self, shard):
+        models = self._shards.get(shard)
+        if models is not None:
+            self.hits += 1
+            self._shards.move_to_end(shard)
+            return models
+
+        self.misses += 1
+        data = await self._shard_store(shard).async_load()
+        # Otro acceso pudo cargarlo mientras se esperaba al disco
+        models = self._shards.get(shard)
+        if models is None:
+            models = (data or {}).get("models", {})
+            self._shards[shard] = models
+        self._trim()
+        return models
+
+    def _trim(self):
+        """Descarga los shards menos usados; los modificados no se descartan hasta volcarlos."""
+        if len(self._shards) <= self.cache_size:
+            return
+        # El último (recién usado) nunca se descarta: quien lo pidió lo va a usar ahora
+        for shard in list(self._shards)[:-1]:
+            if len(self._shards) <= self.cache_size:
+                break
+            if shard not in self._dirty_shards:
+                del self._shards[shard]
+
+    # --- ÍNDICES ---
+    def _index_entry(self, model_id, name, brand):
+        brand = brand or "Generic"
+        self._index[model_id] = (name, brand)
+        self._name_index[name] = model_id
+        models = self._brand_index.get(brand)
+        if models is None:
+            models = self._brand_index[brand] = {}
+            insort(self._brands, brand)
+        models[model_id] = name
+
+    def _unindex_entry(self, model_id):
+        entry = self._index.pop(model_id, None)
+        if entry is None:
+            return
+        name, brand = entry
+        if self._name_index.get(name) == model_id:
+            del self._name_index[name]
+        models = self._brand_index.get(brand)
+        if models is not None:
+            models.pop(model_id, None)
+            if not models:
+                del self._brand_index[brand]
+                index = bisect_left(self._brands, brand)
+                if index < len(self._brands) and self._brands[index] == brand:
+                    del self._brands[index]
+
+    # --- LECTURA ---
+    def has_model(self, model_id):
+        return model_id in self._index
+
+    def get_model_id(self, name):
+        return self._name_index.get(name)
+
+    def get_resident_model(self, model_id):
+        """Datos del modelo si ya están en memoria (sin E/S), o None."""
+        model = self._pinned.get(model_id)
+        if model is None and model_id in self._index:
+            models = self._shards.get(self.shard_for(model_id))
+            if models is not None:
+                model = models.get(model_id)
+        return model
+
+    async def async_get_model(self, model_id, pin=False):
+        """Datos del modelo, cargando su shard si hace falta. ``pin`` lo mantiene residente."""
+        if model_id not in self._index:
+            return None
+        model = self._pinned.get(model_id)
+        if model is None:
+            models = await self._async_shard(self.shard_for(model_id))
+            model = models.get(model_id)
+            if model is not None and pin:
+                self._pinned[model_id] = model
+        return model
+
+    def list_brands(self):
+        return list(self._brands)
+
+    def list_models_by_brand(self, brand):
+        return dict(self._brand_index.get(brand, {}))
+
+    def list_models(self):
+        return {model_id: name for model_id, (name, _) in self._index.items()}
+
+    # --- ESCRITURA ---
+    async def async_set_models(self, models):
+        """Añade o reemplaza modelos completos (dict ``{model_id: datos}``) agrupando por shard."""
+        by_shard = {}
+        for model_id, model in models.items():
+            by_shard.setdefault(self.shard_for(model_id), []).append((model_id, model))
+
+        for shard, items in by_shard.items():
+            shard_models = await self._async_shard(shard)
+            for model_id, model in items:
+                self._unindex_entry(model_id)
+                shard_models[model_id] = model
+                self._index_entry(model_id, model["name"], model.get("brand"))
+                if model_id in self._pinned:
+                    self._pinned[model_id] = model
+            self._dirty_shards.add(shard)
+        self._index_dirty = True
+
+    async def async_delete_model(self, model_id):
+        if model_id not in self._index:
+            return False
+        shard = self.shard_for(model_id)
+        shard_models = await self._async_shard(shard)
+        shard_models.pop(model_id, None)
+        self._unindex_entry(model_id)
+        self._pinned.pop(model_id, None)
+        self._dirty_shards.add(shard)
+        self._index_dirty = True
+        return True
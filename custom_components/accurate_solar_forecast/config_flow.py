@@ -3,6 +3,7 @@ from homeassistant import config_entries
 from homeassistant.helpers import selector
 from .const import *
 from .pv_database import PVDatabase
+from .importer import CatalogueImportError, async_import_catalogue
 
 class AccurateForecastFlow(config_entries.ConfigFlow, domain=DOMAIN):
     VERSION = 1
@@ -43,6 +44,7 @@ class AccurateForecastFlow(config_entries.ConfigFlow, domain=DOMAIN):
             menu_options.append("string_create_select_relations")
             
         menu_options.append("menu_sensor_groups")
+        menu_options.append("settings")
         
         return self.async_show_menu(
             step_id="user",
@@ -54,7 +56,7 @@ class AccurateForecastFlow(config_entries.ConfigFlow, domain=DOMAIN):
     # =================================================================================
     async def async_step_menu_pv_models(self, user_input=None):
         """Submenú para Módulos FV."""
-        options = ["pv_model_create"]
+        options = ["pv_model_create", "pv_model_import"]
         
         models = self._db.list_models()
         if models and len(models) > 0:
@@ -127,7 +129,7 @@ class AccurateForecastFlow(config_entries.ConfigFlow, domain=DOMAIN):
         # Load Data
         # We need to find the model data by name/id
         # The selector returned the ID (name based key)
-        model_data = self._db.get_model(self.selected_item_id)
+        model_data = await self._db.async_get_model(self.selected_item_id)
         return self._show_pv_model_form("pv_model_edit_form", {}, default_data=model_data)
 
     # 1.3 SUCCESS & LOOP (Menu intermedio)
@@ -203,13 +205,59 @@ class AccurateForecastFlow(config_entries.ConfigFlow, domain=DOMAIN):
         })
         return self.async_show_form(step_id=step_id, data_schema=schema)
 
+    # 1.5 IMPORT PV CATALOGUE (CSV / JSON)
+    async def async_step_pv_model_import(self, user_input=None):
+        """Importa un catálogo de módulos desde un fichero local."""
+        errors = {}
+        if user_input is not None:
+            try:
+                summary = await async_import_catalogue(
+                    self.hass,
+                    self._db,
+                    user_input[CONF_CATALOGUE_PATH],
+                    user_input.get(CONF_OVERWRITE, False),
+                )
+            except CatalogueImportError:
+                errors["base"] = "catalogue_import_failed"
+            else:
+                return self.async_abort(
+                    reason="catalogue_imported",
+                    description_placeholders={key: str(value) for key, value in summary.items()},
+                )
+
+        schema = vol.Schema({
+            vol.Required(CONF_CATALOGUE_PATH): str,
+            vol.Optional(CONF_OVERWRITE, default=False): bool,
+        })
+        return self.async_show_form(step_id="pv_model_import", data_schema=schema, errors=errors)
+
+    # =================================================================================
+    # SETTINGS (Ajustes globales de la integración)
+    # =================================================================================
+    async def async_step_settings(self, user_input=None):
+        """Banda muerta y latido de las escrituras de estado; política de atributos; instrumentación."""
+        if user_input is not None:
+            await self._db.update_settings(**user_input)
+            return self.async_abort(reason="settings_saved")
+
+        settings = self._db.settings
+        schema = vol.Schema({
+            vol.Optional(CONF_DEADBAND_ABSOLUTE, default=settings[CONF_DEADBAND_ABSOLUTE]): vol.All(vol.Coerce(float), vol.Range(min=0, max=1000)),
+            vol.Optional(CONF_DEADBAND_RELATIVE, default=settings[CONF_DEADBAND_RELATIVE]): vol.All(vol.Coerce(float), vol.Range(min=0, max=50)),
+            vol.Optional(CONF_HEARTBEAT, default=settings[CONF_HEARTBEAT]): vol.All(vol.Coerce(int), vol.Range(min=0, max=3600)),
+            vol.Optional(CONF_ATTRIBUTE_VERBOSITY, default=settings[CONF_ATTRIBUTE_VERBOSITY]): selector.SelectSelector(
+                selector.SelectSelectorConfig(options=ATTRIBUTE_VERBOSITY_LEVELS, mode="dropdown", translation_key=CONF_ATTRIBUTE_VERBOSITY)
+            ),
+            vol.Optional(CONF_UNRECORDED_ATTRIBUTES, default=settings[CONF_UNRECORDED_ATTRIBUTES]): bool,
+            vol.Optional(CONF_INSTRUMENTATION, default=settings[CONF_INSTRUMENTATION]): bool,
+        })
+        return self.async_show_form(step_id="settings", data_schema=schema)
+
     # =================================================================================
     # BRANCH 2: SENSOR GROUPS (Integraciones - Create & Edit Only)
     # =================================================================================
     async def async_step_menu_sensor_groups(self, user_input=None):
-        # Explicitly reload DB to ensure freshness just in case
-        if self._db:
-             await self._db.async_load()
+        # La DB en memoria es la fuente de verdad (puede haber cambios aún sin volcar a disco)
 
         # Optimization: If no groups, go straight to creation
         # We check the length explicitly to be robust
@@ -237,7 +285,10 @@ class AccurateForecastFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 user_input.get(CONF_WIND_SENSOR),
                 user_input[CONF_REF_TILT],
                 user_input[CONF_REF_ORIENTATION],
-                user_input.get(CONF_WEATHER_ENTITY)
+                user_input.get(CONF_WEATHER_ENTITY),
+                user_input.get(CONF_UPDATE_WINDOW, DEFAULT_UPDATE_WINDOW),
+                user_input.get(CONF_MIN_UPDATE_INTERVAL, DEFAULT_MIN_UPDATE_INTERVAL),
+                user_input.get(CONF_TRANSPOSITION_MODEL, DEFAULT_TRANSPOSITION_MODEL)
             )
             # Create HA Device
             return self.async_create_entry(title="Modulos y Sensores", data=user_input)
@@ -272,7 +323,10 @@ class AccurateForecastFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 user_input.get(CONF_WIND_SENSOR),
                 user_input[CONF_REF_TILT],
                 user_input[CONF_REF_ORIENTATION],
-                user_input.get(CONF_WEATHER_ENTITY)
+                user_input.get(CONF_WEATHER_ENTITY),
+                user_input.get(CONF_UPDATE_WINDOW, DEFAULT_UPDATE_WINDOW),
+                user_input.get(CONF_MIN_UPDATE_INTERVAL, DEFAULT_MIN_UPDATE_INTERVAL),
+                user_input.get(CONF_TRANSPOSITION_MODEL, DEFAULT_TRANSPOSITION_MODEL)
             )
              return self.async_create_entry(title=f"Updated Group: {name}", data={})
 
@@ -316,6 +370,11 @@ class AccurateForecastFlow(config_entries.ConfigFlow, domain=DOMAIN):
             vol.Optional(CONF_WIND_SENSOR, default=get_default(CONF_WIND_SENSOR)): selector.EntitySelector(
                 selector.EntitySelectorConfig(domain="sensor", device_class="wind_speed")
             ),
+            vol.Optional(CONF_UPDATE_WINDOW, default=get_default(CONF_UPDATE_WINDOW, DEFAULT_UPDATE_WINDOW)): vol.All(vol.Coerce(float), vol.Range(min=0, max=5)),
+            vol.Optional(CONF_MIN_UPDATE_INTERVAL, default=get_default(CONF_MIN_UPDATE_INTERVAL, DEFAULT_MIN_UPDATE_INTERVAL)): vol.All(vol.Coerce(float), vol.Range(min=0, max=300)),
+            vol.Optional(CONF_TRANSPOSITION_MODEL, default=get_default(CONF_TRANSPOSITION_MODEL, DEFAULT_TRANSPOSITION_MODEL)): selector.SelectSelector(
+                selector.SelectSelectorConfig(options=TRANSPOSITION_MODELS, mode="dropdown", translation_key=CONF_TRANSPOSITION_MODEL)
+            ),
         })
         return self.async_show_form(step_id=step_id, data_schema=schema, errors=errors)
 
@@ -434,6 +493,8 @@ class AccurateForecastFlow(config_entries.ConfigFlow, domain=DOMAIN):
             vol.Required(CONF_NUM_STRINGS, default=1): vol.All(int, vol.Range(min=1)),
             vol.Required(CONF_TILT, default=default_tilt): vol.All(vol.Coerce(float), vol.Range(min=0, max=90)),
             vol.Required(CONF_AZIMUTH, default=default_azimuth): vol.All(vol.Coerce(float), vol.Range(min=0, max=360)),
+            # Límite AC del inversor (W) para el recorte del agregado por inversor; 0 = sin límite
+            vol.Optional(CONF_INVERTER_AC_LIMIT, default=0): vol.All(vol.Coerce(float), vol.Range(min=0)),
         })
         return self.async_show_form(step_id="string_create_details", data_schema=schema)
 
@@ -483,7 +544,10 @@ class AccurateForecastFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 user_input.get(CONF_WIND_SENSOR),
                 user_input[CONF_REF_TILT],
                 user_input[CONF_REF_ORIENTATION],
-                user_input.get(CONF_WEATHER_ENTITY)
+                user_input.get(CONF_WEATHER_ENTITY),
+                user_input.get(CONF_UPDATE_WINDOW, DEFAULT_UPDATE_WINDOW),
+                user_input.get(CONF_MIN_UPDATE_INTERVAL, DEFAULT_MIN_UPDATE_INTERVAL),
+                user_input.get(CONF_TRANSPOSITION_MODEL, DEFAULT_TRANSPOSITION_MODEL)
              )
              
              # Update Config Entry
@@ -533,6 +597,7 @@ class AccurateForecastFlow(config_entries.ConfigFlow, domain=DOMAIN):
             vol.Optional(CONF_REAL_PRODUCTION_SENSOR, default=default_data.get(CONF_REAL_PRODUCTION_SENSOR)): selector.EntitySelector(
                 selector.EntitySelectorConfig(domain="sensor", device_class="power")
             ),
+            vol.Optional(CONF_INVERTER_AC_LIMIT, default=default_data.get(CONF_INVERTER_AC_LIMIT, 0)): vol.All(vol.Coerce(float), vol.Range(min=0)),
         })
         
         return self.async_show_form(step_id="reconfigure_string", data_schema=schema)
\ No newline at end of file
@@ -29,5 +29,79 @@ CONF_SENSOR_GROUP_NAME = "sensor_group_name"
 CONF_SENSOR_GROUP_ID = "sensor_group_id"
 ATTR_SOURCE_SENSOR = "source_sensor"
 
+# Update coalescing per Sensor Group (seconds)
+CONF_UPDATE_WINDOW = "update_window"
+CONF_MIN_UPDATE_INTERVAL = "min_update_interval"
+DEFAULT_UPDATE_WINDOW = 0.5
+DEFAULT_MIN_UPDATE_INTERVAL = 0
+
+# Solar position cache (quantization step in seconds)
+SOLAR_POSITION_LIVE_STEP = 10
+SOLAR_POSITION_FORECAST_STEP = 900
+SOLAR_POSITION_CACHE_SIZE = 512
+
+# Ground reflectance used by the transposition
+DEFAULT_ALBEDO = 0.2
+
+# Sky diffuse transposition model per Sensor Group
+CONF_TRANSPOSITION_MODEL = "transposition_model"
+TRANSPOSITION_ISOTROPIC = "isotropic"
+TRANSPOSITION_PEREZ = "perez"
+TRANSPOSITION_MODELS = [TRANSPOSITION_ISOTROPIC, TRANSPOSITION_PEREZ]
+DEFAULT_TRANSPOSITION_MODEL = TRANSPOSITION_ISOTROPIC
+
+# Integration-wide state write deadband (string and performance sensors)
+CONF_DEADBAND_ABSOLUTE = "deadband_absolute"   # W
+CONF_DEADBAND_RELATIVE = "deadband_relative"   # % del último valor escrito
+CONF_HEARTBEAT = "heartbeat"                   # s; 0 = sin escritura periódica
+DEFAULT_DEADBAND_ABSOLUTE = 1.0
+DEFAULT_DEADBAND_RELATIVE = 1.0
+DEFAULT_HEARTBEAT = 300
+PERFORMANCE_DEADBAND_ABSOLUTE = 0.5            # puntos de %
+ENERGY_DEADBAND_ABSOLUTE = 0.01                # kWh
+
+# Integration-wide attribute policy (see attributes.py)
+CONF_ATTRIBUTE_VERBOSITY = "attribute_verbosity"
+ATTRIBUTE_VERBOSITY_MINIMAL = "minimal"
+ATTRIBUTE_VERBOSITY_STANDARD = "standard"
+ATTRIBUTE_VERBOSITY_DEBUG = "debug"
+ATTRIBUTE_VERBOSITY_LEVELS = [ATTRIBUTE_VERBOSITY_MINIMAL, ATTRIBUTE_VERBOSITY_STANDARD, ATTRIBUTE_VERBOSITY_DEBUG]
+DEFAULT_ATTRIBUTE_VERBOSITY = ATTRIBUTE_VERBOSITY_STANDARD
+CONF_UNRECORDED_ATTRIBUTES = "unrecorded_attributes"   # diagnósticos fuera del recorder; applies on reload
+DEFAULT_UNRECORDED_ATTRIBUTES = True
+
+# Hot-path instrumentation (see instrumentation.py); applies on reload
+CONF_INSTRUMENTATION = "instrumentation"
+DEFAULT_INSTRUMENTATION = False
+
+# Day-ahead forecast
+FORECAST_HOURS = 48
+FORECAST_POLL_MINUTES = 30
+SERVICE_GET_FORECAST = "get_forecast"
+
+# PV module catalogue import
+SERVICE_IMPORT_CATALOGUE = "import_catalogue"
+CONF_CATALOGUE_PATH = "path"
+CONF_OVERWRITE = "overwrite"
+
+# On-demand profiling (see profiler.py)
+SERVICE_PROFILE = "profile"
+CONF_DURATION = "duration"
+CONF_TOP = "top"
+CONF_TRACEMALLOC = "tracemalloc"
+DEFAULT_PROFILE_DURATION = 30  # s
+DEFAULT_PROFILE_TOP = 20
+
+# Estimated cloud coverage (%) when a weather entity only reports its condition
+CONDITION_CLOUD_COVERAGE = {
+    "sunny": 0, "clear-night": 0,
+    "partlycloudy": 50, "cloudy": 50,
+    "fog": 100, "hail": 100, "lightning": 100, "lightning-rainy": 100, "pouring": 100,
+    "rainy": 100, "snowy": 100, "snowy-rainy": 100,
+}
+
 # New Constants for Roofs
 CONF_ROOF_NAME = "roof_name"
+
+# Optional AC limit (W) of the inverter a string feeds; 0 = no clipping
+CONF_INVERTER_AC_LIMIT = "inverter_ac_limit"
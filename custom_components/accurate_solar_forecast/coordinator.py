@@ -0,0 +1,289 @@
+"""Shared per sensor group computation for the Accurate Solar Forecast strings."""
+import logging
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_track_state_change_event
+from homeassistant.util import dt as dt_util
+from .const import *
+from .scheduler import CoalescingScheduler
+from .solar_position import get_solar_position_cache
+from .engine import Surface, build_batch, evaluate_string, evaluate_strings, sun_trig
+from .forecast import ForecastEngine, summarize_forecast
+from .clearsky import day_of_year, ineichen, linke_turbidity
+from .decomposition import decompose, plane_irradiance, sky_diffuse_terms
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def get_coordinator(hass, group_id, sensor_group_data):
+    """Devuelve el coordinador del grupo de sensores, creándolo si no existe."""
+    coordinators = hass.data[DOMAIN].setdefault("coordinators", {})
+    coordinator = coordinators.get(group_id)
+    if coordinator is None:
+        coordinator = SensorGroupCoordinator(hass, group_id, sensor_group_data)
+        coordinators[group_id] = coordinator
+    return coordinator
+
+
+def get_float_state(hass, entity_id, default=0.0):
+    if not entity_id:
+        return default
+    state = hass.states.get(entity_id)
+    if state and state.state not in ["unavailable", "unknown"]:
+        try:
+            return float(state.state)
+        except ValueError:
+            pass
+    return default
+
+
+class SensorGroupCoordinator:
+    """Subscribes once to a sensor group and shares the reference-side data with its strings.
+
+    Every string attached to the same sensor group used to track the same entities
+    and repeat the same reference calculations. The coordinator does that work once
+    per (coalesced) burst of events, evaluates all of its strings in one batch (see
+    ``engine``) and pushes each result to the string it belongs to. When the group has
+    a weather entity it also owns the day-ahead ``ForecastEngine`` of those strings.
+    """
+
+    def __init__(self, hass, group_id, sensor_group_data):
+        self.hass = hass
+        self.group_id = group_id
+        self.sensor_group = sensor_group_data
+        self.ref_surface = Surface(sensor_group_data.get(CONF_REF_TILT), sensor_group_data.get(CONF_REF_ORIENTATION))
+        self.transposition_model = sensor_group_data.get(CONF_TRANSPOSITION_MODEL) or DEFAULT_TRANSPOSITION_MODEL
+        self.data = None
+        self._trigger_time = None
+        self._listeners = {}
+        self._unsub_track = None
+        self._batch_keys = None
+        self._batch_strings = []
+        self._batch = None
+        self.forecast_timestamps = []
+        self.forecast_results = {}
+        self._forecast = None
+        weather_entity = sensor_group_data.get(CONF_WEATHER_ENTITY)
+        if weather_entity and weather_entity.startswith("weather."):
+            self._forecast = ForecastEngine(hass, self, weather_entity)
+        self._scheduler = CoalescingScheduler(
+            hass,
+            self._refresh,
+            sensor_group_data.get(CONF_UPDATE_WINDOW, DEFAULT_UPDATE_WINDOW),
+            sensor_group_data.get(CONF_MIN_UPDATE_INTERVAL, DEFAULT_MIN_UPDATE_INTERVAL),
+        )
+
+    @property
+    def tracked_entities(self):
+        entities = [self.sensor_group.get(CONF_REF_SENSOR), self.sensor_group.get(CONF_TEMP_SENSOR)]
+        if self.sensor_group.get(CONF_WIND_SENSOR):
+            entities.append(self.sensor_group.get(CONF_WIND_SENSOR))
+        return [e for e in entities if e]
+
+    @callback
+    def async_add_listener(self, update_callback, string, forecast_callback=None, key=None):
+        """Registra un string (``StringConfig``). Devuelve la función para darlo de baja.
+
+        ``update_callback(ref, result)`` recibe los datos de referencia del grupo y el
+        resultado de ese string (``None`` de noche). ``forecast_callback(forecast)``, si
+        se indica, recibe la previsión del string cada vez que se recalcula. ``key``
+        identifica el registro para ``async_update_string`` (por defecto, uno nuevo).
+        """
+        if key is None:
+            key = object()
+        self._listeners[key] = (update_callback, string, forecast_callback)
+        self._batch_keys = None
+
+        if self._unsub_track is None:
+            self._unsub_track = async_track_state_change_event(
+                self.hass, self.tracked_entities, self._handle_state_change
+            )
+            self.data = self._compute()
+            if self._forecast is not None:
+                self._forecast.async_start()
+        elif self._forecast is not None:
+            self._forecast.async_invalidate()
+
+        # El string recién añadido recibe el último cálculo sin esperar a un evento
+        if self.data is not None:
+            result = None
+            if not self.data["night"]:
+                result = evaluate_string(self.data, string)
+            update_callback(self.data, result)
+
+        @callback
+        def remove_listener():
+            self._listeners.pop(key, None)
+            self.forecast_results.pop(key, None)
+            self._batch_keys = None
+            if not self._listeners:
+                self._shutdown()
+
+        return remove_listener
+
+    @callback
+    def async_update_string(self, key, string):
+        """Sustituye la configuración de un string registrado y lo recalcula solo a él."""
+        listener = self._listeners.get(key)
+        if listener is None:
+            return
+        self._listeners[key] = (listener[0], string, listener[2])
+        self._batch_keys = None
+
+        if self.data is not None:
+            result = None
+            if not self.data["night"]:
+                result = evaluate_string(self.data, string)
+            listener[0](self.data, result)
+        if self._forecast is not None:
+            self._forecast.async_invalidate()
+
+    @callback
+    def _shutdown(self):
+        self._scheduler.async_cancel()
+        if self._forecast is not None:
+            self._forecast.async_stop()
+        if self._unsub_track is not None:
+            self._unsub_track()
+            self._unsub_track = None
+        self.data = None
+        coordinators = self.hass.data.get(DOMAIN, {}).get("coordinators", {})
+        if coordinators.get(self.group_id) is self:
+            del coordinators[self.group_id]
+
+    @callback
+    def _handle_state_change(self, event=None):
+        # La posición solar se calcula en el instante exacto de la muestra que dispara el cálculo
+        new_state = event.data.get("new_state") if event is not None else None
+        if new_state is not None:
+            self._trigger_time = new_state.last_updated
+
+        # Una ráfaga de cambios (irradiancia, temperatura, viento...) produce un único cálculo
+        self._scheduler.async_schedule()
+
+    @callback
+    def _refresh(self):
+        self.data = self._compute()
+        self._push()
+
+    @callback
+    def _push(self):
+        """Evalúa todos los strings de una vez y reparte los resultados."""
+        ref = self.data
+        if ref is None:
+            return
+
+        if self._batch_keys is None:
+            # Los strings han cambiado: reconstruir el lote vectorizado
+            self._batch_keys = list(self._listeners)
+            self._batch_strings = [self._listeners[key][1] for key in self._batch_keys]
+            self._batch = build_batch(self._batch_strings)
+
+        if ref["night"]:
+            results = [None] * len(self._batch_keys)
+        else:
+            results = evaluate_strings(ref, self._batch_strings, self._batch)
+
+        for key, result in zip(self._batch_keys, results):
+            listener = self._listeners.get(key)
+            if listener is not None:
+                listener[0](ref, result)
+
+    def forecast_strings(self):
+        """Devuelve ``(keys, strings)`` de los strings registrados, para la previsión."""
+        keys = list(self._listeners)
+        return keys, [self._listeners[key][1] for key in keys]
+
+    @callback
+    def async_set_forecast(self, keys, timestamps, powers):
+        """Guarda la previsión recalculada y la reparte a cada string."""
+        self.forecast_timestamps = timestamps
+        for key, power in zip(keys, powers):
+            listener = self._listeners.get(key)
+            if listener is None:
+                continue
+            forecast = {
+                "string": listener[1],
+                "power": power,
+                "summary": summarize_forecast(timestamps, power),
+            }
+            self.forecast_results[key] = forecast
+            if listener[2] is not None:
+                listener[2](forecast)
+
+    @callback
+    def async_refresh_forecast_summaries(self):
+        """Recalcula los resúmenes de hoy/mañana de la última previsión (cambio de día)."""
+        for key, forecast in list(self.forecast_results.items()):
+            listener = self._listeners.get(key)
+            if listener is None:
+                continue
+            forecast = {**forecast, "summary": summarize_forecast(self.forecast_timestamps, forecast["power"])}
+            self.forecast_results[key] = forecast
+            if listener[2] is not None:
+                listener[2](forecast)
+
+    def _compute(self):
+        """Cálculos del lado de referencia, comunes a todos los strings del grupo."""
+        # 1. Datos Solares (posición calculada, sin depender de sun.sun)
+        timestamp = (self._trigger_time or dt_util.utcnow()).timestamp()
+        self._trigger_time = None
+        sun_az, sun_el = get_solar_position_cache(self.hass).position(timestamp)
+
+        if sun_el <= 0:
+            return {"night": True, "timestamp": timestamp, "sun_az": sun_az, "sun_el": sun_el}
+
+        # 2. Datos del Sensor de Referencia
+        irr_ref = get_float_state(self.hass, self.sensor_group.get(CONF_REF_SENSOR), 0.0)
+
+        # 3. Datos Ambientales
+        t_amb = get_float_state(self.hass, self.sensor_group.get(CONF_TEMP_SENSOR), 25.0)
+
+        wind_speed = 1.0
+        wind_sensor = self.sensor_group.get(CONF_WIND_SENSOR)
+        if wind_sensor:
+            wind_speed = get_float_state(self.hass, wind_sensor, 1.0)
+
+        # 4. Geometría del Sensor de Referencia
+        sun = sun_trig(sun_az, sun_el)
+        cos_theta_ref = self.ref_surface.cos_incidence(sun)
+        doy = day_of_year(timestamp)
+
+        # 5. Descomposición (Erbs): GHI/DNI/DHI a partir de la lectura de referencia
+        # Una única descomposición por grupo; todos los strings transponen estas componentes
+        model = self.transposition_model
+        ghi, dni, dhi, kt = decompose(irr_ref, self.ref_surface, sun, doy, model)
+        k = dhi / ghi if ghi > 0 else 1.0 # Fracción difusa
+        f1, f2, circumsolar = sky_diffuse_terms(dni, dhi, sun["cos_zenith"], doy, model)
+
+        # 6. Cielo despejado (Ineichen) e índice de cielo despejado en el plano de referencia
+        config = self.hass.config
+        tl = linke_turbidity(config.latitude, config.longitude, doy)
+        clear_sky_ghi, clear_sky_dni, clear_sky_dhi = ineichen(sun["cos_zenith"], tl, config.elevation or 0, doy)
+        clear_sky_ref = plane_irradiance(
+            clear_sky_dni, clear_sky_dhi, clear_sky_ghi, cos_theta_ref, self.ref_surface,
+            sky_diffuse_terms(clear_sky_dni, clear_sky_dhi, sun["cos_zenith"], doy, model),
+        )
+        clear_sky_index = irr_ref / clear_sky_ref if clear_sky_ref >= 50 else None
+
+        return {
+            "night": False,
+            "timestamp": timestamp,
+            "sun_az": sun_az,
+            "sun_el": sun_el,
+            "sun": sun,
+            "irr_ref": irr_ref,
+            "t_amb": t_amb,
+            "wind_speed": wind_speed,
+            "ghi": ghi,
+            "dni": dni,
+            "dhi": dhi,
+            "kt": kt,
+            "k": k,
+            "f1": f1,
+            "f2": f2,
+            "circumsolar": circumsolar,
+            "cos_theta_ref": cos_theta_ref,
+            "linke_turbidity": tl,
+            "clear_sky_ghi": clear_sky_ghi,
+            "clear_sky_index": clear_sky_index,
+        }
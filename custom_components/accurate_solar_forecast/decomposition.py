@@ -0,0 +1,216 @@
+"""Irradiance decomposition for the Accurate Solar Forecast sensor groups.
+
+The reference sensor of a sensor group measures a single value, either on the
+horizontal plane or on a tilted plane. This module turns that reading into the
+three components every string needs (GHI, DNI, DHI) with the Erbs et al. (1982)
+clearness-index correlation. It runs once per sensor group update and once per
+forecast horizon; the strings only transpose the shared components.
+
+The sky-diffuse transposition is either isotropic or Perez (1990). Everything
+in the Perez model that only depends on the sky (clearness bin, brightness, F1,
+F2) is also computed here, once per update, so each string just evaluates
+``DHI·((1 - F1)·sky_view + F1/b·cos(AOI) + F2·sin(tilt))``. The isotropic model
+is the same expression with ``F1 = F2 = 0``.
+
+Functions accept scalars or NumPy arrays, like ``clearsky``.
+"""
+import math
+from bisect import bisect_right
+from .const import DEFAULT_ALBEDO, TRANSPOSITION_PEREZ
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy ships with Home Assistant, but stay safe
+    np = None
+
+# Límites habituales (mismos que pvlib) para no disparar la DNI cerca del horizonte
+MIN_COS_ZENITH = 0.065
+MAX_ZENITH_COS = math.cos(math.radians(87))
+
+# Perez 1990 ("allsitescomposite1990"): límites de los intervalos de claridad (epsilon)
+# y coeficientes [f11, f12, f13] / [f21, f22, f23] de cada intervalo
+PEREZ_EPSILON_BINS = (1.065, 1.23, 1.5, 1.95, 2.8, 4.5, 6.2)
+PEREZ_F1 = (
+    (-0.0080, 0.5880, -0.0620),
+    (0.1300, 0.6830, -0.1510),
+    (0.3300, 0.4870, -0.2210),
+    (0.5680, 0.1870, -0.2950),
+    (0.8730, -0.3920, -0.3620),
+    (1.1320, -1.2370, -0.4120),
+    (1.0600, -1.6000, -0.3590),
+    (0.6780, -0.3270, -0.2500),
+)
+PEREZ_F2 = (
+    (-0.0600, 0.0720, -0.0220),
+    (-0.0190, 0.0660, -0.0290),
+    (0.0550, -0.0640, -0.0260),
+    (0.1090, -0.1520, -0.0140),
+    (0.2260, -0.4620, 0.0010),
+    (0.2880, -0.8230, 0.0560),
+    (0.2640, -1.1270, 0.1310),
+    (0.1560, -1.3770, 0.2510),
+)
+PEREZ_KAPPA = 1.041 # cenit en radianes
+PEREZ_MIN_COS_ZENITH = math.cos(math.radians(85))
+
+if np is not None:
+    _PEREZ_BINS_ARRAY = np.array(PEREZ_EPSILON_BINS)
+    _PEREZ_F1_ARRAY = np.array(PEREZ_F1)
+    _PEREZ_F2_ARRAY = np.array(PEREZ_F2)
+
+# Inversión desde un plano inclinado
+INVERSION_MAX_ITERATIONS = 10
+INVERSION_TOLERANCE = 0.5 # W/m²
+
+
+def extraterrestrial_irradiance(doy):
+    """Irradiancia extraterrestre normal (W/m²) para un día del año."""
+    xp = np if np is not None and isinstance(doy, np.ndarray) else math
+    return 1367.7 * (1 + 0.033 * xp.cos(2 * math.pi * doy / 365.0))
+
+
+def erbs(ghi, cos_zenith, doy):
+    """Separa la GHI en componentes con la correlación de Erbs.
+
+    Returns ``(dni, dhi, kt)``: direct normal and diffuse horizontal irradiance in
+    W/m² and the clearness index.
+    """
+    if np is not None and isinstance(ghi, np.ndarray):
+        return _erbs_array(ghi, cos_zenith, doy)
+
+    if ghi <= 0 or cos_zenith <= 0:
+        return 0.0, max(0.0, ghi), 0.0
+
+    kt = ghi / (extraterrestrial_irradiance(doy) * max(cos_zenith, MIN_COS_ZENITH))
+    kt = max(0.0, min(1.0, kt))
+    if kt <= 0.22:
+        diffuse_fraction = 1 - 0.09 * kt
+    elif kt <= 0.8:
+        diffuse_fraction = 0.9511 - 0.1604 * kt + 4.388 * kt ** 2 - 16.638 * kt ** 3 + 12.336 * kt ** 4
+    else:
+        diffuse_fraction = 0.165
+
+    dhi = diffuse_fraction * ghi
+    if cos_zenith < MAX_ZENITH_COS:
+        return 0.0, ghi, kt
+    dni = (ghi - dhi) / max(cos_zenith, MIN_COS_ZENITH)
+    return dni, dhi, kt
+
+
+def _erbs_array(ghi, cos_zenith, doy):
+    ghi = np.maximum(ghi, 0.0)
+    safe_cos = np.maximum(cos_zenith, MIN_COS_ZENITH)
+    kt = np.clip(ghi / (extraterrestrial_irradiance(doy) * safe_cos), 0.0, 1.0)
+    kt = np.where(cos_zenith > 0, kt, 0.0)
+
+    diffuse_fraction = np.where(
+        kt <= 0.22,
+        1 - 0.09 * kt,
+        np.where(
+            kt <= 0.8,
+            0.9511 - 0.1604 * kt + 4.388 * kt ** 2 - 16.638 * kt ** 3 + 12.336 * kt ** 4,
+            0.165,
+        ),
+    )
+    dhi = diffuse_fraction * ghi
+    dni = np.where(cos_zenith >= MAX_ZENITH_COS, (ghi - dhi) / safe_cos, 0.0)
+    dhi = np.where(cos_zenith >= MAX_ZENITH_COS, dhi, ghi)
+    return dni, dhi, kt
+
+
+def relative_airmass(cos_zenith):
+    """Masa de aire relativa (Kasten y Young, 1989)."""
+    if np is not None and isinstance(cos_zenith, np.ndarray):
+        zenith = np.degrees(np.arccos(cos_zenith))
+    else:
+        zenith = math.degrees(math.acos(cos_zenith))
+    return 1.0 / (cos_zenith + 0.50572 * (96.07995 - zenith) ** -1.6364)
+
+
+def sky_diffuse_terms(dni, dhi, cos_zenith, doy, model=None):
+    """Términos del cielo para la transposición de la difusa: ``(f1, f2, circumsolar)``.
+
+    ``circumsolar`` is ``F1 / max(cos(zenith), cos(85°))``, so a surface only adds
+    ``circumsolar·cos(AOI)``. The isotropic model (any ``model`` other than Perez)
+    returns zeros.
+    """
+    if np is not None and isinstance(dhi, np.ndarray):
+        return _perez_array(dni, dhi, cos_zenith, doy) if model == TRANSPOSITION_PEREZ else (0.0, 0.0, 0.0)
+
+    if model != TRANSPOSITION_PEREZ or dhi <= 0 or cos_zenith <= 0:
+        return 0.0, 0.0, 0.0
+
+    zenith = math.acos(min(1.0, cos_zenith))
+    kz3 = PEREZ_KAPPA * zenith ** 3
+    epsilon = ((dhi + dni) / dhi + kz3) / (1 + kz3)
+    delta = dhi * relative_airmass(cos_zenith) / extraterrestrial_irradiance(doy)
+
+    index = bisect_right(PEREZ_EPSILON_BINS, epsilon)
+    f11, f12, f13 = PEREZ_F1[index]
+    f21, f22, f23 = PEREZ_F2[index]
+    f1 = max(0.0, f11 + f12 * delta + f13 * zenith)
+    f2 = f21 + f22 * delta + f23 * zenith
+    return f1, f2, f1 / max(cos_zenith, PEREZ_MIN_COS_ZENITH)
+
+
+def _perez_array(dni, dhi, cos_zenith, doy):
+    lit = (dhi > 0) & (cos_zenith > 0)
+    safe_dhi = np.where(lit, dhi, 1.0)
+    safe_cos = np.clip(cos_zenith, 1e-6, 1.0)
+    zenith = np.arccos(safe_cos)
+    kz3 = PEREZ_KAPPA * zenith ** 3
+    epsilon = ((safe_dhi + dni) / safe_dhi + kz3) / (1 + kz3)
+    delta = safe_dhi * relative_airmass(safe_cos) / extraterrestrial_irradiance(doy)
+
+    index = np.searchsorted(_PEREZ_BINS_ARRAY, epsilon, side="right")
+    f1c = _PEREZ_F1_ARRAY[index]
+    f2c = _PEREZ_F2_ARRAY[index]
+    f1 = np.where(lit, np.maximum(0.0, f1c[..., 0] + f1c[..., 1] * delta + f1c[..., 2] * zenith), 0.0)
+    f2 = np.where(lit, f2c[..., 0] + f2c[..., 1] * delta + f2c[..., 2] * zenith, 0.0)
+    return f1, f2, f1 / np.maximum(safe_cos, PEREZ_MIN_COS_ZENITH)
+
+
+def plane_irradiance(dni, dhi, ghi, cos_incidence, surface, sky=(0.0, 0.0, 0.0), albedo=DEFAULT_ALBEDO):
+    """Irradiancia en un plano: directa + difusa de cielo + reflejada por el suelo.
+
+    ``sky`` are the terms of :func:`sky_diffuse_terms` (isotropic by default).
+    """
+    f1, f2, circumsolar = sky
+    sky_diffuse = dhi * ((1 - f1) * surface.sky_view + circumsolar * cos_incidence + f2 * surface.sin_tilt)
+    return dni * cos_incidence + max(0.0, sky_diffuse) + ghi * albedo * surface.ground_view
+
+
+def decompose(irr_ref, surface, sun, doy, model=None, albedo=DEFAULT_ALBEDO):
+    """Componentes ``(ghi, dni, dhi, kt)`` a partir de la lectura del sensor de referencia.
+
+    ``surface`` is the reference ``Surface`` and ``sun`` the output of
+    ``engine.sun_trig``. A horizontal sensor already measures GHI; for a tilted one
+    the GHI whose Erbs split transposes back to the measured value (with the group's
+    transposition ``model``) is found by fixed-point iteration (a few steps, the
+    relation is close to linear).
+    """
+    cos_zenith = sun["cos_zenith"]
+    if irr_ref <= 0 or cos_zenith <= 0:
+        return 0.0, 0.0, 0.0, 0.0
+
+    if surface.tilt < 1:
+        dni, dhi, kt = erbs(irr_ref, cos_zenith, doy)
+        return irr_ref, dni, dhi, kt
+
+    cos_incidence = surface.cos_incidence(sun)
+    ghi_max = extraterrestrial_irradiance(doy) * max(cos_zenith, MIN_COS_ZENITH)
+    ghi = min(irr_ref, ghi_max)
+    best = None
+    for _ in range(INVERSION_MAX_ITERATIONS):
+        dni, dhi, kt = erbs(ghi, cos_zenith, doy)
+        sky = sky_diffuse_terms(dni, dhi, cos_zenith, doy, model)
+        poa = plane_irradiance(dni, dhi, ghi, cos_incidence, surface, sky, albedo)
+        error = abs(poa - irr_ref)
+        if best is None or error < best[0]:
+            best = (error, ghi, dni, dhi, kt)
+        if poa <= 0 or error < INVERSION_TOLERANCE:
+            break
+        ghi = min(ghi * irr_ref / poa, ghi_max)
+
+    # Los saltos entre intervalos de Perez pueden impedir el ajuste exacto: se usa la mejor iteración
+    return best[1:]
@@ -0,0 +1,107 @@
+"""Cached resolution of the device an Accurate Solar Forecast entry links to.
+
+String entities attach to the device of their real production sensor (inverter)
+and the sensor group status sensor to the device of its irradiance sensor. Each
+of those entities used to walk entity registry → device registry on its own (the
+number entities on every ``device_info`` access). The resolver does it once per
+config entry and keeps the answer until the entity or device registry reports a
+change that concerns it. ``async_shutdown`` removes its registry listeners when the
+last entry of the integration is unloaded.
+"""
+import logging
+from homeassistant.core import callback
+from homeassistant.helpers import device_registry as dr, entity_registry as er
+from .const import *
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def get_device_resolver(hass):
+    """Devuelve el resolvedor compartido, creándolo si no existe."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    resolver = domain_data.get("device_resolver")
+    if resolver is None:
+        resolver = domain_data["device_resolver"] = DeviceResolver(hass)
+    return resolver
+
+
+class DeviceResolver:
+    """Maps ``(entry_id, entity_id)`` to the identifiers of the entity's device."""
+
+    def __init__(self, hass):
+        self.hass = hass
+        self._cache = {} # entry_id -> (entity_id, device_id, identifiers, name)
+        # Cambios en los registros (dispositivo reasignado, entidad renombrada o borrada...)
+        self._unsubs = [
+            hass.bus.async_listen(er.EVENT_ENTITY_REGISTRY_UPDATED, self._async_entity_updated),
+            hass.bus.async_listen(dr.EVENT_DEVICE_REGISTRY_UPDATED, self._async_device_updated),
+        ]
+
+    @callback
+    def async_shutdown(self):
+        """Deja de escuchar los registros y olvida lo resuelto."""
+        for unsub in self._unsubs:
+            unsub()
+        self._unsubs = []
+        self._cache.clear()
+
+    @callback
+    def async_resolve(self, entry_id, entity_id):
+        """Identificadores del dispositivo de ``entity_id`` (o None si no tiene)."""
+        return self._async_lookup(entry_id, entity_id)[2]
+
+    @callback
+    def async_resolve_device(self, entry_id, entity_id):
+        """``(device_id, nombre, identificadores)`` del dispositivo de ``entity_id``, o None."""
+        _, device_id, identifiers, name = self._async_lookup(entry_id, entity_id)
+        if device_id is None:
+            return None
+        return device_id, name, identifiers
+
+    @callback
+    def _async_lookup(self, entry_id, entity_id):
+        if not entity_id:
+            return (None, None, None, None)
+        cached = self._cache.get(entry_id)
+        if cached is not None and cached[0] == entity_id:
+            return cached
+
+        device_id = None
+        identifiers = None
+        name = None
+        try:
+            entity_entry = er.async_get(self.hass).async_get(entity_id)
+            if entity_entry and entity_entry.device_id:
+                device = dr.async_get(self.hass).async_get(entity_entry.device_id)
+                if device:
+                    device_id = device.id
+                    identifiers = device.identifiers
+                    name = device.name_by_user or device.name
+        except Exception as e:
+            _LOGGER.warning(f"Could not link to existing device: {e}")
+            return (entity_id, None, None, None)
+
+        cached = self._cache[entry_id] = (entity_id, device_id, identifiers, name)
+        return cached
+
+    @callback
+    def async_invalidate(self, entry_id=None):
+        """Olvida lo resuelto para una entrada (o para todas)."""
+        if entry_id is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(entry_id, None)
+
+    @callback
+    def _async_entity_updated(self, event):
+        entity_ids = {event.data.get("entity_id"), event.data.get("old_entity_id")}
+        for entry_id, (entity_id, _, _, _) in list(self._cache.items()):
+            if entity_id in entity_ids:
+                del self._cache[entry_id]
+
+    @callback
+    def _async_device_updated(self, event):
+        device_id = event.data.get("device_id")
+        for entry_id, (_, cached_device_id, _, _) in list(self._cache.items()):
+            if cached_device_id == device_id:
+                del self._cache[entry_id]
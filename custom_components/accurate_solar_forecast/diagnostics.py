@@ -0,0 +1,28 @@
+"""Diagnostics download for Accurate Solar Forecast config entries."""
+from .const import *
+from .instrumentation import get_instrumentation
+
+
+async def async_get_config_entry_diagnostics(hass, entry):
+    """Configuración de la entrada, ajustes globales y métricas del camino caliente."""
+    domain_data = hass.data.get(DOMAIN, {})
+    db = domain_data.get("db")
+    settings = dict(db.settings) if db is not None else {}
+
+    instrumentation = get_instrumentation(hass)
+    if instrumentation is not None:
+        metrics = {"enabled": True, **instrumentation.summary()}
+    else:
+        metrics = {"enabled": False}
+
+    return {
+        "entry": {
+            "title": entry.title,
+            "data": dict(entry.data),
+        },
+        "settings": settings,
+        "instrumentation": metrics,
+        "solar_position_cache": {
+            step: cache.stats() for step, cache in domain_data.get("solar_position_cache", {}).items()
+        },
+    }
@@ -0,0 +1,58 @@
+"""Incremental energy integration (W → kWh) for the Accurate Solar Forecast strings.
+
+The string sensor and the performance sensor already receive every estimate and
+every real production sample. Each of them feeds an ``EnergyIntegrator`` kept in
+the string's ``StringContext`` from that same update path, so the energy sensors
+need no listener of their own: they restore their total on start-up and write
+when the integrator tells them the total moved.
+"""
+ENERGY_ESTIMATED = "estimated"
+ENERGY_REAL = "real"
+ENERGY_KINDS = (ENERGY_ESTIMATED, ENERGY_REAL)
+
+# Huecos mayores (reinicio, sensor no disponible) no se integran
+ENERGY_MAX_GAP = 3600 # s
+
+
+class EnergyIntegrator:
+    """Trapezoidal integration of a power signal into a monotonic kWh total."""
+
+    def __init__(self):
+        self.total = 0.0 # kWh
+        self._last = None # (timestamp, power_w)
+        self._listener = None
+        self.restored = False
+
+    def set_listener(self, update_callback):
+        """``update_callback()`` se llama cuando el total crece (el sensor de energía)."""
+        self._listener = update_callback
+
+    def reset_sample(self):
+        """Corta la integración (el siguiente dato solo abre un nuevo tramo)."""
+        self._last = None
+
+    def restore(self, total):
+        """Suma el total restaurado del sensor a lo integrado desde el arranque (una sola vez)."""
+        if self.restored:
+            return
+        self.restored = True
+        self.total += max(0.0, total)
+
+    def add(self, timestamp, power_w):
+        """Integra hasta ``timestamp``. Devuelve el incremento en kWh."""
+        power_w = max(0.0, power_w)
+        last = self._last
+        self._last = (timestamp, power_w)
+        if last is None:
+            return 0.0
+
+        dt = timestamp - last[0]
+        if dt <= 0 or dt > ENERGY_MAX_GAP:
+            return 0.0
+
+        increment = (last[1] + power_w) / 2 * dt / 3_600_000
+        if increment > 0:
+            self.total += increment
+            if self._listener is not None:
+                self._listener()
+        return increment
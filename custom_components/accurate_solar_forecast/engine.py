@@ -0,0 +1,246 @@
+"""Transposition, thermal and power engine for the Accurate Solar Forecast strings.
+
+The same chain of formulas is available as a scalar implementation (plain ``math``)
+and as a vectorized NumPy implementation that evaluates every string attached to a
+sensor group in a single pass. NumPy is optional: when it is not installed the
+scalar path is used for every string.
+"""
+import math
+from .const import CONF_TILT, CONF_AZIMUTH, CONF_NUM_PANELS, CONF_NUM_STRINGS, CONF_STRING_NAME, DEFAULT_ALBEDO
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy ships with Home Assistant, but stay safe
+    np = None
+
+# Por debajo de este número de strings el overhead de NumPy no compensa
+BATCH_MIN_SIZE = 4
+
+# Parámetros de panel por defecto (mismos valores que usaba el sensor)
+DEFAULT_P_STC = 400
+DEFAULT_GAMMA = -0.4
+DEFAULT_NOCT = 45
+DEFAULT_VMP = 30.0
+DEFAULT_IMP = 10.0
+
+
+class Surface:
+    """Immutable tilt/azimuth of a surface with its trigonometry precomputed.
+
+    Tilt and azimuth only change when the user reconfigures them, so the sines and
+    cosines are computed once here instead of on every update.
+    """
+
+    __slots__ = ("tilt", "azimuth", "sin_tilt", "cos_tilt", "sin_az", "cos_az", "sky_view", "ground_view")
+
+    def __init__(self, tilt, azimuth):
+        tilt = float(tilt or 0)
+        azimuth = float(azimuth if azimuth is not None else 180)
+        tilt_rad = math.radians(tilt)
+        az_rad = math.radians(azimuth)
+        object.__setattr__(self, "tilt", tilt)
+        object.__setattr__(self, "azimuth", azimuth)
+        object.__setattr__(self, "sin_tilt", math.sin(tilt_rad))
+        object.__setattr__(self, "cos_tilt", math.cos(tilt_rad))
+        object.__setattr__(self, "sin_az", math.sin(az_rad))
+        object.__setattr__(self, "cos_az", math.cos(az_rad))
+        # Factores de visión del cielo y del suelo (difusa isotrópica y reflejada)
+        object.__setattr__(self, "sky_view", (1 + math.cos(tilt_rad)) / 2)
+        object.__setattr__(self, "ground_view", (1 - math.cos(tilt_rad)) / 2)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def cos_incidence(self, sun):
+        """Coseno del ángulo de incidencia (>= 0) para una posición solar de ``sun_trig``."""
+        cos_az_diff = sun["cos_az"] * self.cos_az + sun["sin_az"] * self.sin_az
+        return max(0, sun["cos_zenith"] * self.cos_tilt + sun["sin_zenith"] * self.sin_tilt * cos_az_diff)
+
+
+class StringConfig(Surface):
+    """Immutable, resolved configuration of a string for the hot path.
+
+    Holds the panel geometry plus the panel parameters resolved from ``PVDatabase``
+    and the series/parallel counts, so an update never has to look them up again.
+    """
+
+    __slots__ = ("name", "p_stc", "gamma", "noct", "noct_factor", "vmp", "imp",
+                 "num_series", "num_parallel", "total_panels")
+
+    def __init__(self, tilt, azimuth, p_stc, gamma, noct, vmp, imp, num_series=1, num_parallel=1, name=None):
+        super().__init__(tilt, azimuth)
+        values = {
+            "name": name,
+            "p_stc": float(p_stc),
+            "gamma": float(gamma) / 100.0,
+            "noct": float(noct),
+            "noct_factor": (float(noct) - 20) / 800,
+            "vmp": float(vmp),
+            "imp": float(imp),
+            "num_series": int(num_series),
+            "num_parallel": int(num_parallel),
+            "total_panels": int(num_series) * int(num_parallel),
+        }
+        for key, value in values.items():
+            object.__setattr__(self, key, value)
+
+    @classmethod
+    def from_config(cls, config, panel_data):
+        """Construye la configuración a partir de los datos del string y de su panel."""
+        return cls(
+            config.get(CONF_TILT),
+            config.get(CONF_AZIMUTH),
+            panel_data.get("p_stc", DEFAULT_P_STC),
+            panel_data.get("gamma", DEFAULT_GAMMA),
+            panel_data.get("noct", DEFAULT_NOCT),
+            panel_data.get("vmp", DEFAULT_VMP),
+            panel_data.get("imp", DEFAULT_IMP),
+            config.get(CONF_NUM_PANELS, 1),
+            config.get(CONF_NUM_STRINGS, 1),
+            config.get(CONF_STRING_NAME),
+        )
+
+
+def sun_trig(sun_az, sun_el):
+    """Trigonometría de la posición solar, común a todas las superficies.
+
+    Acepta escalares o arrays de NumPy (por ejemplo, todo un horizonte de previsión).
+    """
+    xp = np if np is not None and isinstance(sun_el, np.ndarray) else math
+    sol_zenith_rad = xp.radians(90 - sun_el)
+    sol_az_rad = xp.radians(sun_az)
+    return {
+        "cos_zenith": xp.cos(sol_zenith_rad),
+        "sin_zenith": xp.sin(sol_zenith_rad),
+        "cos_az": xp.cos(sol_az_rad),
+        "sin_az": xp.sin(sol_az_rad),
+    }
+
+
+def evaluate_string(ref, string):
+    """Scalar path: evaluates one ``StringConfig`` against the reference data of its group."""
+    cos_theta_target = string.cos_incidence(ref["sun"])
+
+    # Transposición a partir de las componentes del grupo: directa + difusa + reflejada
+    # Difusa de cielo (Perez): los términos f1, f2 y circunsolar vienen calculados por el grupo
+    sky_diffuse = ref["dhi"] * ((1 - ref["f1"]) * string.sky_view
+                                + ref["circumsolar"] * cos_theta_target
+                                + ref["f2"] * string.sin_tilt)
+    irr_target = (ref["dni"] * cos_theta_target
+                  + max(0.0, sky_diffuse)
+                  + ref["ghi"] * DEFAULT_ALBEDO * string.ground_view)
+
+    irr_ref = ref["irr_ref"]
+    geometric_factor = irr_target / irr_ref if irr_ref >= 1 else 0 # Evitar división por cero
+
+    # Modelo Térmico
+    t_cell = ref["t_amb"] + irr_target * string.noct_factor
+
+    # Potencia DC
+    temp_factor_power = 1 + (string.gamma * (t_cell - 25))
+    power_unit = string.p_stc * (irr_target / 1000.0) * temp_factor_power
+    total_power = max(0, power_unit * string.total_panels)
+
+    # Voltaje e Intensidad (Estimación)
+    if irr_target < 1:
+        v_string = 0
+        i_total = 0
+    else:
+        v_string = string.vmp * string.num_series * temp_factor_power
+        i_total = string.imp * (irr_target / 1000.0) * string.num_parallel
+
+    return {
+        "irr_target": irr_target,
+        "geometric_factor": geometric_factor,
+        "t_cell": t_cell,
+        "power": total_power,
+        "v_string": v_string,
+        "i_total": i_total,
+    }
+
+
+class StringBatch:
+    """Column-oriented copy of many ``StringConfig`` objects for the NumPy path."""
+
+    def __init__(self, strings):
+        self.size = len(strings)
+
+        def column(key):
+            return np.fromiter((getattr(string, key) for string in strings), dtype=np.float64, count=self.size)
+
+        self.sin_tilt = column("sin_tilt")
+        self.cos_tilt = column("cos_tilt")
+        self.sin_az = column("sin_az")
+        self.cos_az = column("cos_az")
+        self.sky_view = column("sky_view")
+        self.ground_view = column("ground_view")
+        self.p_stc_total = column("p_stc") * column("total_panels")
+        self.gamma = column("gamma")
+        self.noct_factor = column("noct_factor")
+        self.vmp_series = column("vmp") * column("num_series")
+        self.imp_parallel = column("imp") * column("num_parallel")
+
+    def evaluate(self, ref):
+        """Vectorized path: returns a dict of arrays, one element per string.
+
+        The reference values may also be column arrays of shape ``(T, 1)`` (one row per
+        instant of a forecast horizon); the results then have shape ``(T, strings)``.
+        """
+        sun = ref["sun"]
+        cos_az_diff = sun["cos_az"] * self.cos_az + sun["sin_az"] * self.sin_az
+        cos_theta_target = np.maximum(
+            0.0, sun["cos_zenith"] * self.cos_tilt + sun["sin_zenith"] * self.sin_tilt * cos_az_diff
+        )
+
+        sky_diffuse = ref["dhi"] * ((1 - ref["f1"]) * self.sky_view
+                                    + ref["circumsolar"] * cos_theta_target
+                                    + ref["f2"] * self.sin_tilt)
+        irr_target = (ref["dni"] * cos_theta_target
+                      + np.maximum(0.0, sky_diffuse)
+                      + ref["ghi"] * DEFAULT_ALBEDO * self.ground_view)
+
+        irr_ref = ref["irr_ref"]
+        geometric_factor = np.where(irr_ref >= 1, irr_target / np.maximum(irr_ref, 1), 0.0)
+        t_cell = ref["t_amb"] + irr_target * self.noct_factor
+        temp_factor_power = 1 + self.gamma * (t_cell - 25)
+        irr_ratio = irr_target / 1000.0
+
+        total_power = np.maximum(0.0, self.p_stc_total * irr_ratio * temp_factor_power)
+
+        lit = irr_target >= 1
+        v_string = np.where(lit, self.vmp_series * temp_factor_power, 0.0)
+        i_total = np.where(lit, self.imp_parallel * irr_ratio, 0.0)
+
+        return {
+            "irr_target": irr_target,
+            "geometric_factor": geometric_factor,
+            "t_cell": t_cell,
+            "power": total_power,
+            "v_string": v_string,
+            "i_total": i_total,
+        }
+
+
+def evaluate_strings(ref, strings, batch=None):
+    """Evaluates all strings and returns one result dict per string.
+
+    Uses the vectorized ``batch`` (see :func:`build_batch`) when available and falls
+    back to the scalar path otherwise.
+    """
+    if batch is None:
+        return [evaluate_string(ref, string) for string in strings]
+
+    arrays = batch.evaluate(ref)
+    keys = list(arrays)
+    columns = [arrays[key].tolist() for key in keys]
+    return [dict(zip(keys, row)) for row in zip(*columns)]
+
+
+def build_batch(strings):
+    """Devuelve un StringBatch si NumPy está disponible y compensa, o None."""
+    if np is None or len(strings) < BATCH_MIN_SIZE:
+        return None
+    return StringBatch(strings)
@@ -0,0 +1,257 @@
+"""Day-ahead power forecast for the Accurate Solar Forecast strings.
+
+The hourly forecast of the sensor group's weather entity (cloud coverage, temperature,
+wind) is resampled to 15-minute steps, turned into horizontal irradiance with a
+clear-sky model and a cloud attenuation, and fed through the same decomposition,
+transposition, thermal and power chain used for the live estimate (see ``engine``). All strings of a
+sensor group and all instants of the horizon are evaluated in one vectorized batch.
+"""
+import logging
+from datetime import datetime, timedelta
+from homeassistant.core import callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.event import async_track_state_change_event, async_track_time_change, async_track_time_interval
+from homeassistant.util import dt as dt_util
+from .const import *
+from .clearsky import cloud_attenuation, day_of_year, ineichen, linke_turbidity
+from .decomposition import erbs, sky_diffuse_terms
+from .engine import StringBatch, evaluate_string, np, sun_trig
+from .solar_position import get_solar_position_cache
+from .scheduler import CoalescingScheduler
+
+_LOGGER = logging.getLogger(__name__)
+
+FORECAST_STEP = SOLAR_POSITION_FORECAST_STEP
+
+
+def parse_hourly_forecast(items, temperature_unit=None):
+    """Convierte la previsión horaria de una entidad weather en filas ordenadas.
+
+    Each row is ``(timestamp, cloud_coverage, temperature, wind_speed)``. Items without
+    a usable datetime are skipped; a missing cloud coverage is estimated from the
+    condition.
+    """
+    rows = []
+    for item in items or []:
+        when = item.get("datetime")
+        if isinstance(when, str):
+            when = dt_util.parse_datetime(when)
+        if not isinstance(when, datetime):
+            continue
+
+        cloud = item.get("cloud_coverage")
+        if cloud is None:
+            cloud = CONDITION_CLOUD_COVERAGE.get(item.get("condition"), 0)
+
+        temperature = item.get("temperature")
+        if temperature is None:
+            temperature = 25.0
+        elif temperature_unit == "°F":
+            temperature = (float(temperature) - 32) * 5 / 9
+
+        try:
+            rows.append((when.timestamp(), float(cloud), float(temperature), float(item.get("wind_speed") or 0.0)))
+        except (TypeError, ValueError):
+            continue
+
+    rows.sort()
+    return rows
+
+
+def forecast_timestamps(start, rows, hours=FORECAST_HOURS, step=FORECAST_STEP):
+    """Instantes del horizonte: desde ``start`` (redondeado al paso) hasta el final de la previsión."""
+    first = int(start // step) * step
+    last = min(first + hours * 3600, rows[-1][0] + 3600) if rows else first
+    return list(range(first, int(last), step))
+
+
+def compute_forecast(rows, strings, timestamps, position_cache, altitude=0, model=None):
+    """Calcula la potencia prevista (W) de cada string en cada instante.
+
+    Returns a list with one list of powers per string, aligned with ``timestamps``.
+    """
+    if not rows or not strings or not timestamps:
+        return [[] for _ in strings]
+
+    if np is None:
+        return _compute_forecast_scalar(rows, strings, timestamps, position_cache, altitude, model)
+
+    times = np.array(timestamps, dtype=np.float64)
+    row_times = np.array([row[0] for row in rows], dtype=np.float64)
+    cloud = np.interp(times, row_times, np.array([row[1] for row in rows]))
+    t_amb = np.interp(times, row_times, np.array([row[2] for row in rows]))
+
+    sun_az, sun_el = position_cache.positions(times)
+    sun = sun_trig(sun_az, sun_el)
+    cos_zenith = sun["cos_zenith"]
+
+    # Irradiancia horizontal prevista: cielo despejado (Ineichen) atenuado por la nubosidad
+    doy = day_of_year(times)
+    tl = linke_turbidity(position_cache.latitude, position_cache.longitude, doy)
+    ghi = ineichen(cos_zenith, tl, altitude, doy)[0] * cloud_attenuation(cloud)
+
+    # La GHI se descompone igual que la lectura de un sensor horizontal y pasa por la misma cadena
+    dni, dhi, _ = erbs(ghi, cos_zenith, doy)
+    column = lambda values: values[:, None] if isinstance(values, np.ndarray) else values
+    f1, f2, circumsolar = sky_diffuse_terms(dni, dhi, cos_zenith, doy, model)
+    ref = {
+        "sun": {key: column(value) for key, value in sun.items()},
+        "irr_ref": column(ghi),
+        "ghi": column(ghi),
+        "dni": column(dni),
+        "dhi": column(dhi),
+        "f1": column(f1),
+        "f2": column(f2),
+        "circumsolar": column(circumsolar),
+        "t_amb": column(t_amb),
+    }
+    power = StringBatch(strings).evaluate(ref)["power"]
+    power = np.where(column(sun_el) > 0, power, 0.0)
+    return power.T.tolist()
+
+
+def _compute_forecast_scalar(rows, strings, timestamps, position_cache, altitude=0, model=None):
+    """Fallback sin NumPy: mismo cálculo instante a instante (meteo escalonada por horas)."""
+    powers = [[] for _ in strings]
+    index = 0
+    for timestamp in timestamps:
+        while index < len(rows) - 1 and rows[index + 1][0] <= timestamp:
+            index += 1
+        _, cloud, t_amb, _ = rows[index]
+
+        sun_az, sun_el = position_cache.position(timestamp)
+        if sun_el <= 0:
+            for power in powers:
+                power.append(0.0)
+            continue
+
+        sun = sun_trig(sun_az, sun_el)
+        doy = day_of_year(timestamp)
+        tl = linke_turbidity(position_cache.latitude, position_cache.longitude, doy)
+        ghi = ineichen(sun["cos_zenith"], tl, altitude, doy)[0] * cloud_attenuation(cloud)
+        dni, dhi, _ = erbs(ghi, sun["cos_zenith"], doy)
+        f1, f2, circumsolar = sky_diffuse_terms(dni, dhi, sun["cos_zenith"], doy, model)
+        ref = {
+            "sun": sun,
+            "irr_ref": ghi,
+            "ghi": ghi,
+            "dni": dni,
+            "dhi": dhi,
+            "f1": f1,
+            "f2": f2,
+            "circumsolar": circumsolar,
+            "t_amb": t_amb,
+        }
+        for power, string in zip(powers, strings):
+            power.append(evaluate_string(ref, string)["power"])
+    return powers
+
+
+def summarize_forecast(timestamps, power, now=None):
+    """Energía prevista (kWh) para lo que queda de hoy y para mañana, en hora local."""
+    today = dt_util.start_of_local_day(now)
+    bounds = {
+        "today": (today.timestamp(), (today + timedelta(days=1)).timestamp()),
+        "tomorrow": ((today + timedelta(days=1)).timestamp(), (today + timedelta(days=2)).timestamp()),
+    }
+    step_hours = FORECAST_STEP / 3600
+    summary = {}
+    for label, (start, end) in bounds.items():
+        energy = sum(p for ts, p in zip(timestamps, power) if start <= ts < end) * step_hours
+        summary[label] = round(energy / 1000.0, 3)
+    return summary
+
+
+class ForecastEngine:
+    """Keeps the day-ahead forecast of a sensor group's strings up to date.
+
+    The weather entity's hourly forecast is fetched when the entity changes and every
+    ``FORECAST_POLL_MINUTES``; the (comparatively expensive) recomputation only runs
+    when that forecast actually changed or when strings are added or removed. The
+    today/tomorrow summaries are refreshed at local midnight from the last series.
+    """
+
+    def __init__(self, hass, coordinator, weather_entity):
+        self.hass = hass
+        self._coordinator = coordinator
+        self.weather_entity = weather_entity
+        self._rows = None
+        self._unsubs = []
+        self._fetching = False
+        self._recompute_scheduler = CoalescingScheduler(hass, self._recompute, 1.0)
+
+    @callback
+    def async_start(self):
+        self._unsubs = [
+            async_track_state_change_event(self.hass, [self.weather_entity], self._handle_trigger),
+            async_track_time_interval(self.hass, self._handle_trigger, timedelta(minutes=FORECAST_POLL_MINUTES)),
+            # "Hoy" y "mañana" cambian de día aunque la previsión no cambie
+            async_track_time_change(self.hass, self._handle_midnight, hour=0, minute=0, second=0),
+        ]
+        self._handle_trigger()
+
+    @callback
+    def async_stop(self):
+        for unsub in self._unsubs:
+            unsub()
+        self._unsubs = []
+        self._recompute_scheduler.async_cancel()
+
+    @callback
+    def async_invalidate(self):
+        """Los strings del grupo han cambiado: recalcular con la última previsión conocida."""
+        if self._rows:
+            self._recompute_scheduler.async_schedule()
+
+    @callback
+    def _handle_midnight(self, _now):
+        self._coordinator.async_refresh_forecast_summaries()
+
+    @callback
+    def _handle_trigger(self, *_):
+        if not self._fetching:
+            self._fetching = True
+            self.hass.async_create_task(self._async_update())
+
+    async def _async_update(self):
+        try:
+            rows = await self._async_fetch()
+        finally:
+            self._fetching = False
+
+        if not rows or rows == self._rows:
+            # Sin cambios en la previsión: no hay nada que recalcular
+            return
+
+        self._rows = rows
+        self._recompute()
+
+    async def _async_fetch(self):
+        try:
+            response = await self.hass.services.async_call(
+                "weather",
+                "get_forecasts",
+                {"entity_id": self.weather_entity, "type": "hourly"},
+                blocking=True,
+                return_response=True,
+            )
+        except HomeAssistantError as err:
+            _LOGGER.debug(f"Could not fetch hourly forecast from {self.weather_entity}: {err}")
+            return None
+
+        items = (response or {}).get(self.weather_entity, {}).get("forecast")
+        state = self.hass.states.get(self.weather_entity)
+        temperature_unit = state.attributes.get("temperature_unit") if state else None
+        return parse_hourly_forecast(items, temperature_unit)
+
+    @callback
+    def _recompute(self):
+        rows = self._rows
+        keys, strings = self._coordinator.forecast_strings()
+        timestamps = forecast_timestamps(dt_util.utcnow().timestamp(), rows)
+        position_cache = get_solar_position_cache(self.hass, SOLAR_POSITION_FORECAST_STEP)
+        powers = compute_forecast(
+            rows, strings, timestamps, position_cache,
+            self.hass.config.elevation or 0, self._coordinator.transposition_model,
+        )
+        self._coordinator.async_set_forecast(keys, timestamps, powers)
@@ -0,0 +1,238 @@
+"""Streaming bulk import of PV module catalogues into ``PVDatabase``.
+
+Supported files (by extension):
+
+* ``.csv``: one module per row, e.g. the CEC module library distributed with SAM.
+  Extra header rows (units, indexes) fail validation and are skipped.
+* ``.jsonl`` / ``.ndjson``: one JSON object per line.
+* ``.json``: a JSON array of objects, decoded incrementally object by object.
+
+The file is read in an executor thread one batch at a time, so memory stays
+bounded by ``IMPORT_BATCH_SIZE`` rows whatever the file size. Each batch is
+validated, deduplicated by model id and added to the database in one go; the
+modified catalogue shards are written once at the end, or every
+``IMPORT_FLUSH_MODELS`` models for very large files. Duplicates are only tracked
+inside a batch: a model repeated in a later batch is already in the resident
+catalogue index and is handled like any existing model.
+"""
+import csv
+import json
+import logging
+import os
+from .catalogue import model_id_for
+from .const import *
+
+_LOGGER = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = 500
+IMPORT_FLUSH_MODELS = 10000
+JSON_CHUNK_SIZE = 65536
+
+# Columnas aceptadas para cada campo (sin distinguir mayúsculas); incluye las de la librería CEC
+COLUMN_ALIASES = {
+    "name": ("name", "model", "model_name"),
+    "brand": ("brand", "manufacturer"),
+    "p_stc": ("p_stc", "stc", "pmax", "p_max", "power"),
+    "gamma": ("gamma", "gamma_r", "gamma_pmp", "gamma_pmax"),
+    "noct": ("noct", "t_noct"),
+    "voc": ("voc", "v_oc_ref", "v_oc"),
+    "isc": ("isc", "i_sc_ref", "i_sc"),
+    "vmp": ("vmp", "v_mp_ref", "v_mp"),
+    "imp": ("imp", "i_mp_ref", "i_mp"),
+}
+
+# Rangos válidos (mismos criterios que el formulario de módulos)
+FIELD_RANGES = {
+    "p_stc": (0.1, None),
+    "gamma": (-5.0, 5.0),
+    "noct": (0.0, 100.0),
+    "voc": (0.1, None),
+    "isc": (0.1, None),
+    "vmp": (0.1, None),
+    "imp": (0.1, None),
+}
+FIELD_DEFAULTS = {"gamma": -0.4, "noct": 45}
+
+
+class CatalogueImportError(Exception):
+    """The catalogue file cannot be read."""
+
+
+def _iter_csv(file):
+    for row in csv.DictReader(file):
+        yield row
+
+
+def _iter_jsonl(file):
+    for line in file:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+def _iter_json_array(file):
+    """Decodifica un array JSON objeto a objeto sin cargar el fichero entero."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    started = False
+    eof = False
+
+    while True:
+        buffer = buffer.lstrip()
+        if not started:
+            if not buffer.startswith("["):
+                if buffer or eof:
+                    if buffer:
+                        raise CatalogueImportError("JSON catalogue must be an array of objects")
+                    return
+            else:
+                buffer = buffer[1:]
+                started = True
+                continue
+        else:
+            if buffer.startswith(","):
+                buffer = buffer[1:]
+                continue
+            if buffer.startswith("]"):
+                return
+            if buffer:
+                try:
+                    item, end = decoder.raw_decode(buffer)
+                except ValueError:
+                    if eof:
+                        raise CatalogueImportError("Truncated or invalid JSON catalogue")
+                else:
+                    # Un objeto que acaba justo al final del búfer puede estar incompleto (p. ej. un número)
+                    if end < len(buffer) or eof:
+                        yield item
+                        buffer = buffer[end:]
+                        continue
+            elif eof:
+                raise CatalogueImportError("Truncated JSON catalogue")
+
+        chunk = file.read(JSON_CHUNK_SIZE)
+        if not chunk:
+            eof = True
+        buffer += chunk
+
+
+def iter_catalogue(path):
+    """Itera las filas (dicts) de un catálogo. Bloqueante: usar desde el executor."""
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, encoding="utf-8-sig", newline="") as file:
+        if extension == ".csv":
+            yield from _iter_csv(file)
+        elif extension in (".jsonl", ".ndjson"):
+            yield from _iter_jsonl(file)
+        elif extension == ".json":
+            yield from _iter_json_array(file)
+        else:
+            raise CatalogueImportError(f"Unsupported catalogue format: {extension}")
+
+
+def map_row(row):
+    """Convierte una fila del catálogo en un modelo validado, o None si no es válida."""
+    if not isinstance(row, dict):
+        return None
+
+    columns = {str(key).strip().lower(): value for key, value in row.items() if key is not None}
+
+    def pick(field):
+        for alias in COLUMN_ALIASES[field]:
+            value = columns.get(alias)
+            if value not in (None, ""):
+                return value
+        return None
+
+    name = pick("name")
+    if name is None or not str(name).strip():
+        return None
+
+    model = {"name": str(name).strip(), "brand": str(pick("brand") or "Generic").strip() or "Generic"}
+    for field, (minimum, maximum) in FIELD_RANGES.items():
+        value = pick(field)
+        if value is None:
+            value = FIELD_DEFAULTS.get(field)
+            if value is None:
+                return None
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return None
+        if value != value or (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+            return None
+        model[field] = value
+    return model
+
+
+def _read_batch(rows, size):
+    """Lee hasta ``size`` filas del iterador. Bloqueante: usar desde el executor."""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            break
+    return batch
+
+
+async def async_import_catalogue(hass, db, path, overwrite=False, batch_size=IMPORT_BATCH_SIZE):
+    """Importa un catálogo local en la DB. Devuelve un resumen con los contadores."""
+    if not os.path.isabs(path):
+        path = hass.config.path(path)
+    if not hass.config.is_allowed_path(path):
+        raise CatalogueImportError(f"Path is not allowed: {path}")
+    if not os.path.isfile(path):
+        raise CatalogueImportError(f"File not found: {path}")
+
+    summary = {"imported": 0, "updated": 0, "invalid": 0, "duplicates": 0, "existing": 0}
+    pending = 0
+    rows = iter_catalogue(path)
+
+    try:
+        while True:
+            batch = await hass.async_add_executor_job(_read_batch, rows, batch_size)
+            if not batch:
+                break
+
+            models = []
+            # Solo se recuerdan los ids del lote: los anteriores ya están en el índice del catálogo
+            seen = set()
+            for row in batch:
+                model = map_row(row)
+                if model is None:
+                    summary["invalid"] += 1
+                    continue
+                model_id = model_id_for(model["name"])
+                if model_id in seen:
+                    summary["duplicates"] += 1
+                    continue
+                seen.add(model_id)
+                if db.has_model(model_id):
+                    if not overwrite:
+                        summary["existing"] += 1
+                        continue
+                    summary["updated"] += 1
+                else:
+                    summary["imported"] += 1
+                models.append(model)
+
+            if models:
+                await db.add_models(models)
+                # Los shards modificados siguen en memoria hasta volcarlos: volcado intermedio cada tanto
+                pending += len(models)
+                if pending >= IMPORT_FLUSH_MODELS:
+                    pending = 0
+                    await db.async_flush()
+    except (OSError, UnicodeDecodeError, csv.Error) as err:
+        raise CatalogueImportError(f"Could not read {path}: {err}") from err
+    finally:
+        await hass.async_add_executor_job(rows.close)
+
+    # Un único volcado a disco para todo el catálogo
+    await db.async_flush()
+    _LOGGER.info(f"Imported PV catalogue {path}: {summary}")
+    return summary
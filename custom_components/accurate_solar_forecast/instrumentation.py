@@ -0,0 +1,221 @@
+"""Hot-path instrumentation of the Accurate Solar Forecast update handlers.
+
+Enabled from the integration settings, it records per handler (string update,
+sensor group update, performance update):
+
+* call count and latency histogram (p50/p99) of the handler itself;
+* event-to-write lag: from the state change that triggered the computation
+  (its ``last_updated``, so the coalescing window is included) to the state write;
+* writes done and writes suppressed by the deadband filter.
+
+The measured entities inherit ``InstrumentedEntity`` and mark their handlers
+at class level with ``instrumented_handler`` (and the methods that only schedule
+the computation with ``instrumented_trigger``). The decorators keep the wrapped
+function's attributes (``functools.wraps``), so Home Assistant still runs the
+handlers as callbacks on the event loop. Disabled, the cost is one attribute
+check per call. The histograms use fixed log-spaced buckets, so memory does not
+grow with the number of samples. The results are read from the diagnostics
+download and the optional diagnostic sensor.
+"""
+import functools
+import math
+import time
+from array import array
+from homeassistant.core import callback
+from .const import *
+
+# Cubos logarítmicos: 4 por octava desde 1 µs (el último cubre ~2 min en adelante)
+HISTOGRAM_MIN = 1e-6              # s
+HISTOGRAM_BUCKETS_PER_OCTAVE = 4
+HISTOGRAM_BUCKETS = 4 * 27
+
+
+def get_instrumentation(hass):
+    """Instrumentación compartida, o None si está desactivada en los ajustes."""
+    domain_data = hass.data.get(DOMAIN, {})
+    db = domain_data.get("db")
+    if db is None or not db.settings.get(CONF_INSTRUMENTATION, DEFAULT_INSTRUMENTATION):
+        return None
+    instrumentation = domain_data.get("instrumentation")
+    if instrumentation is None:
+        instrumentation = domain_data["instrumentation"] = Instrumentation()
+    return instrumentation
+
+
+def state_event_time(event=None):
+    """Instante (epoch) del cambio de estado que dispara un manejador de eventos."""
+    if event is None:
+        return None
+    new_state = event.data.get("new_state")
+    if new_state is None:
+        return None
+    return new_state.last_updated.timestamp()
+
+
+class LatencyHistogram:
+    """Log-bucketed histogram of durations in seconds."""
+
+    def __init__(self):
+        self.counts = array("Q", bytes(8 * HISTOGRAM_BUCKETS))
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        if seconds < 0:
+            seconds = 0.0
+        index = 0
+        if seconds > HISTOGRAM_MIN:
+            index = min(int(math.log2(seconds / HISTOGRAM_MIN) * HISTOGRAM_BUCKETS_PER_OCTAVE), HISTOGRAM_BUCKETS - 1)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction):
+        """Límite superior (s) del cubo que contiene el percentil ``fraction`` (0-1)."""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                upper = HISTOGRAM_MIN * 2 ** ((index + 1) / HISTOGRAM_BUCKETS_PER_OCTAVE)
+                return min(upper, self.max)
+        return self.max
+
+    def summary(self):
+        """Resumen en milisegundos."""
+        def ms(value):
+            return round(value * 1000, 3) if value is not None else None
+
+        return {
+            "count": self.count,
+            "mean_ms": ms(self.total / self.count) if self.count else None,
+            "p50_ms": ms(self.percentile(0.5)),
+            "p99_ms": ms(self.percentile(0.99)),
+            "max_ms": ms(self.max) if self.count else None,
+        }
+
+
+class HandlerMetrics:
+    """Metrics shared by every entity instance of one handler."""
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.latency = LatencyHistogram()
+        self.lag = LatencyHistogram()
+        self.writes = 0
+        self._write_filters = []
+
+    def add_write_filter(self, write_filter):
+        self._write_filters.append(write_filter)
+
+    def remove_write_filter(self, write_filter):
+        if write_filter in self._write_filters:
+            self._write_filters.remove(write_filter)
+
+    def summary(self):
+        return {
+            "calls": self.calls,
+            "latency": self.latency.summary(),
+            "event_to_write_lag": self.lag.summary(),
+            "writes": self.writes,
+            # Contadores del filtro de escritura de las entidades cargadas
+            "filter_written": sum(f.written for f in self._write_filters),
+            "filter_suppressed": sum(f.suppressed for f in self._write_filters),
+        }
+
+
+class Instrumentation:
+    """Registry of the handler metrics shared by the instrumented entities."""
+
+    def __init__(self):
+        self.handlers = {}
+        self.started = time.time()
+
+    def handler(self, name):
+        metrics = self.handlers.get(name)
+        if metrics is None:
+            metrics = self.handlers[name] = HandlerMetrics(name)
+        return metrics
+
+    def summary(self):
+        return {
+            "since": self.started,
+            "handlers": {name: metrics.summary() for name, metrics in self.handlers.items()},
+        }
+
+
+def instrumented_handler(event_time=None):
+    """Decorador de clase: mide el manejador (latencia y llamadas) si la entidad está instrumentada.
+
+    ``event_time(*args)`` da el instante del evento que origina la llamada; se cuenta
+    hasta la escritura de estado que haga el manejador.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args):
+            metrics = self._instrumentation_metrics
+            if metrics is None:
+                return func(self, *args)
+            if event_time is not None:
+                self._instrumentation_event = event_time(*args)
+            start = time.perf_counter()
+            try:
+                return func(self, *args)
+            finally:
+                metrics.latency.add(time.perf_counter() - start)
+                metrics.calls += 1
+                # Un cálculo que el filtro no escribe no arrastra su evento a la siguiente escritura
+                self._instrumentation_event = None
+
+        return wrapper
+
+    return decorator
+
+
+def instrumented_trigger(event_time):
+    """Decorador de clase para los métodos que solo programan el cálculo (p. ej. con un
+    ``CoalescingScheduler``): marca el instante del primer evento pendiente."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args):
+            if self._instrumentation_metrics is not None and self._instrumentation_event is None:
+                self._instrumentation_event = event_time(*args)
+            return func(self, *args)
+
+        return wrapper
+
+    return decorator
+
+
+class InstrumentedEntity:
+    """Mixin for the measured entities: counts state writes and the event-to-write lag."""
+
+    _instrumentation_metrics = None
+    _instrumentation_event = None
+
+    def setup_instrumentation(self, hass, name):
+        """Activa la medición de esta entidad si la instrumentación está habilitada."""
+        instrumentation = get_instrumentation(hass)
+        if instrumentation is None:
+            return
+        metrics = self._instrumentation_metrics = instrumentation.handler(name)
+        write_filter = getattr(self, "_write_filter", None)
+        if write_filter is not None:
+            metrics.add_write_filter(write_filter)
+            self.async_on_remove(lambda: metrics.remove_write_filter(write_filter))
+
+    @callback
+    def async_write_ha_state(self):
+        metrics = self._instrumentation_metrics
+        if metrics is not None:
+            metrics.writes += 1
+            if self._instrumentation_event is not None:
+                metrics.lag.add(time.time() - self._instrumentation_event)
+                self._instrumentation_event = None
+        super().async_write_ha_state()
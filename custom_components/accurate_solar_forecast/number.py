@@ -2,7 +2,9 @@ import logging
 from homeassistant.components.number import NumberEntity, NumberDeviceClass, NumberMode
 from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity import DeviceInfo
-from .const import DOMAIN, CONF_STRING_NAME, CONF_TILT, CONF_AZIMUTH, CONF_SENSOR_GROUP_NAME
+from .const import DOMAIN, CONF_STRING_NAME, CONF_TILT, CONF_AZIMUTH, CONF_SENSOR_GROUP_NAME, CONF_REAL_PRODUCTION_SENSOR
+from .device_resolver import get_device_resolver
+from .string_context import get_string_context
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -31,26 +33,37 @@ class SolarStringNumberEntity(NumberEntity):
         """Return device info linked to the String."""
         # Baseline identifier
         string_id = f"str_{self._string_name.lower().replace(' ', '_')}"
-        device_identifiers = {(DOMAIN, string_id)}
         
-        # Try to link to Real Production Sensor's device if configured
-        from .const import CONF_REAL_PRODUCTION_SENSOR
-        from homeassistant.helpers import device_registry as dr, entity_registry as er
-        
-        real_sensor_id = self._data.get(CONF_REAL_PRODUCTION_SENSOR)
-        if real_sensor_id:
-             ent_reg = er.async_get(self.hass)
-             entity_entry = ent_reg.async_get(real_sensor_id)
-             if entity_entry and entity_entry.device_id:
-                 dev_reg = dr.async_get(self.hass)
-                 device = dev_reg.async_get(entity_entry.device_id)
-                 if device:
-                     device_identifiers = device.identifiers
+        # Link to Real Production Sensor's device if configured (cached per config entry)
+        device_identifiers = get_device_resolver(self.hass).async_resolve(
+            self._config_entry.entry_id, self._data.get(CONF_REAL_PRODUCTION_SENSOR)
+        )
 
         return DeviceInfo(
-            identifiers=device_identifiers
+            identifiers=device_identifiers or {(DOMAIN, string_id)}
         )
 
+    async def _async_set_geometry(self, key, value):
+        """Aplica la nueva geometría al string en caliente (o recarga la entrada si no está activo)."""
+        self._attr_native_value = value
+        context = get_string_context(self.hass, self._config_entry.entry_id)
+        if context is not None:
+            # Un único recálculo del string; la config entry se guarda al asentarse los cambios
+            if key == CONF_TILT:
+                context.async_set_geometry(tilt=value)
+            else:
+                context.async_set_geometry(azimuth=value)
+            self.async_write_ha_state()
+            return
+
+        # Update Config Entry
+        new_data = self._config_entry.data.copy()
+        new_data[key] = value
+        
+        self.hass.config_entries.async_update_entry(self._config_entry, data=new_data)
+        # Reload entry to propagate changes to sensor
+        await self.hass.config_entries.async_reload(self._config_entry.entry_id)
+
 class SolarStringTiltNumber(SolarStringNumberEntity):
     """Number entity for controlling Panel Tilt."""
     
@@ -69,15 +82,7 @@ class SolarStringTiltNumber(SolarStringNumberEntity):
 
     async def async_set_native_value(self, value: float) -> None:
         """Update the current value."""
-        self._attr_native_value = value
-        
-        # Update Config Entry
-        new_data = self._config_entry.data.copy()
-        new_data[CONF_TILT] = value
-        
-        self.hass.config_entries.async_update_entry(self._config_entry, data=new_data)
-        # Reload entry to propagate changes to sensor
-        await self.hass.config_entries.async_reload(self._config_entry.entry_id)
+        await self._async_set_geometry(CONF_TILT, value)
 
 class SolarStringAzimuthNumber(SolarStringNumberEntity):
     """Number entity for controlling Panel Azimuth."""
@@ -97,12 +102,4 @@ class SolarStringAzimuthNumber(SolarStringNumberEntity):
 
     async def async_set_native_value(self, value: float) -> None:
         """Update the current value."""
-        self._attr_native_value = value
-        
-        # Update Config Entry
-        new_data = self._config_entry.data.copy()
-        new_data[CONF_AZIMUTH] = value
-        
-        self.hass.config_entries.async_update_entry(self._config_entry, data=new_data)
-        # Reload entry to propagate changes to sensor
-        await self.hass.config_entries.async_reload(self._config_entry.entry_id)
+        await self._async_set_geometry(CONF_AZIMUTH, value)
@@ -0,0 +1,154 @@
+"""Rolling performance statistics of a string (real vs estimated production).
+
+The instantaneous ``real / estimate`` ratio is noisy and meaningless at low
+irradiance, so the performance sensor also keeps energy-weighted ratios:
+
+* rolling 15 minutes and 1 hour, from one ring buffer of one-minute buckets
+  (``array`` of doubles, fixed memory) holding the real and estimated energy;
+  both windows keep running sums, so a sample costs O(1);
+* today (reset at local midnight), as plain accumulators;
+* an EWMA and today's min/max of the instantaneous ratio, only fed while the
+  estimate is above a fraction of the string's nominal power.
+
+Energy between two samples is integrated with the trapezoid rule; longer gaps
+(unavailable sensor, restart) are not integrated.
+"""
+import math
+from array import array
+from homeassistant.util import dt as dt_util
+
+PERFORMANCE_BUCKET = 60                # s por cubo
+PERFORMANCE_LONG_WINDOW = 3600         # s (1 h)
+PERFORMANCE_SHORT_WINDOW = 900         # s (15 min)
+PERFORMANCE_EWMA_TAU = 900             # s, constante de tiempo de la EWMA
+PERFORMANCE_MAX_GAP = 900              # s; huecos mayores no se integran
+PERFORMANCE_MIN_FRACTION = 0.05        # de la potencia nominal, para el ratio instantáneo
+PERFORMANCE_MIN_ENERGY = 1.0           # Wh estimados mínimos para publicar un ratio de ventana
+
+
+def _ratio(real, estimate, minimum=PERFORMANCE_MIN_ENERGY):
+    if estimate < minimum:
+        return None
+    return round(real / estimate * 100, 1)
+
+
+class RollingEnergyRatio:
+    """Real/estimated energy over the last ``window`` and ``short_window`` seconds."""
+
+    def __init__(self, window=PERFORMANCE_LONG_WINDOW, short_window=PERFORMANCE_SHORT_WINDOW, bucket=PERFORMANCE_BUCKET):
+        self.bucket = bucket
+        self.size = window // bucket
+        self.short_size = short_window // bucket
+        self._real = array("d", bytes(8 * self.size))
+        self._estimate = array("d", bytes(8 * self.size))
+        self._slot = None # índice absoluto (t // bucket) del cubo actual
+        self.real_sum = 0.0
+        self.estimate_sum = 0.0
+        self.short_real_sum = 0.0
+        self.short_estimate_sum = 0.0
+
+    def _advance(self, slot):
+        if self._slot is None or slot - self._slot >= self.size:
+            # Primer dato o hueco mayor que la ventana: todo a cero
+            for i in range(self.size):
+                self._real[i] = 0.0
+                self._estimate[i] = 0.0
+            self.real_sum = self.estimate_sum = 0.0
+            self.short_real_sum = self.short_estimate_sum = 0.0
+            self._slot = slot
+            return
+
+        while self._slot < slot:
+            self._slot += 1
+            # El cubo que deja la ventana corta
+            leaving = (self._slot - self.short_size) % self.size
+            self.short_real_sum -= self._real[leaving]
+            self.short_estimate_sum -= self._estimate[leaving]
+            # El cubo que se reutiliza deja la ventana larga
+            index = self._slot % self.size
+            self.real_sum -= self._real[index]
+            self.estimate_sum -= self._estimate[index]
+            self._real[index] = 0.0
+            self._estimate[index] = 0.0
+
+    def add(self, timestamp, real_wh, estimate_wh):
+        slot = int(timestamp // self.bucket)
+        if self._slot is not None and slot < self._slot:
+            slot = self._slot # reloj hacia atrás: se suma al cubo actual
+        self._advance(slot)
+        index = slot % self.size
+        self._real[index] += real_wh
+        self._estimate[index] += estimate_wh
+        self.real_sum += real_wh
+        self.estimate_sum += estimate_wh
+        self.short_real_sum += real_wh
+        self.short_estimate_sum += estimate_wh
+
+    def ratios(self, timestamp):
+        """``(ratio_corto, ratio_largo)`` en % (None sin energía suficiente)."""
+        self._advance(max(int(timestamp // self.bucket), self._slot or 0))
+        return (
+            _ratio(self.short_real_sum, self.short_estimate_sum),
+            _ratio(self.real_sum, self.estimate_sum),
+        )
+
+
+class PerformanceStats:
+    """Rolling, daily and smoothed performance ratios of one string."""
+
+    def __init__(self, nominal_power=0.0):
+        self.min_power = nominal_power * PERFORMANCE_MIN_FRACTION
+        self.rolling = RollingEnergyRatio()
+        self._last = None # (timestamp, real_w, estimate_w)
+        self._day_end = None
+        self.day_real = 0.0
+        self.day_estimate = 0.0
+        self.day_min = None
+        self.day_max = None
+        self.ewma = None
+
+    def _check_day(self, timestamp):
+        if self._day_end is not None and timestamp < self._day_end:
+            return
+        start = dt_util.start_of_local_day(dt_util.utc_from_timestamp(timestamp))
+        self._day_end = start.timestamp() + 86400
+        self.day_real = self.day_estimate = 0.0
+        self.day_min = self.day_max = None
+
+    def add_sample(self, timestamp, real_w, estimate_w):
+        """Añade una muestra; ``real_w=None`` (sensor no disponible) corta la integración."""
+        self._check_day(timestamp)
+        last = self._last
+        if real_w is None or estimate_w is None:
+            self._last = None
+            return
+        self._last = (timestamp, real_w, estimate_w)
+
+        if last is not None:
+            dt = timestamp - last[0]
+            if 0 < dt <= PERFORMANCE_MAX_GAP:
+                hours = dt / 3600
+                real_wh = (last[1] + real_w) / 2 * hours
+                estimate_wh = (last[2] + estimate_w) / 2 * hours
+                self.rolling.add(timestamp, real_wh, estimate_wh)
+                self.day_real += real_wh
+                self.day_estimate += estimate_wh
+
+                if estimate_w >= max(self.min_power, 1.0):
+                    ratio = real_w / estimate_w * 100
+                    alpha = 1 - math.exp(-dt / PERFORMANCE_EWMA_TAU)
+                    self.ewma = ratio if self.ewma is None else self.ewma + alpha * (ratio - self.ewma)
+                    self.day_min = ratio if self.day_min is None else min(self.day_min, ratio)
+                    self.day_max = ratio if self.day_max is None else max(self.day_max, ratio)
+
+    def attributes(self, timestamp):
+        short, long = self.rolling.ratios(timestamp)
+        self._check_day(timestamp)
+        return {
+            "rendimiento_15min": short,
+            "rendimiento_1h": long,
+            "rendimiento_hoy": _ratio(self.day_real, self.day_estimate),
+            "rendimiento_ewma": round(self.ewma, 1) if self.ewma is not None else None,
+            "rendimiento_min_hoy": round(self.day_min, 1) if self.day_min is not None else None,
+            "rendimiento_max_hoy": round(self.day_max, 1) if self.day_max is not None else None,
+        }
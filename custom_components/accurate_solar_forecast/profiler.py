@@ -0,0 +1,162 @@
+"""On-demand profiling of the integration on the running event loop.
+
+The ``profile`` service enables ``cProfile`` on the event loop thread (where all
+the callbacks of the integration run) and, optionally, ``tracemalloc`` for a
+number of seconds, then:
+
+* writes ``<config>/accurate_solar_forecast_profile_<time>.prof`` (open it with
+  ``snakeviz`` or ``pstats``) and a ``.txt`` summary next to it;
+* returns the functions of this integration with the highest cumulative time,
+  the share of the profiled loop time spent in them, and the lines of the
+  integration that allocated the most memory during the window.
+
+Everything on the loop is profiled, so the share tells whether the integration
+is the one stalling it. No restart and no global profiler are needed.
+"""
+import asyncio
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from homeassistant.util import dt as dt_util
+from .const import *
+
+_LOGGER = logging.getLogger(__name__)
+
+INTEGRATION_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILER_FILE = os.path.abspath(__file__)
+PROFILE_TRACEMALLOC_FRAMES = 10
+PROFILE_TEXT_LINES = 50
+
+
+class ProfilerError(Exception):
+    """A profile cannot be taken (e.g. another one is running)."""
+
+
+def _is_ours(filename):
+    # El propio perfilador no cuenta
+    return filename.startswith(INTEGRATION_DIR) and filename != PROFILER_FILE
+
+
+def _short(filename):
+    if _is_ours(filename):
+        return os.path.relpath(filename, INTEGRATION_DIR)
+    return filename
+
+
+async def async_profile(hass, duration=DEFAULT_PROFILE_DURATION, top=DEFAULT_PROFILE_TOP, trace_allocations=True):
+    """Perfila ``duration`` segundos y devuelve el resumen (ver el docstring del módulo)."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if domain_data.get("profiling"):
+        raise ProfilerError("A profile is already running")
+    domain_data["profiling"] = True
+
+    # tracemalloc puede estar ya activo (p. ej. PYTHONTRACEMALLOC): entonces no se para al final
+    started_tracing = False
+    before = after = None
+    profiler = cProfile.Profile()
+    try:
+        if trace_allocations:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+                started_tracing = True
+            # La instantánea recorre todas las asignaciones: fuera del bucle
+            before = await hass.async_add_executor_job(tracemalloc.take_snapshot)
+
+        _LOGGER.info(f"Profiling the event loop for {duration} s")
+        started = time.perf_counter()
+        # Solo puede haber un perfilador activo por hilo (p. ej. el de la integración Profiler):
+        # Python 3.12+ lo rechaza con ValueError y 3.11 lo sustituiría sin avisar
+        if sys.getprofile() is not None:
+            raise ProfilerError("Another profiler is already running on the event loop")
+        try:
+            profiler.enable()
+        except ValueError as err:
+            raise ProfilerError(f"Another profiler is already running on the event loop: {err}") from err
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            profiler.disable()
+        elapsed = time.perf_counter() - started
+
+        if trace_allocations:
+            after = await hass.async_add_executor_job(tracemalloc.take_snapshot)
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+        domain_data["profiling"] = False
+
+    base_path = hass.config.path(f"{DOMAIN}_profile_{dt_util.now().strftime('%Y%m%d_%H%M%S')}")
+    # Ordenar estadísticas y escribir ficheros fuera del bucle
+    report = await hass.async_add_executor_job(_build_report, profiler, before, after, top, base_path)
+    report["duration"] = round(elapsed, 1)
+    return report
+
+
+def _build_report(profiler, before, after, top, base_path):
+    stats = pstats.Stats(profiler)
+    profile_file = f"{base_path}.prof"
+    stats.dump_stats(profile_file)
+
+    ours = [
+        (key, value) for key, value in stats.stats.items()
+        if _is_ours(key[0])
+    ]
+    # Tiempo propio (tt) de nuestras funciones frente al total del bucle perfilado
+    own_time = sum(value[2] for _, value in ours)
+    total_time = stats.total_tt
+    ours.sort(key=lambda item: item[1][3], reverse=True)
+    top_cumulative = [
+        {
+            "function": f"{_short(filename)}:{lineno}({name})",
+            "calls": calls,
+            "total_ms": round(tt * 1000, 3),
+            "cumulative_ms": round(ct * 1000, 3),
+        }
+        for (filename, lineno, name), (_, calls, tt, ct, _) in ours[:top]
+    ]
+
+    top_allocations = []
+    if before is not None and after is not None:
+        only_ours = [
+            tracemalloc.Filter(True, os.path.join(INTEGRATION_DIR, "*")),
+            tracemalloc.Filter(False, PROFILER_FILE),
+        ]
+        differences = after.filter_traces(only_ours).compare_to(before.filter_traces(only_ours), "lineno")
+        differences = [diff for diff in differences if diff.size_diff > 0]
+        differences.sort(key=lambda diff: diff.size_diff, reverse=True)
+        top_allocations = [
+            {
+                "location": f"{_short(diff.traceback[0].filename)}:{diff.traceback[0].lineno}",
+                "size_kib": round(diff.size_diff / 1024, 1),
+                "count": diff.count_diff,
+            }
+            for diff in differences[:top]
+        ]
+
+    text = io.StringIO()
+    text.write(f"Integration share of the profiled loop time: {own_time:.3f} s of {total_time:.3f} s\n\n")
+    pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(PROFILE_TEXT_LINES)
+    text.write("Integration functions by cumulative time:\n")
+    for item in top_cumulative:
+        text.write(f"  {item['cumulative_ms']:>12.3f} ms  {item['calls']:>8}  {item['function']}\n")
+    text.write("\nIntegration allocations during the profile:\n")
+    for item in top_allocations:
+        text.write(f"  {item['size_kib']:>12.1f} KiB  {item['count']:>8}  {item['location']}\n")
+    stats_file = f"{base_path}.txt"
+    with open(stats_file, "w", encoding="utf-8") as file:
+        file.write(text.getvalue())
+
+    return {
+        "profile_file": profile_file,
+        "stats_file": stats_file,
+        "profiled_time_s": round(total_time, 3),
+        "integration_time_s": round(own_time, 3),
+        "integration_share": round(own_time / total_time, 4) if total_time else None,
+        "top_cumulative": top_cumulative,
+        "top_allocations": top_allocations,
+    }
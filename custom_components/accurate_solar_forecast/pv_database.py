@@ -1,61 +1,127 @@
 import json
+import logging
 import os
+from homeassistant.core import callback
 from homeassistant.helpers.storage import Store
-from .const import CONF_SENSOR_GROUP_NAME, CONF_REF_SENSOR, CONF_REF_TILT, CONF_REF_ORIENTATION, CONF_TEMP_SENSOR, CONF_WIND_SENSOR, CONF_TEMP_PANEL_SENSOR, CONF_WEATHER_ENTITY
+from .catalogue import ModuleCatalogue, model_id_for
+from .const import CONF_PANEL_MODEL, DOMAIN, CONF_SENSOR_GROUP_NAME, CONF_REF_SENSOR, CONF_REF_TILT, CONF_REF_ORIENTATION, CONF_TEMP_SENSOR, CONF_WIND_SENSOR, CONF_TEMP_PANEL_SENSOR, CONF_WEATHER_ENTITY, CONF_UPDATE_WINDOW, CONF_MIN_UPDATE_INTERVAL, DEFAULT_UPDATE_WINDOW, DEFAULT_MIN_UPDATE_INTERVAL, CONF_TRANSPOSITION_MODEL, DEFAULT_TRANSPOSITION_MODEL, CONF_DEADBAND_ABSOLUTE, CONF_DEADBAND_RELATIVE, CONF_HEARTBEAT, DEFAULT_DEADBAND_ABSOLUTE, DEFAULT_DEADBAND_RELATIVE, DEFAULT_HEARTBEAT, CONF_ATTRIBUTE_VERBOSITY, DEFAULT_ATTRIBUTE_VERBOSITY, CONF_UNRECORDED_ATTRIBUTES, DEFAULT_UNRECORDED_ATTRIBUTES, CONF_INSTRUMENTATION, DEFAULT_INSTRUMENTATION
 
 STORAGE_VERSION = 1
 STORAGE_KEY = "accurate_forecast_pv_models"
 
+DEFAULT_MODEL_ID = "default_450w"
+DEFAULT_MODEL = {
+    "name": "Generico 450W",
+    "brand": "Generic",
+    "p_stc": 450,
+    "gamma": -0.35,
+    "noct": 45,
+    "voc": 49.0,
+    "isc": 11.5,
+    "vmp": 41.5,
+    "imp": 10.85
+}
+
+# Ajustes globales de la integración (no dependen de ningún grupo ni string)
+DEFAULT_SETTINGS = {
+    CONF_DEADBAND_ABSOLUTE: DEFAULT_DEADBAND_ABSOLUTE,
+    CONF_DEADBAND_RELATIVE: DEFAULT_DEADBAND_RELATIVE,
+    CONF_HEARTBEAT: DEFAULT_HEARTBEAT,
+    CONF_ATTRIBUTE_VERBOSITY: DEFAULT_ATTRIBUTE_VERBOSITY,
+    CONF_UNRECORDED_ATTRIBUTES: DEFAULT_UNRECORDED_ATTRIBUTES,
+    CONF_INSTRUMENTATION: DEFAULT_INSTRUMENTATION,
+}
+
+# Las escrituras se agrupan: una ráfaga de cambios (importaciones, ediciones) = una escritura
+SAVE_DELAY = 10 # segundos
+
+_LOGGER = logging.getLogger(__name__)
+
 class PVDatabase:
     def __init__(self, hass):
+        self.hass = hass
         self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
-        self.data = {}
         self.sensor_groups = {} # Separate dictionary for sensor groups
         self.roofs = {}         # Separate dictionary for roofs
+        self.settings = dict(DEFAULT_SETTINGS) # Integration-wide settings
+        # Catálogo de módulos en almacenamiento aparte (índice residente, modelos bajo demanda)
+        self.catalogue = ModuleCatalogue(hass, STORAGE_KEY)
 
     async def async_load(self):
-        """Carga la DB del disco."""
+        """Carga la DB del disco (grupos y tejados; del catálogo solo el índice)."""
         data = await self._store.async_load()
+        legacy_models = {}
+        needs_save = data is None
         if data is None:
-            # Datos por defecto si está vacío
-            self.data = {
-                "default_450w": {
-                    "name": "Generico 450W",
-                    "brand": "Generic",
-                    "p_stc": 450,
-                    "gamma": -0.35,
-                    "noct": 45,
-                    "voc": 49.0,
-                    "isc": 11.5,
-                    "vmp": 41.5,
-                    "imp": 10.85
-                }
-            }
             self.sensor_groups = {}
             self.roofs = {}
-            await self.async_save()
         else:
             # Handle migration or structure check if needed
-            self.data = data.get("models", {})
+            legacy_models = data.get("models", {})
             # If "models" key doesn't exist, assume old structure (root is models)
-            if not self.data and data:
-                 if "default_450w" in data or any("brand" in v for v in data.values()):
-                     self.data = data
+            if not legacy_models and data:
+                 if DEFAULT_MODEL_ID in data or any(isinstance(v, dict) and "brand" in v for v in data.values()):
+                     legacy_models = data
+                     data = {}
             
             self.sensor_groups = data.get("sensor_groups", {})
             self.roofs = data.get("roofs", {})
+            # Se actualiza en sitio: los sensores guardan una referencia a este dict
+            self.settings.update(data.get("settings", {}))
 
-    async def async_save(self):
-        """Guarda la DB al disco."""
-        save_data = {
-            "models": self.data,
-            "sensor_groups": self.sensor_groups,
-            "roofs": self.roofs
+        has_catalogue = await self.catalogue.async_load()
+        if legacy_models:
+            # Migración: los modelos pasan del fichero principal al catálogo por shards
+            _LOGGER.info(f"Migrating {len(legacy_models)} PV models to the sharded catalogue")
+            await self.catalogue.async_set_models(legacy_models)
+            needs_save = True
+        elif not has_catalogue:
+            # Datos por defecto si está vacío
+            await self.catalogue.async_set_models({DEFAULT_MODEL_ID: dict(DEFAULT_MODEL)})
+
+        if needs_save or self.catalogue.dirty:
+            await self.async_flush()
+
+        # Solo los modelos usados por strings quedan residentes
+        for entry in self.hass.config_entries.async_entries(DOMAIN):
+            model_name = entry.data.get(CONF_PANEL_MODEL)
+            if model_name:
+                await self.catalogue.async_get_model(self.catalogue.get_model_id(model_name), pin=True)
+
+    @callback
+    def _data_to_save(self):
+        """Datos del fichero principal (el Store lo llama justo al escribir)."""
+        # Copia superficial: los registros se sustituyen enteros, nunca se modifican in situ
+        return {
+            "sensor_groups": dict(self.sensor_groups),
+            "roofs": dict(self.roofs),
+            "settings": dict(self.settings)
         }
-        await self._store.async_save(save_data)
+
+    @callback
+    def async_schedule_save(self):
+        """Programa una única escritura diferida (el Store la fuerza al apagar Home Assistant)."""
+        self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+        self.catalogue.async_schedule_save(SAVE_DELAY)
+
+    async def async_flush(self):
+        """Escribe ahora la DB y los cambios pendientes del catálogo (cancela la escritura diferida)."""
+        await self._store.async_save(self._data_to_save())
+        await self.catalogue.async_flush()
+
+    async def async_save(self):
+        """Guarda la DB al disco (programado; ver ``async_schedule_save``)."""
+        self.async_schedule_save()
+        return True
+
+    # --- SETTINGS ---
+    async def update_settings(self, **settings):
+        """Actualiza los ajustes globales (en sitio, con efecto inmediato en los sensores)."""
+        self.settings.update(settings)
+        return await self.async_save()
 
     # --- ROOF METHODS ---
-    def add_roof(self, name, tilt=None, azimuth=None):
+    async def add_roof(self, name, tilt=None, azimuth=None):
         """Adds a roof to the database."""
         roof_id = name.lower().replace(" ", "_")
         
@@ -66,7 +132,7 @@ class PVDatabase:
             "tilt": tilt,
             "azimuth": azimuth
         }
-        return self.async_save()
+        return await self.async_save()
 
     def list_roofs(self):
         """Returns a dict {id: name} of roofs."""
@@ -76,9 +142,8 @@ class PVDatabase:
         return self.roofs.get(roof_id)
 
     # --- PV MODEL METHODS ---
-    def add_model(self, name, brand, p_stc, gamma, noct, voc, isc, vmp, imp):
-        model_id = name.lower().replace(" ", "_")
-        self.data[model_id] = {
+    async def add_model(self, name, brand, p_stc, gamma, noct, voc, isc, vmp, imp):
+        return await self.add_models([{
             "name": name,
             "brand": brand,
             "p_stc": p_stc,
@@ -88,45 +153,71 @@ class PVDatabase:
             "isc": isc,
             "vmp": vmp,
             "imp": imp
-        }
-        return self.async_save()
+        }])
+
+    async def add_models(self, models):
+        """Añade o actualiza varios modelos (dicts con los campos de ``add_model``) con una sola escritura."""
+        await self.catalogue.async_set_models({
+            model_id_for(model["name"]): {
+                "name": model["name"],
+                "brand": model.get("brand", "Generic"),
+                "p_stc": model["p_stc"],
+                "gamma": model["gamma"],
+                "noct": model["noct"],
+                "voc": model["voc"],
+                "isc": model["isc"],
+                "vmp": model["vmp"],
+                "imp": model["imp"]
+            }
+            for model in models
+        })
+        self.catalogue.async_schedule_save(SAVE_DELAY)
+        return True
 
     async def delete_model(self, model_id):
         """Elimina un modelo de la DB."""
-        if model_id == "default_450w":
+        if model_id == DEFAULT_MODEL_ID:
             return False
             
-        if model_id in self.data:
-            del self.data[model_id]
-            return await self.async_save()
+        if await self.catalogue.async_delete_model(model_id):
+            self.catalogue.async_schedule_save(SAVE_DELAY)
+            return True
         return False
 
-    def get_model(self, model_id):
-        return self.data.get(model_id)
+    def has_model(self, model_id):
+        return self.catalogue.has_model(model_id)
+
+    async def async_get_model(self, model_id, pin=False):
+        """Datos completos del modelo (carga su shard si no está en memoria)."""
+        return await self.catalogue.async_get_model(model_id, pin)
+
+    def get_model_id(self, name):
+        """Devuelve el id del modelo con ese nombre (o None)."""
+        return self.catalogue.get_model_id(name)
+
+    async def async_get_model_by_name(self, name, pin=False):
+        """Devuelve los datos del modelo con ese nombre (o None)."""
+        model_id = self.catalogue.get_model_id(name)
+        if model_id is None:
+            return None
+        return await self.catalogue.async_get_model(model_id, pin)
 
     def list_brands(self):
         """Devuelve lista de marcas únicas."""
-        brands = set()
-        for v in self.data.values():
-            brands.add(v.get("brand", "Generic"))
-        if not brands:
-            return ["Generic"]
-        return sorted(list(brands))
+        return self.catalogue.list_brands() or ["Generic"]
 
     def list_models_by_brand(self, brand):
         """Devuelve dict {id: nombre} filtrado por marca."""
-        return {
-            k: v["name"] 
-            for k, v in self.data.items() 
-            if v.get("brand", "Generic") == brand
-        }
+        return self.catalogue.list_models_by_brand(brand)
 
     def list_models(self):
         """Devuelve dict {id: nombre} para el selector."""
-        return {k: v["name"] for k, v in self.data.items()}
+        return self.catalogue.list_models()
 
     # --- SENSOR GROUP METHODS ---
-    def add_sensor_group(self, name, irradiance_sensor, temp_sensor, temp_panel_sensor, wind_sensor, ref_tilt, ref_orientation, weather_entity=None):
+    async def add_sensor_group(self, name, irradiance_sensor, temp_sensor, temp_panel_sensor, wind_sensor, ref_tilt, ref_orientation, weather_entity=None,
+                         update_window=DEFAULT_UPDATE_WINDOW, min_update_interval=DEFAULT_MIN_UPDATE_INTERVAL,
+                         transposition_model=DEFAULT_TRANSPOSITION_MODEL):
         group_id = name.lower().replace(" ", "_")
         self.sensor_groups[group_id] = {
             CONF_SENSOR_GROUP_NAME: name,
@@ -136,9 +227,12 @@ class PVDatabase:
             CONF_WIND_SENSOR: wind_sensor,
             CONF_REF_TILT: ref_tilt,
             CONF_REF_ORIENTATION: ref_orientation,
-            CONF_WEATHER_ENTITY: weather_entity
+            CONF_WEATHER_ENTITY: weather_entity,
+            CONF_UPDATE_WINDOW: update_window,
+            CONF_MIN_UPDATE_INTERVAL: min_update_interval,
+            CONF_TRANSPOSITION_MODEL: transposition_model
         }
-        return self.async_save()
+        return await self.async_save()
         
     def get_sensor_group(self, group_id):
         return self.sensor_groups.get(group_id)
@@ -153,8 +247,8 @@ class PVDatabase:
             if isinstance(v, dict) and v.get(CONF_SENSOR_GROUP_NAME)
         }
     
-    def delete_sensor_group(self, group_id):
+    async def delete_sensor_group(self, group_id):
         if group_id in self.sensor_groups:
             del self.sensor_groups[group_id]
-            return self.async_save()
+            return await self.async_save()
         return False
\ No newline at end of file
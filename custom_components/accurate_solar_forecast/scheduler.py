@@ -0,0 +1,58 @@
+"""Event coalescing for the Accurate Solar Forecast recomputations."""
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_call_later
+
+
+class CoalescingScheduler:
+    """Collapses a burst of triggers into a single call of ``action``.
+
+    A weather station usually publishes irradiance, temperature and wind within a few
+    milliseconds of each other. The first trigger opens a window of ``window`` seconds;
+    every trigger received while it is open is absorbed and ``action`` runs once when
+    it closes. ``min_interval`` optionally caps the recompute rate: the window is
+    stretched so two runs are never closer than that many seconds.
+    """
+
+    def __init__(self, hass, action, window=0.0, min_interval=0.0):
+        self.hass = hass
+        self._action = action
+        self.window = window or 0.0
+        self.min_interval = min_interval or 0.0
+        self._unsub = None
+        self._last_run = None
+
+    @property
+    def pending(self):
+        return self._unsub is not None
+
+    @callback
+    def async_schedule(self):
+        """Pide una ejecución. Si ya hay una pendiente, se agrupa con ella."""
+        if self._unsub is not None:
+            return
+
+        delay = self.window
+        if self.min_interval and self._last_run is not None:
+            delay = max(delay, self._last_run + self.min_interval - self.hass.loop.time())
+
+        if delay <= 0:
+            self._run()
+            return
+
+        self._unsub = async_call_later(self.hass, delay, self._fire)
+
+    @callback
+    def _fire(self, _now):
+        self._unsub = None
+        self._run()
+
+    @callback
+    def _run(self):
+        self._last_run = self.hass.loop.time()
+        self._action()
+
+    @callback
+    def async_cancel(self):
+        if self._unsub is not None:
+            self._unsub()
+            self._unsub = None
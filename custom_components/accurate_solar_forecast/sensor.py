@@ -1,12 +1,24 @@
-import math
 import logging
-from homeassistant.components.sensor import SensorEntity, SensorDeviceClass, SensorStateClass
-from homeassistant.const import UnitOfPower, UnitOfTemperature, UnitOfSpeed
+import time
+from homeassistant.components.sensor import RestoreSensor, SensorEntity, SensorDeviceClass, SensorStateClass
+from homeassistant.const import UnitOfEnergy, UnitOfPower, UnitOfTemperature, UnitOfSpeed
 from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.event import async_track_state_change_event
-from homeassistant.helpers.entity import DeviceInfo
-from homeassistant.helpers import device_registry as dr, entity_registry as er
+from homeassistant.helpers.entity import DeviceInfo, EntityCategory
+from homeassistant.helpers import device_registry as dr
 from .const import *
+from .coordinator import get_coordinator
+from .engine import StringConfig
+from .string_context import StringContext
+from .device_resolver import get_device_resolver
+from .clearsky import load_linke_turbidity_table
+from .write_filter import StateWriteFilter
+from .scheduler import CoalescingScheduler
+from .attributes import AttributePolicy, diagnostic_attributes, sensor_class, AGGREGATE_ATTRIBUTE_LEVELS, PERFORMANCE_ATTRIBUTE_LEVELS, PV_DATABASE_ATTRIBUTE_LEVELS, SENSOR_GROUP_ATTRIBUTE_LEVELS, STRING_ATTRIBUTE_LEVELS
+from .performance import PerformanceStats
+from .energy import ENERGY_ESTIMATED, ENERGY_REAL
+from .aggregation import AGGREGATE_INVERTER, AGGREGATE_SITE, get_aggregation_hub
+from .instrumentation import InstrumentedEntity, get_instrumentation, instrumented_handler, instrumented_trigger, state_event_time
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -22,25 +34,32 @@ async def async_setup_entry(hass, config_entry, async_add_entities):
         # We attempt to link it to the existing device of the Irradiance Sensor
         
         ref_sensor_id = config_entry.data.get(CONF_REF_SENSOR)
-        device_identifiers = None
-        
-        if ref_sensor_id:
-            try:
-                ent_reg = er.async_get(hass)
-                dev_reg = dr.async_get(hass)
-                
-                ref_entry = ent_reg.async_get(ref_sensor_id)
-                if ref_entry and ref_entry.device_id:
-                    device = dev_reg.async_get(ref_entry.device_id)
-                    if device:
-                        device_identifiers = device.identifiers
-            except Exception as e:
-                _LOGGER.warning(f"Could not link to existing device: {e}")
+        device_identifiers = get_device_resolver(hass).async_resolve(config_entry.entry_id, ref_sensor_id)
 
         async_add_entities([
-            SensorGroupVirtualSensor(hass, config_entry, device_identifiers)
+            sensor_class(SensorGroupVirtualSensor, db.settings)(hass, config_entry, device_identifiers, db)
         ])
 
+        # Agregados de tejado, inversor e instalación: sus entidades las crea la primera
+        # entrada de grupo (como el sensor de la DB), también las de agregados posteriores;
+        # si se descarga, otra entrada de grupo cargada toma el relevo
+        hub = get_aggregation_hub(hass)
+        hub.async_add_roofs(db.roofs)
+
+        def aggregate_entities(aggregates):
+            entities = [sensor_class(AggregatePowerSensor, db.settings)(hass, db, aggregate) for aggregate in aggregates]
+            if any(aggregate.kind == AGGREGATE_SITE for aggregate in aggregates):
+                entities.append(SiteEnergySensor(hass, db, hub))
+                # Sensor de diagnóstico de latencias, una sola vez (con la entrada propietaria)
+                instrumentation = get_instrumentation(hass)
+                if instrumentation is not None:
+                    entities.append(InstrumentationSensor(hass, instrumentation))
+            return entities
+
+        config_entry.async_on_unload(
+            hub.async_add_entity_adder(config_entry.entry_id, async_add_entities, aggregate_entities)
+        )
+
     # CASE 2: SOLAR STRING (POWER PREDICTION)
     elif CONF_STRING_NAME in config_entry.data:
         # We need to look up the Sensor Group data!
@@ -57,10 +76,41 @@ async def async_setup_entry(hass, config_entry, async_add_entities):
         sensor_group_data = db.get_sensor_group(group_name)
         
         if sensor_group_data:
-            async_add_entities([
-                SolarStringSensor(hass, config_entry.data, db, sensor_group_data),
-                SolarStringPerformanceSensor(hass, config_entry.data, db, sensor_group_data)
-            ], update_before_add=True)
+            # Mapear la tabla de turbidez de Linke (E/S) fuera del bucle de eventos
+            await hass.async_add_executor_job(load_linke_turbidity_table)
+            # El modelo del string queda residente en memoria (catálogo por shards)
+            panel_data = await db.async_get_model_by_name(config_entry.data.get(CONF_PANEL_MODEL), pin=True)
+            # Estado vivo del string, compartido con las entidades number (geometría en caliente)
+            context = StringContext(hass, config_entry, panel_data)
+            context.async_register()
+            config_entry.async_on_unload(context.async_shutdown)
+            # Dispositivo del sensor de producción real: una sola resolución para ambos sensores
+            device_identifiers = get_device_resolver(hass).async_resolve(
+                config_entry.entry_id, config_entry.data.get(CONF_REAL_PRODUCTION_SENSOR)
+            )
+            entities = [
+                sensor_class(SolarStringSensor, db.settings)(hass, config_entry.data, db, sensor_group_data, group_name, panel_data, context, device_identifiers),
+                sensor_class(SolarStringPerformanceSensor, db.settings)(hass, config_entry.data, db, sensor_group_data, device_identifiers, context),
+                SolarStringEnergySensor(hass, config_entry.data, db, context, ENERGY_ESTIMATED, device_identifiers),
+            ]
+            if config_entry.data.get(CONF_REAL_PRODUCTION_SENSOR):
+                entities.append(SolarStringEnergySensor(hass, config_entry.data, db, context, ENERGY_REAL, device_identifiers))
+            async_add_entities(entities, update_before_add=True)
+
+            # Alta en los agregados: tejado y dispositivo (inversor) del sensor de producción real
+            roof_name = config_entry.data.get(CONF_ROOF_NAME)
+            roof_id = roof_name.lower().replace(" ", "_") if roof_name else None
+            inverter = get_device_resolver(hass).async_resolve_device(
+                config_entry.entry_id, config_entry.data.get(CONF_REAL_PRODUCTION_SENSOR)
+            )
+            if inverter is not None:
+                device_id, device_name, identifiers = inverter
+                inverter = (device_id, device_name or config_entry.data.get(CONF_REAL_PRODUCTION_SENSOR), identifiers)
+            hub = get_aggregation_hub(hass)
+            hub.async_add_roofs(db.roofs)
+            config_entry.async_on_unload(hub.async_register_string(
+                context, roof_id, inverter, config_entry.data.get(CONF_INVERTER_AC_LIMIT)
+            ))
         else:
             _LOGGER.error(f"Sensor group '{group_name}' not found in DB for string {config_entry.title}")
 
@@ -70,27 +120,35 @@ async def async_setup_entry(hass, config_entry, async_add_entities):
     # We can attach this sensor to any sensor group entry or create it once.
     # Let's attach it to Sensor Groups for now as they are "system" level.
     if CONF_SENSOR_GROUP_NAME in config_entry.data and "db" in hass.data[DOMAIN]:
-         async_add_entities([PVDatabaseSensor(hass, hass.data[DOMAIN]["db"])])
+         async_add_entities([sensor_class(PVDatabaseSensor, db.settings)(hass, db)])
 
 
 
 
 
-class SolarStringSensor(SensorEntity):
-    def __init__(self, hass, config_entry_data, db, sensor_group_data):
+class SolarStringSensor(InstrumentedEntity, SensorEntity):
+    # Los atributos de diagnóstico se ven en la interfaz pero no los guarda el recorder (salvo con el ajuste desactivado)
+    _unrecorded_attributes = diagnostic_attributes(STRING_ATTRIBUTE_LEVELS)
+
+    def __init__(self, hass, config_entry_data, db, sensor_group_data, sensor_group_id, panel_data=None, context=None,
+                 device_identifiers=None):
         self.hass = hass
         self._config = config_entry_data
         self._db = db
         self._sensor_group = sensor_group_data
+        self._sensor_group_id = sensor_group_id
         
-        # Recuperar datos del modelo desde la DB usando el nombre
-        model_name = self._config.get(CONF_PANEL_MODEL)
-        self._panel_data = None
-        if db and db.data:
-            for v in db.data.values():
-                if v.get("name") == model_name:
-                    self._panel_data = v
-                    break
+        # Datos del modelo, resueltos desde la DB por nombre en async_setup_entry
+        self._panel_data = panel_data
+
+        # Configuración resuelta una sola vez para el camino caliente
+        # (el contexto la rehace si cambia la geometría, sin recargar la entrada)
+        self._context = context
+        self._string = None
+        if context is not None:
+            self._string = context.string
+        elif self._panel_data is not None:
+            self._string = StringConfig.from_config(self._config, self._panel_data)
         
         self._attr_name = self._config.get(CONF_STRING_NAME)
         self._attr_unique_id = f"str_{self._config.get(CONF_STRING_NAME).lower().replace(' ', '_')}"
@@ -99,231 +157,122 @@ class SolarStringSensor(SensorEntity):
         self._attr_state_class = SensorStateClass.MEASUREMENT
         self._attr_native_value = 0
         self._attr_extra_state_attributes = {}
+        self._forecast_attributes = {}
+        # Solo se escribe el estado si ha cambiado de forma apreciable (ajustes globales de la DB)
+        self._write_filter = StateWriteFilter(db.settings)
+        # Verbosidad de atributos (ajuste global)
+        self._attribute_policy = AttributePolicy(db.settings, STRING_ATTRIBUTE_LEVELS)
 
         # Link to the Sensor Group Device? Or create its own device?
         # Strings are virtual, maybe its own device or no device (just entity).
         # Let's give it a device so it looks nice in UI.
-        # Linking Logic
-        # Linking Logic
-        real_sensor_id = self._config.get(CONF_REAL_PRODUCTION_SENSOR)
-        device_iden = None
-        device_name = None
-        
-        if real_sensor_id:
-             ent_reg = er.async_get(hass)
-             entity_entry = ent_reg.async_get(real_sensor_id)
-             if entity_entry and entity_entry.device_id:
-                 dev_reg = dr.async_get(hass)
-                 device = dev_reg.async_get(entity_entry.device_id)
-                 if device:
-                     device_identifiers = device.identifiers
+        # Linking Logic: device of the real production sensor (resolved in async_setup_entry)
+        device_iden = device_identifiers
+        linked = bool(device_iden)
 
-        if not device_iden:
+        if not linked:
             # Fallback: Create independent device
             device_iden = {(DOMAIN, self._attr_unique_id)} 
 
         self._attr_device_info = DeviceInfo(
             identifiers=device_iden,
-            name=self._attr_name if not real_sensor_id else None, # If linked, use inverter name (handled by HA merging)
-            manufacturer=self._panel_data.get("brand", "Generic") if not real_sensor_id else None,
-            model=model_name if not real_sensor_id else None,
-            via_device=(DOMAIN, sensor_group_data.get(CONF_SENSOR_GROUP_NAME)) if not real_sensor_id else None
+            name=self._attr_name if not linked else None, # If linked, use inverter name (handled by HA merging)
+            manufacturer=self._panel_data.get("brand", "Generic") if not linked else None,
+            model=self._config.get(CONF_PANEL_MODEL) if not linked else None,
+            via_device=(DOMAIN, sensor_group_data.get(CONF_SENSOR_GROUP_NAME)) if not linked else None
         )
 
+        # Latencia y escrituras (solo con la instrumentación activa)
+        self.setup_instrumentation(hass, "string_update")
+
     @property
     def check_config(self):
         return self._panel_data is not None and self._sensor_group is not None
 
-    def get_float_state(self, entity_id, default=0.0):
-        if not entity_id:
-            return default
-        state = self.hass.states.get(entity_id)
-        if state and state.state not in ["unavailable", "unknown"]:
-            try:
-                return float(state.state)
-            except ValueError:
-                pass
-        return default
-
-    def calculate_cos_incidence(self, sun_az, sun_el, panel_az, panel_tilt):
-        """Calcula el coseno del ángulo de incidencia."""
-        sol_zenith_rad = math.radians(90 - sun_el)
-        sol_az_rad = math.radians(sun_az)
-        panel_tilt_rad = math.radians(panel_tilt)
-        panel_az_rad = math.radians(panel_az)
-
-        cos_theta = (math.cos(sol_zenith_rad) * math.cos(panel_tilt_rad)) + \
-                    (math.sin(sol_zenith_rad) * math.sin(panel_tilt_rad) * math.cos(sol_az_rad - panel_az_rad))
-        
-        return max(0, cos_theta)
-
+    @instrumented_handler(event_time=lambda data, result: data["timestamp"])
     @callback
-    def _update_logic(self, event=None):
+    def _update_logic(self, data, result):
+        """Publica el resultado calculado por el coordinador del grupo de sensores."""
         if not self.check_config:
             return
 
-        # 1. Datos Solares
-        sun_state = self.hass.states.get("sun.sun")
-        if not sun_state:
-            return
-        
-        sun_az = float(sun_state.attributes.get("azimuth", 180))
-        sun_el = float(sun_state.attributes.get("elevation", 0))
+        if self._context is not None:
+            power = 0.0 if data["night"] else result["power"]
+            # Energía estimada (trapecios) en el mismo camino, en el instante de la muestra
+            self._context.energy[ENERGY_ESTIMATED].add(data["timestamp"], power)
+            # Estimación sin redondear ni filtrar para el sensor de rendimiento
+            self._context.async_set_power(power)
 
-        if sun_el <= 0:
+        if data["night"]:
             self._attr_native_value = 0
-            self._attr_extra_state_attributes = {
+            self._attr_extra_state_attributes = self._attribute_policy.filter({
                 "estado_solar": "Noche",
-                "sun_elevation": sun_el
-            }
-            self.async_write_ha_state()
+                "sun_elevation": round(data["sun_el"], 2),
+                **self._forecast_attributes
+            })
+            self._async_write_filtered()
             return
 
-        # 2. Datos del Sensor de Referencia (DESDE EL GRUPO DE SENSORES)
-        ref_sensor = self._sensor_group.get(CONF_REF_SENSOR)
-        irr_ref = self.get_float_state(ref_sensor, 0.0)
-        
-        # 3. Datos Ambientales (DESDE EL GRUPO DE SENSORES)
-        temp_sensor = self._sensor_group.get(CONF_TEMP_SENSOR)
-        t_amb = self.get_float_state(temp_sensor, 25.0)
-        
-        wind_sensor = self._sensor_group.get(CONF_WIND_SENSOR)
-        wind_speed = 1.0 
-        if wind_sensor:
-            wind_speed = self.get_float_state(wind_sensor, 1.0)
-            
-        # Panel Temp (Si existe en el grupo)
-        # ... logic not implemented fully in previous version but ready here
-
-        # 4. Cálculos Geométricos para Transposición
-        target_az = self._config.get(CONF_AZIMUTH)
-        target_tilt = self._config.get(CONF_TILT)
-        cos_theta_target = self.calculate_cos_incidence(sun_az, sun_el, target_az, target_tilt)
+        self._attr_native_value = round(result["power"], 2)
+        self._attr_extra_state_attributes = self._attribute_policy.filter({
+            "irradiancia_referencia": round(data["irr_ref"], 1),
+            "irradiancia_global_horizontal": round(data["ghi"], 1),
+            "irradiancia_directa_normal": round(data["dni"], 1),
+            "irradiancia_difusa_horizontal": round(data["dhi"], 1),
+            "irradiancia_incidente_estimada": round(result["irr_target"], 1),
+            "factor_transposicion": round(result["geometric_factor"], 3),
+            "temperatura_celula": round(result["t_cell"], 1),
+            "temperatura_ambiente": round(data["t_amb"], 1),
+            "voltaje_total_estimado": round(result["v_string"], 1),
+            "corriente_total_estimada": round(result["i_total"], 2),
+            "irradiancia_cielo_despejado": round(data["clear_sky_ghi"], 1),
+            "indice_cielo_despejado": round(data["clear_sky_index"], 3) if data["clear_sky_index"] is not None else None,
+            **self._forecast_attributes
+        })
+        self._async_write_filtered()
 
-        # Sensor Referencia (GEOMETRÍA DESDE EL GRUPO)
-        ref_az = self._sensor_group.get(CONF_REF_ORIENTATION)
-        ref_tilt = self._sensor_group.get(CONF_REF_TILT)
-        cos_theta_ref = self.calculate_cos_incidence(sun_az, sun_el, ref_az, ref_tilt)
-
-        # Transposición de Irradiancia
-        # Transposición de Irradiancia (Modelo Híbrido: Directa + Difusa)
-        
-        # 1. Obtener Cloud Coverage (0-100%)
-        # Intentamos obtenerlo del sensor group data (que actualiza el virtual sensor)
-        # O lo leemos directamente de la entidad weather configurada
-        weather_entity = self._sensor_group.get(CONF_WEATHER_ENTITY)
-        cloud_coverage = 0.0
-        
-        if weather_entity:
-            w_state = self.hass.states.get(weather_entity)
-            if w_state and w_state.state not in ["unavailable", "unknown"]:
-                # Caso A: Es un sensor numérico (unit %)
-                if w_state.domain == "sensor":
-                    try:
-                        cloud_coverage = float(w_state.state)
-                    except: pass
-                # Caso B: Es una entidad weather (attribute cloud_coverage)
-                elif w_state.domain == "weather":
-                    c = w_state.attributes.get("cloud_coverage")
-                    if c is not None:
-                       try:
-                           cloud_coverage = float(c)
-                       except: pass
-                    else:
-                        # Fallback: Estimar por estado texto
-                        condition = w_state.state
-                        if condition in ["sunny", "clear-night"]: cloud_coverage = 0
-                        elif condition in ["partlycloudy", "cloudy"]: cloud_coverage = 50
-                        elif condition in ["fog", "hail", "lightning", "lightning-rainy", "pouring", "rainy", "snowy", "snowy-rainy"]: cloud_coverage = 100
-        
-        # 2. Calcular Factor de Difusión (k)
-        # 0% nubes -> k=0.1 (10% difusa, 90% directa)
-        # 100% nubes -> k=0.9 (90% difusa, 10% directa)
-        # Interpolación lineal simple
-        k = 0.1 + (0.8 * (cloud_coverage / 100.0))
-        
-        # 3. Aplicar Factores
-        # Directa: Afectada por geometría
-        # Difusa: Isotrópica (simplificado, ratio ~1 o corrección leve)
-        # Para difusa, usaremos un factor simple de 1 (asumiendo que viene de todo el cielo igual)
-        # O mejor, un modelo simple de cielo isotrópico: (1 + cos(tilt_target))/2 / (1 + cos(tilt_ref))/2
-        # Pero 1.0 es suficiente para MVP.
-        
-        diffuse_factor = 1.0 
-        
-        if cos_theta_ref < 0.05:
-            geometric_factor = 0 # Evitar división por cero
-        else:
-            geometric_factor = cos_theta_target / cos_theta_ref
-            
-        # Fórmula Híbrida
-        # I_target = I_ref * [ (1-k)*Geometric + k*Diffuse ]
-        
-        combined_factor = ((1 - k) * geometric_factor) + (k * diffuse_factor)
-        
-        irr_target = irr_ref * combined_factor
-
-        # 5. Modelo Térmico
-        noct = self._panel_data.get("noct", 45)
-        t_cell = t_amb + (irr_target / 800) * (noct - 20)
-
-        # 6. Cálculo de Potencia DC
-        p_stc = self._panel_data.get("p_stc", 400)
-        gamma = self._panel_data.get("gamma", -0.4) / 100.0
-        num_panels_series = self._config.get(CONF_NUM_PANELS, 1)
-        num_strings_parallel = self._config.get(CONF_NUM_STRINGS, 1)
-
-        temp_diff = t_cell - 25
-        temp_factor_power = 1 + (gamma * temp_diff)
-        
-        power_unit = p_stc * (irr_target / 1000.0) * temp_factor_power
-        total_panels = num_panels_series * num_strings_parallel
-        total_power = max(0, power_unit * total_panels)
+    @callback
+    def _async_write_filtered(self, force=False):
+        if self._write_filter.should_write(self._attr_native_value, self._attr_extra_state_attributes, force):
+            self.async_write_ha_state()
 
-        # VOLTAJE E INTENSIDAD (Estimación)
-        vmp = self._panel_data.get("vmp", 30.0)
-        imp = self._panel_data.get("imp", 10.0)
-        
-        v_string = vmp * num_panels_series * temp_factor_power
-        i_total = imp * (irr_target / 1000.0) * num_strings_parallel
-
-        if irr_target < 1:
-            v_string = 0
-            i_total = 0
-
-        self._attr_native_value = round(total_power, 2)
-        self._attr_extra_state_attributes = {
-            "irradiancia_referencia": round(irr_ref, 1),
-            "irradiancia_incidente_estimada": round(irr_target, 1),
-            "factor_transposicion": round(geometric_factor, 3),
-            "temperatura_celula": round(t_cell, 1),
-            "temperatura_ambiente": round(t_amb, 1),
-            "voltaje_total_estimado": round(v_string, 1),
-            "corriente_total_estimada": round(i_total, 2)
+    @callback
+    def _update_forecast(self, forecast):
+        """Resumen de la previsión a 48 h (la serie completa se obtiene con el servicio get_forecast)."""
+        self._forecast_attributes = {
+            "energia_prevista_hoy": forecast["summary"]["today"],
+            "energia_prevista_manana": forecast["summary"]["tomorrow"],
         }
-        self.async_write_ha_state()
+        self._attr_extra_state_attributes = {**self._attr_extra_state_attributes, **self._forecast_attributes}
+        # Un nuevo resumen de previsión se publica siempre (llega como mucho cada pocos minutos)
+        self._async_write_filtered(force=True)
 
     async def async_added_to_hass(self):
-        """Suscribirse a actualizaciones."""
-        # Get entities from the sensor group dict
-        entities = ["sun.sun", self._sensor_group.get(CONF_REF_SENSOR), self._sensor_group.get(CONF_TEMP_SENSOR)]
-        if self._sensor_group.get(CONF_WIND_SENSOR):
-            entities.append(self._sensor_group.get(CONF_WIND_SENSOR))
-        
-        # Track weather entity if available in group
-        if self._sensor_group.get(CONF_WEATHER_ENTITY):
-             entities.append(self._sensor_group.get(CONF_WEATHER_ENTITY))
-            
+        """Suscribirse al coordinador del grupo de sensores."""
+        if not self.check_config:
+            return
+        # Latido temporizado: publica el último valor suprimido aunque no lleguen más entradas
+        self.async_on_remove(self._write_filter.async_start(self.hass, self.async_write_ha_state))
+        coordinator = get_coordinator(self.hass, self._sensor_group_id, self._sensor_group)
+        context = self._context
+        if context is not None:
+            # La geometría pudo cambiar entre la creación del sensor y su alta
+            self._string = context.string
+            context.coordinator = coordinator
         self.async_on_remove(
-            async_track_state_change_event(self.hass, entities, self._update_logic)
+            coordinator.async_add_listener(self._update_logic, self._string, self._update_forecast, key=context)
         )
 
-class SensorGroupVirtualSensor(SensorEntity):
+class SensorGroupVirtualSensor(InstrumentedEntity, SensorEntity):
     """A virtual sensor that represents the health and data of a Sensor Group."""
+
+    _unrecorded_attributes = diagnostic_attributes(SENSOR_GROUP_ATTRIBUTE_LEVELS)
     
-    def __init__(self, hass, config_entry, target_device_identifiers=None):
+    def __init__(self, hass, config_entry, target_device_identifiers=None, db=None):
         self.hass = hass
         self._config = config_entry.data
+        db = db or hass.data[DOMAIN]["db"]
+        self._attribute_policy = AttributePolicy(db.settings, SENSOR_GROUP_ATTRIBUTE_LEVELS)
         self._name = self._config.get(CONF_SENSOR_GROUP_NAME)
         
         # Identity
@@ -350,6 +299,8 @@ class SensorGroupVirtualSensor(SensorEntity):
                 entry_type=dr.DeviceEntryType.SERVICE
             )
 
+        self.setup_instrumentation(hass, "sensor_group_update")
+
     async def async_added_to_hass(self):
         """Subscribe to all linked sensors."""
         sensors_to_track = []
@@ -364,6 +315,7 @@ class SensorGroupVirtualSensor(SensorEntity):
         )
         self._update_state()
 
+    @instrumented_handler(event_time=state_event_time)
     @callback
     def _update_state(self, event=None):
         """Update state and attributes based on linked sensors."""
@@ -424,18 +376,19 @@ class SensorGroupVirtualSensor(SensorEntity):
             status = "Unavailable"
             
         self._attr_native_value = status
-        self._attr_extra_state_attributes = attributes
+        self._attr_extra_state_attributes = self._attribute_policy.filter(attributes)
         self.async_write_ha_state()
 
-class SolarStringPerformanceSensor(SensorEntity):
+class SolarStringPerformanceSensor(InstrumentedEntity, SensorEntity):
     """Sensor for Solar String Performance (Efficiency)."""
-    
+
+    _unrecorded_attributes = diagnostic_attributes(PERFORMANCE_ATTRIBUTE_LEVELS)
     _attr_native_unit_of_measurement = "%"
     _attr_device_class = None
     _attr_state_class = SensorStateClass.MEASUREMENT
     _attr_icon = "mdi:chart-line"
 
-    def __init__(self, hass, config_entry_data, db, sensor_group_data):
+    def __init__(self, hass, config_entry_data, db, sensor_group_data, device_identifiers=None, context=None):
         self.hass = hass
         self._config = config_entry_data
         self._string_name = self._config.get(CONF_STRING_NAME)
@@ -444,25 +397,9 @@ class SolarStringPerformanceSensor(SensorEntity):
         
         # Link to same device
         string_id = f"str_{self._string_name.lower().replace(' ', '_')}"
-        # We rely on the main sensor to create/link the device first usually, 
-        # but here we just target the same identifiers. 
-        # Linking to real device happens in main sensor, so we just target the *result* identifier?
-        # No, if main sensor links to real device, its identifiers CHANGE to the real device's identifiers.
-        # So we must replicate the linking logic here to find the correct identifiers!
-        
-        real_sensor_id = self._config.get(CONF_REAL_PRODUCTION_SENSOR)
-        device_iden = None
-        
-        if real_sensor_id:
-             ent_reg = er.async_get(hass)
-             entity_entry = ent_reg.async_get(real_sensor_id)
-             if entity_entry and entity_entry.device_id:
-                 dev_reg = dr.async_get(hass)
-                 device = dev_reg.async_get(entity_entry.device_id)
-                 if device:
-                     device_identifiers = device.identifiers
-                     # We use the REAL device identifiers
-                     device_iden = device_identifiers
+        # We must use the same identifiers as the main sensor, which may be linked
+        # to the real device's identifiers (resolved once per entry in async_setup_entry)
+        device_iden = device_identifiers
 
         if not device_iden:
             device_iden = {(DOMAIN, string_id)} 
@@ -472,77 +409,229 @@ class SolarStringPerformanceSensor(SensorEntity):
         )
         
         self.real_sensor_id = self._config.get(CONF_REAL_PRODUCTION_SENSOR)
-        # We need the Forecast entity ID too? Or just calculate it from sibling?
-        # We can't easily get the sibling's state directly inside here without knowing its ID.
-        # Sibling ID is deterministic: f"sensor.{string_name_slug}" usually?
-        # Let's assume we can get it via unique_id lookup? 
-        # Actually easier to re-calculate forecast? No, expensive.
-        # We will try to find the forecast sensor state.
-        self.forecast_entity_id = None # Resolved later
+        # La estimación del string llega por el contexto compartido (sin buscar al hermano en el registro)
+        self._context = context
+        self._real_w = None
+        self._write_filter = StateWriteFilter(db.settings, absolute=PERFORMANCE_DEADBAND_ABSOLUTE)
+        self._attribute_policy = AttributePolicy(db.settings, PERFORMANCE_ATTRIBUTE_LEVELS)
+        self._attr_extra_state_attributes = {}
+        # Ratios por energía (15 min, 1 h, hoy), EWMA y mín/máx en memoria fija
+        string = context.string if context is not None else None
+        self._stats = PerformanceStats(string.p_stc * string.total_panels if string is not None else 0.0)
+        self.setup_instrumentation(hass, "performance_update")
+        # Un cambio de la producción real y de la estimación casi simultáneos = un cálculo
+        sensor_group_data = sensor_group_data or {}
+        self._scheduler = CoalescingScheduler(
+            hass,
+            self._update_state,
+            sensor_group_data.get(CONF_UPDATE_WINDOW, DEFAULT_UPDATE_WINDOW),
+        )
 
     async def async_added_to_hass(self):
-        """Subscribe to updates."""
-        # We need to track Real Sensor AND Forecast Sensor (self)
-        # But we don't know our sibling's entity_id easily until it's registered.
-        # We can use the unique_id to find it in registry?
-        
-        # Track real sensor
-        if self.real_sensor_id:
-            self.async_on_remove(
-                async_track_state_change_event(self.hass, [self.real_sensor_id], self._update_state)
-            )
-            
-        # We also want to update when *forecast* updates.
-        # The forecast sensor updates on sun/weather change.
-        # We can listen to the same triggers? 
-        # Or just poll?
-        # Let's try to update whenever Real Sensor updates for now.
-        
+        """Subscribe to updates of both sides: real production and estimate."""
+        if not self.real_sensor_id:
+            return
+
+        # Latido temporizado: publica el último valor suprimido aunque no lleguen más entradas
+        self.async_on_remove(self._write_filter.async_start(self.hass, self.async_write_ha_state))
+        self.async_on_remove(
+            async_track_state_change_event(self.hass, [self.real_sensor_id], self._handle_real_change)
+        )
+        if self._context is not None:
+            self.async_on_remove(self._context.async_add_power_listener(self._scheduler.async_schedule))
+        self.async_on_remove(self._scheduler.async_cancel)
+
+        state = self.hass.states.get(self.real_sensor_id)
+        self._real_w = self._parse_real(state)
+        self._integrate_real(state)
+        self._update_state()
+
+    @staticmethod
+    def _parse_real(state):
+        if not state or state.state in ["unavailable", "unknown"]:
+            return None
+        try:
+            return float(state.state)
+        except ValueError:
+            return 0
+
+    @instrumented_trigger(state_event_time)
     @callback
-    def _update_state(self, event=None):
+    def _handle_real_change(self, event):
+        new_state = event.data.get("new_state")
+        self._real_w = self._parse_real(new_state)
+        self._integrate_real(new_state)
+        self._scheduler.async_schedule()
+
+    def _integrate_real(self, state):
+        """Energía real (trapecios) en el instante de cada muestra del sensor real."""
+        if self._context is None:
+            return
+        integrator = self._context.energy[ENERGY_REAL]
+        if self._real_w is None:
+            integrator.reset_sample()
+        else:
+            integrator.add(state.last_updated.timestamp(), self._real_w)
+
+    @instrumented_handler()
+    @callback
+    def _update_state(self):
         if not self.real_sensor_id:
              return
              
-        real_state = self.hass.states.get(self.real_sensor_id)
-        if not real_state or real_state.state in ["unavailable", "unknown"]:
+        real_w = self._real_w
+        forecast_w = self._context.power if self._context is not None else None
+        now = time.time()
+        self._stats.add_sample(now, real_w, forecast_w)
+
+        if real_w is None:
             self._attr_native_value = 0
-            self.async_write_ha_state()
+            self._attr_extra_state_attributes = self._attribute_policy.filter(self._stats.attributes(now))
+            self._async_write_filtered()
             return
             
-        try:
-            real_w = float(real_state.state)
-        except:
-            real_w = 0
-            
-        # Get Forecast
-        # We predict the entity_id of our sibling
-        # Default naming: sensor.string_name
-        # Use simple slugify approach or look up by unique_id
-        sibling_uid = f"str_{self._string_name.lower().replace(' ', '_')}"
-        
-        ent_reg = er.async_get(self.hass)
-        sibling_entry = ent_reg.async_get_entity_id("sensor", DOMAIN, sibling_uid)
-        
-        forecast_w = 1 # Avoid div by zero
-        if sibling_entry:
-            s_state = self.hass.states.get(sibling_entry)
-            if s_state and s_state.state not in ["unavailable", "unknown"]:
-                try:
-                    forecast_w = float(s_state.state)
-                except: pass
+        if forecast_w is None:
+            # El string aún no ha publicado su primera estimación
+            return
         
-        if forecast_w < 1: forecast_w = 1
+        if forecast_w < 1: forecast_w = 1 # Avoid div by zero
         
         # Efficiency = (Real / Forecast) * 100
         # If Real > Forecast, > 100% (Good performance or under-forecast)
         eff = (real_w / forecast_w) * 100
         self._attr_native_value = round(eff, 1)
+        self._attr_extra_state_attributes = self._attribute_policy.filter(self._stats.attributes(now))
+        self._async_write_filtered()
+
+    @callback
+    def _async_write_filtered(self):
+        if self._write_filter.should_write(self._attr_native_value, self._attr_extra_state_attributes):
+            self.async_write_ha_state()
+
+
+class IntegratedEnergySensor(RestoreSensor):
+    """Energy total (kWh) published from an ``EnergyIntegrator`` fed by another update path."""
+
+    _attr_native_unit_of_measurement = UnitOfEnergy.KILO_WATT_HOUR
+    _attr_device_class = SensorDeviceClass.ENERGY
+    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+    _attr_should_poll = False
+
+    def __init__(self, db, integrator):
+        self._integrator = integrator
+        self._attr_native_value = 0.0
+        # Solo banda absoluta: un 1 % de un total que no para de crecer acabaría silenciándolo
+        self._write_filter = StateWriteFilter(db.settings, absolute=ENERGY_DEADBAND_ABSOLUTE, relative=0)
+
+    async def async_added_to_hass(self):
+        """Restaurar el total y engancharse al integrador."""
+        last = await self.async_get_last_sensor_data()
+        if last is not None and last.native_value is not None:
+            try:
+                self._integrator.restore(float(last.native_value))
+            except (TypeError, ValueError):
+                pass
+        self._integrator.set_listener(self._handle_energy)
+        self.async_on_remove(lambda: self._integrator.set_listener(None))
+        self.async_on_remove(self._write_filter.async_start(self.hass, self.async_write_ha_state))
+        self._attr_native_value = round(self._integrator.total, 3)
+        self._write_filter.should_write(self._attr_native_value)
         self.async_write_ha_state()
 
+    @callback
+    def _handle_energy(self):
+        self._attr_native_value = round(self._integrator.total, 3)
+        if self._write_filter.should_write(self._attr_native_value):
+            self.async_write_ha_state()
+
+
+class SolarStringEnergySensor(IntegratedEnergySensor):
+    """Estimated or real energy (kWh) of a string, integrated by its power sensors."""
+
+    def __init__(self, hass, config_entry_data, db, context, kind, device_identifiers=None):
+        super().__init__(db, context.energy[kind])
+        self.hass = hass
+        self._context = context
+        self._kind = kind
+        string_name = config_entry_data.get(CONF_STRING_NAME)
+        string_id = f"str_{string_name.lower().replace(' ', '_')}"
+        self._attr_name = f"{string_name} Energía Estimada" if kind == ENERGY_ESTIMATED else f"{string_name} Energía Real"
+        self._attr_unique_id = f"{string_id}_energy_{kind}"
+        self._attr_icon = "mdi:solar-power" if kind == ENERGY_ESTIMATED else "mdi:meter-electric"
+        self._attr_device_info = DeviceInfo(identifiers=device_identifiers or {(DOMAIN, string_id)})
+
+
+class AggregatePowerSensor(SensorEntity):
+    """Estimated power of a roof, an inverter or the whole site (sum of its strings)."""
+
+    _unrecorded_attributes = diagnostic_attributes(AGGREGATE_ATTRIBUTE_LEVELS)
+
+    _attr_native_unit_of_measurement = UnitOfPower.WATT
+    _attr_device_class = SensorDeviceClass.POWER
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_should_poll = False
+
+    def __init__(self, hass, db, aggregate):
+        self.hass = hass
+        self._aggregate = aggregate
+        if aggregate.kind == AGGREGATE_SITE:
+            self._attr_name = f"{aggregate.name} Potencia Estimada"
+            self._attr_unique_id = "site_power"
+            self._attr_icon = "mdi:home-lightning-bolt"
+            self._attr_device_info = DeviceInfo(identifiers={(DOMAIN, "site")}, name=aggregate.name)
+        elif aggregate.kind == AGGREGATE_INVERTER:
+            self._attr_name = f"{aggregate.name} Potencia Estimada"
+            self._attr_unique_id = f"inverter_{aggregate.key}_power"
+            self._attr_icon = "mdi:solar-power-variant"
+            # El propio dispositivo del inversor (el del sensor de producción real)
+            self._attr_device_info = DeviceInfo(identifiers=aggregate.device_identifiers)
+        else:
+            self._attr_name = f"Tejado {aggregate.name} Potencia Estimada"
+            self._attr_unique_id = f"roof_{aggregate.key}_power"
+            self._attr_icon = "mdi:home-roof"
+            self._attr_device_info = DeviceInfo(identifiers={(DOMAIN, f"roof_{aggregate.key}")}, name=f"Tejado {aggregate.name}")
+        self._attr_native_value = 0
+        self._attr_extra_state_attributes = {}
+        self._write_filter = StateWriteFilter(db.settings)
+        self._attribute_policy = AttributePolicy(db.settings, AGGREGATE_ATTRIBUTE_LEVELS)
+
+    async def async_added_to_hass(self):
+        self.async_on_remove(self._write_filter.async_start(self.hass, self.async_write_ha_state))
+        self.async_on_remove(self._aggregate.async_add_listener(self._update_state))
+        self._update_state()
+
+    @callback
+    def _update_state(self):
+        aggregate = self._aggregate
+        value = aggregate.value
+        self._attr_native_value = round(value, 2)
+        self._attr_extra_state_attributes = self._attribute_policy.filter({
+            "miembros": len(aggregate.members),
+            "potencia_dc": round(aggregate.total, 2),
+            "limite_ac": aggregate.ac_limit,
+            "recorte": round(aggregate.total - value, 2),
+        })
+        if self._write_filter.should_write(self._attr_native_value, self._attr_extra_state_attributes):
+            self.async_write_ha_state()
+
+
+class SiteEnergySensor(IntegratedEnergySensor):
+    """Estimated energy (kWh) of the whole site, integrated from the site aggregate."""
+
+    _attr_icon = "mdi:home-lightning-bolt-outline"
+
+    def __init__(self, hass, db, hub):
+        super().__init__(db, hub.site_energy)
+        self.hass = hass
+        self._attr_name = f"{hub.site.name} Energía Estimada"
+        self._attr_unique_id = "site_energy_estimated"
+        self._attr_device_info = DeviceInfo(identifiers={(DOMAIN, "site")}, name=hub.site.name)
+
 
 class PVDatabaseSensor(SensorEntity):
     """Sensor to show PV Database status."""
-    
+
+    _unrecorded_attributes = diagnostic_attributes(PV_DATABASE_ATTRIBUTE_LEVELS)
     _attr_name = "Módulos Fotovoltaicos"
     _attr_unique_id = "pv_database_status"
     _attr_icon = "mdi:solar-panel"
@@ -557,15 +646,53 @@ class PVDatabaseSensor(SensorEntity):
             manufacturer="Accurate Solar Forecast",
             model="Database"
         )
+        self._attribute_policy = AttributePolicy(db.settings, PV_DATABASE_ATTRIBUTE_LEVELS)
         self._update_state()
 
     def _update_state(self):
         models = self._db.list_models()
         self._attr_native_value = len(models)
-        self._attr_extra_state_attributes = {
-            "model_list": list(models.keys())
-        }
+        # La lista completa puede tener miles de ids: solo en modo depuración
+        self._attr_extra_state_attributes = {}
+        if self._attribute_policy.includes("model_list"):
+            self._attr_extra_state_attributes["model_list"] = list(models.keys())
     
     async def async_added_to_hass(self):
         self._update_state()
         self.async_write_ha_state()
+
+
+class InstrumentationSensor(SensorEntity):
+    """Diagnostic sensor with the hot-path metrics (only when instrumentation is enabled)."""
+
+    _attr_name = "Latencia de Actualización"
+    _attr_unique_id = "instrumentation_latency"
+    _attr_icon = "mdi:timer-outline"
+    _attr_native_unit_of_measurement = "ms"
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    # Se sondea (30 s): el camino caliente no escribe nada por este sensor
+    _attr_should_poll = True
+
+    def __init__(self, hass, instrumentation):
+        self.hass = hass
+        self._instrumentation = instrumentation
+        self._attr_device_info = DeviceInfo(identifiers={(DOMAIN, "pv_database_global")})
+        self._attr_native_value = None
+        self._attr_extra_state_attributes = {}
+
+    async def async_update(self):
+        """Estado: el peor p99 de los manejadores; atributos: resumen por manejador."""
+        attributes = {}
+        worst = None
+        for name, summary in self._instrumentation.summary()["handlers"].items():
+            p99 = summary["latency"]["p99_ms"]
+            attributes[f"{name}_llamadas"] = summary["calls"]
+            attributes[f"{name}_p50_ms"] = summary["latency"]["p50_ms"]
+            attributes[f"{name}_p99_ms"] = p99
+            attributes[f"{name}_retardo_p99_ms"] = summary["event_to_write_lag"]["p99_ms"]
+            attributes[f"{name}_escritas"] = summary["writes"]
+            attributes[f"{name}_suprimidas"] = summary["filter_suppressed"]
+            if p99 is not None and (worst is None or p99 > worst):
+                worst = p99
+        self._attr_native_value = worst
+        self._attr_extra_state_attributes = attributes
@@ -0,0 +1,107 @@
+"""Services for the Accurate Solar Forecast integration."""
+import voluptuous as vol
+from homeassistant.core import SupportsResponse
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import config_validation as cv
+from homeassistant.util import dt as dt_util
+from .const import *
+from .forecast import FORECAST_STEP
+from .importer import CatalogueImportError, async_import_catalogue
+from .profiler import ProfilerError, async_profile
+
+GET_FORECAST_SCHEMA = vol.Schema({
+    vol.Optional(CONF_STRING_NAME): cv.string,
+})
+
+IMPORT_CATALOGUE_SCHEMA = vol.Schema({
+    vol.Required(CONF_CATALOGUE_PATH): cv.string,
+    vol.Optional(CONF_OVERWRITE, default=False): cv.boolean,
+})
+
+PROFILE_SCHEMA = vol.Schema({
+    vol.Optional(CONF_DURATION, default=DEFAULT_PROFILE_DURATION): vol.All(vol.Coerce(float), vol.Range(min=1, max=600)),
+    vol.Optional(CONF_TOP, default=DEFAULT_PROFILE_TOP): vol.All(vol.Coerce(int), vol.Range(min=1, max=100)),
+    vol.Optional(CONF_TRACEMALLOC, default=True): cv.boolean,
+})
+
+
+def async_setup_services(hass):
+    """Registra los servicios de la integración (una sola vez)."""
+    if hass.services.has_service(DOMAIN, SERVICE_GET_FORECAST):
+        return
+
+    async def async_get_forecast(call):
+        """Devuelve la previsión a 48 h (pasos de 15 min) de cada string."""
+        string_name = call.data.get(CONF_STRING_NAME)
+        step_hours = FORECAST_STEP / 3600
+        strings = {}
+
+        for coordinator in hass.data.get(DOMAIN, {}).get("coordinators", {}).values():
+            timestamps = coordinator.forecast_timestamps
+            for forecast in coordinator.forecast_results.values():
+                name = forecast["string"].name
+                if string_name and name != string_name:
+                    continue
+                strings[name] = {
+                    "sensor_group": coordinator.group_id,
+                    "energy_today": forecast["summary"]["today"],
+                    "energy_tomorrow": forecast["summary"]["tomorrow"],
+                    "forecast": [
+                        {
+                            "datetime": dt_util.as_local(dt_util.utc_from_timestamp(ts)).isoformat(),
+                            "power": round(power, 1),
+                            "energy": round(power * step_hours, 1),
+                        }
+                        for ts, power in zip(timestamps, forecast["power"])
+                    ],
+                }
+
+        return {"strings": strings}
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_GET_FORECAST,
+        async_get_forecast,
+        schema=GET_FORECAST_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+
+    async def async_import(call):
+        """Importa un catálogo de módulos (CSV/JSON) en la base de datos."""
+        try:
+            return await async_import_catalogue(
+                hass,
+                hass.data[DOMAIN]["db"],
+                call.data[CONF_CATALOGUE_PATH],
+                call.data[CONF_OVERWRITE],
+            )
+        except CatalogueImportError as err:
+            raise HomeAssistantError(str(err)) from err
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_IMPORT_CATALOGUE,
+        async_import,
+        schema=IMPORT_CATALOGUE_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+
+    async def async_profile_service(call):
+        """Perfila el bucle de eventos (cProfile/tracemalloc) durante N segundos."""
+        try:
+            return await async_profile(
+                hass,
+                call.data[CONF_DURATION],
+                call.data[CONF_TOP],
+                call.data[CONF_TRACEMALLOC],
+            )
+        except ProfilerError as err:
+            raise HomeAssistantError(str(err)) from err
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_PROFILE,
+        async_profile_service,
+        schema=PROFILE_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
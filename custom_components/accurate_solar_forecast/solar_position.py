@@ -0,0 +1,209 @@
+"""Solar position (PSA algorithm) for the Accurate Solar Forecast integration.
+
+Implements the Plataforma Solar de Almería algorithm (Blanco-Muriel et al., 2001),
+accurate to about 0.5 arc-minutes, so the sun can be positioned at the exact
+timestamp of an irradiance sample or at any future instant of a forecast horizon.
+
+Timestamps are POSIX seconds (UTC). Every function accepts either a scalar or a
+NumPy array of timestamps; arrays are evaluated in a single vectorized pass.
+"""
+import math
+from collections import OrderedDict
+from .const import DOMAIN, SOLAR_POSITION_LIVE_STEP, SOLAR_POSITION_CACHE_SIZE
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy ships with Home Assistant, but stay safe
+    np = None
+
+EARTH_MEAN_RADIUS = 6371.01 # km
+ASTRONOMICAL_UNIT = 149597890 # km
+UNIX_EPOCH_JULIAN_DATE = 2440587.5
+J2000_JULIAN_DATE = 2451545.0
+TWO_PI = 2 * math.pi
+
+
+def _math_for(value):
+    """Devuelve el módulo de funciones adecuado: numpy para arrays, math para escalares."""
+    if np is not None and isinstance(value, np.ndarray):
+        return np
+    return math
+
+
+def _refraction(elevation, site_elevation, xp):
+    """Corrección de refracción atmosférica (Sæmundsson) en grados.
+
+    Se escala con la presión estimada a la altitud del sitio; por debajo de -1°
+    de elevación no se aplica.
+    """
+    pressure_factor = math.exp(-(site_elevation or 0) / 8434.5)
+    if xp is math:
+        if elevation < -1:
+            return 0.0
+        return pressure_factor * 1.02 / math.tan(math.radians(elevation + 10.3 / (elevation + 5.11))) / 60
+
+    safe = np.maximum(elevation, -1.0)
+    refraction = pressure_factor * 1.02 / np.tan(np.radians(safe + 10.3 / (safe + 5.11))) / 60
+    return np.where(elevation < -1, 0.0, refraction)
+
+
+def solar_position(timestamp, latitude, longitude, elevation=0):
+    """Calcula la posición solar aparente.
+
+    Returns ``(azimuth, elevation)`` in degrees. Azimuth is measured clockwise from
+    North (180 = South), the same convention as ``sun.sun``; elevation includes the
+    parallax and refraction corrections.
+    """
+    xp = _math_for(timestamp)
+    if xp is math:
+        atan2, asin, acos, clip = math.atan2, math.asin, math.acos, lambda v: max(-1.0, min(1.0, v))
+    else:
+        atan2, asin, acos, clip = np.arctan2, np.arcsin, np.arccos, lambda v: np.clip(v, -1.0, 1.0)
+    rad = math.pi / 180
+
+    # Tiempo: días desde J2000.0 y hora decimal UT
+    elapsed_days = timestamp / 86400.0 + (UNIX_EPOCH_JULIAN_DATE - J2000_JULIAN_DATE)
+    decimal_hours = (timestamp % 86400.0) / 3600.0
+
+    # Coordenadas eclípticas
+    omega = 2.1429 - 0.0010394594 * elapsed_days
+    mean_longitude = 4.8950630 + 0.017202791698 * elapsed_days
+    mean_anomaly = 6.2400600 + 0.0172019699 * elapsed_days
+    ecliptic_longitude = (mean_longitude + 0.03341607 * xp.sin(mean_anomaly)
+                          + 0.00034894 * xp.sin(2 * mean_anomaly) - 0.0001134
+                          - 0.0000203 * xp.sin(omega))
+    ecliptic_obliquity = 0.4090928 - 6.2140e-9 * elapsed_days + 0.0000396 * xp.cos(omega)
+
+    # Coordenadas celestes: ascensión recta y declinación
+    sin_ecliptic_longitude = xp.sin(ecliptic_longitude)
+    right_ascension = atan2(xp.cos(ecliptic_obliquity) * sin_ecliptic_longitude, xp.cos(ecliptic_longitude)) % TWO_PI
+    declination = asin(xp.sin(ecliptic_obliquity) * sin_ecliptic_longitude)
+
+    # Coordenadas locales: ángulo horario, cenit y azimut
+    greenwich_sidereal_time = 6.6974243242 + 0.0657098283 * elapsed_days + decimal_hours
+    local_sidereal_time = (greenwich_sidereal_time * 15 + longitude) * rad
+    hour_angle = local_sidereal_time - right_ascension
+
+    latitude_rad = latitude * rad
+    cos_latitude = math.cos(latitude_rad)
+    sin_latitude = math.sin(latitude_rad)
+    cos_hour_angle = xp.cos(hour_angle)
+
+    cos_zenith = cos_latitude * cos_hour_angle * xp.cos(declination) + xp.sin(declination) * sin_latitude
+    zenith = acos(clip(cos_zenith))
+    azimuth = atan2(-xp.sin(hour_angle), xp.tan(declination) * cos_latitude - sin_latitude * cos_hour_angle)
+    azimuth = (azimuth % TWO_PI) / rad
+
+    # Corrección de paralaje
+    zenith = zenith + (EARTH_MEAN_RADIUS / ASTRONOMICAL_UNIT) * xp.sin(zenith)
+
+    sun_elevation = 90 - zenith / rad
+    sun_elevation = sun_elevation + _refraction(sun_elevation, elevation, xp)
+    return azimuth, sun_elevation
+
+
+class SolarPositionCache:
+    """Bounded LRU cache of solar positions keyed by a quantized timestamp.
+
+    Every string, sensor group and forecast horizon of a site asks for the same
+    instants, so timestamps are rounded to the nearest ``step`` seconds (e.g. 10 s
+    for live updates, 15 min for forecasts) and the ephemeris runs once per instant.
+    """
+
+    def __init__(self, latitude, longitude, elevation=0, step=10, maxsize=512):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.elevation = elevation
+        self.step = step
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+
+    def matches_site(self, latitude, longitude, elevation=0):
+        return (self.latitude, self.longitude, self.elevation) == (latitude, longitude, elevation)
+
+    def quantize(self, timestamp):
+        return int(round(timestamp / self.step)) * self.step
+
+    def position(self, timestamp):
+        """Devuelve ``(azimuth, elevation)`` para un timestamp escalar."""
+        key = self.quantize(timestamp)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return cached
+
+        self.misses += 1
+        cached = solar_position(float(key), self.latitude, self.longitude, self.elevation)
+        self._store(key, cached)
+        return cached
+
+    def positions(self, timestamps):
+        """Devuelve arrays ``(azimuth, elevation)`` para un array de timestamps.
+
+        Only the instants missing from the cache are computed, in one vectorized call.
+        """
+        keys = [self.quantize(ts) for ts in timestamps.tolist()]
+        missing = [key for key in dict.fromkeys(keys) if key not in self._cache]
+        self.misses += len(missing)
+        self.hits += len(keys) - len(missing)
+
+        computed = {}
+        if missing:
+            azimuths, elevations = solar_position(
+                np.array(missing, dtype=np.float64), self.latitude, self.longitude, self.elevation
+            )
+            computed = dict(zip(missing, zip(azimuths.tolist(), elevations.tolist())))
+
+        values = []
+        for key in keys:
+            value = computed.get(key)
+            if value is None:
+                value = self._cache[key]
+                self._cache.move_to_end(key)
+            values.append(value)
+
+        for key, value in computed.items():
+            self._store(key, value)
+
+        azimuths, elevations = zip(*values) if values else ((), ())
+        return np.array(azimuths, dtype=np.float64), np.array(elevations, dtype=np.float64)
+
+    def _store(self, key, value):
+        self._cache[key] = value
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    def clear(self):
+        self._cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "step": self.step,
+            "size": len(self._cache),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else None,
+        }
+
+
+def get_solar_position_cache(hass, step=SOLAR_POSITION_LIVE_STEP):
+    """Devuelve la caché de posición solar del sitio para el paso de cuantización dado.
+
+    Hay una caché por paso (p. ej. 10 s en vivo, 15 min para previsiones), compartida
+    por todos los grupos de sensores y strings.
+    """
+    caches = hass.data[DOMAIN].setdefault("solar_position_cache", {})
+    config = hass.config
+    cache = caches.get(step)
+    if cache is None or not cache.matches_site(config.latitude, config.longitude, config.elevation):
+        cache = SolarPositionCache(config.latitude, config.longitude, config.elevation, step, SOLAR_POSITION_CACHE_SIZE)
+        caches[step] = cache
+    return cache
@@ -0,0 +1,138 @@
+"""Live state of each configured string, shared by its entities.
+
+A string config entry sets up a power sensor, a performance sensor and two number
+entities (tilt, azimuth). The ``StringContext`` kept in
+``hass.data[DOMAIN]["strings"][entry_id]`` lets them talk to each other without a
+config entry reload: the numbers push new geometry into it, it rebuilds the
+``StringConfig`` and asks the sensor group coordinator to re-evaluate that single
+string. The config entry itself is only rewritten once the changes settle (a
+trailing debounce: every change restarts the wait).
+
+The string sensor also publishes its latest estimate here, so the performance
+sensor gets it without looking its sibling up in the registry or the state machine.
+Both sensors integrate their power into the context's energy integrators, which
+the energy sensors of the string publish.
+"""
+import logging
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_call_later
+from .const import *
+from .energy import ENERGY_KINDS, EnergyIntegrator
+from .engine import StringConfig
+
+_LOGGER = logging.getLogger(__name__)
+
+# Un barrido de inclinación desde un slider o una automatización = una escritura de la entrada
+GEOMETRY_SAVE_DELAY = 5 # segundos
+
+
+def get_string_context(hass, entry_id):
+    """Contexto del string (o None si su sensor no está cargado)."""
+    return hass.data.get(DOMAIN, {}).get("strings", {}).get(entry_id)
+
+
+class StringContext:
+    """Current geometry and engine configuration of one string config entry."""
+
+    def __init__(self, hass, config_entry, panel_data):
+        self.hass = hass
+        self.config_entry = config_entry
+        self.entry_id = config_entry.entry_id
+        self.config = dict(config_entry.data)
+        self.panel_data = panel_data
+        self.string = StringConfig.from_config(self.config, panel_data) if panel_data is not None else None
+        self.coordinator = None # Lo asigna el sensor del string al suscribirse
+        self.power = None       # Última potencia estimada (W) del string
+        self._power_listeners = []
+        # Energía estimada y real (kWh), integrada en el camino de actualización de cada sensor
+        self.energy = {kind: EnergyIntegrator() for kind in ENERGY_KINDS}
+        self._unsub_persist = None
+        self._unsub_stop = None
+
+    @callback
+    def async_register(self):
+        """Publica el contexto en ``hass.data`` (sustituye al de una carga anterior)."""
+        strings = self.hass.data[DOMAIN].setdefault("strings", {})
+        previous = strings.get(self.entry_id)
+        if previous is not None and previous is not self:
+            previous.async_shutdown()
+        strings[self.entry_id] = self
+        # Los cambios aún sin guardar no se pierden al parar Home Assistant
+        self._unsub_stop = self.hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, self._async_stop)
+
+    @callback
+    def async_shutdown(self):
+        """Guarda lo pendiente y retira el contexto."""
+        self.async_flush()
+        if self._unsub_stop is not None:
+            self._unsub_stop()
+            self._unsub_stop = None
+        strings = self.hass.data.get(DOMAIN, {}).get("strings", {})
+        if strings.get(self.entry_id) is self:
+            del strings[self.entry_id]
+
+    @callback
+    def _async_stop(self, _event):
+        self._unsub_stop = None
+        self.async_flush()
+
+    @callback
+    def async_set_power(self, power):
+        """Publica la potencia estimada del string a los sensores que dependen de ella."""
+        if power == self.power:
+            return
+        self.power = power
+        for update_callback in list(self._power_listeners):
+            update_callback()
+
+    @callback
+    def async_add_power_listener(self, update_callback):
+        """``update_callback()`` se llama cada vez que cambia la estimación. Devuelve la baja."""
+        self._power_listeners.append(update_callback)
+
+        @callback
+        def remove_listener():
+            if update_callback in self._power_listeners:
+                self._power_listeners.remove(update_callback)
+
+        return remove_listener
+
+    @callback
+    def async_set_geometry(self, tilt=None, azimuth=None):
+        """Aplica una nueva inclinación/orientación en caliente y recalcula solo este string."""
+        if tilt is not None:
+            self.config[CONF_TILT] = tilt
+        if azimuth is not None:
+            self.config[CONF_AZIMUTH] = azimuth
+
+        if self.panel_data is not None:
+            self.string = StringConfig.from_config(self.config, self.panel_data)
+            if self.coordinator is not None:
+                self.coordinator.async_update_string(self, self.string)
+
+        # Cada cambio reinicia la espera: se escribe cuando el slider deja de moverse
+        if self._unsub_persist is not None:
+            self._unsub_persist()
+        self._unsub_persist = async_call_later(self.hass, GEOMETRY_SAVE_DELAY, self._async_persist_later)
+
+    @callback
+    def async_flush(self):
+        """Escribe ya la geometría pendiente en la config entry."""
+        if self._unsub_persist is not None:
+            self._unsub_persist()
+            self._unsub_persist = None
+            self._async_persist()
+
+    @callback
+    def _async_persist_later(self, _now):
+        self._unsub_persist = None
+        self._async_persist()
+
+    @callback
+    def _async_persist(self):
+        entry = self.config_entry
+        data = {**entry.data, CONF_TILT: self.config.get(CONF_TILT), CONF_AZIMUTH: self.config.get(CONF_AZIMUTH)}
+        if data != entry.data:
+            # Sin listener de actualización: la entrada no se recarga
+            self.hass.config_entries.async_update_entry(entry, data=data)
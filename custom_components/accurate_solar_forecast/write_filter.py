@@ -0,0 +1,147 @@
+"""State write suppression (deadband + heartbeat) for the Accurate Solar Forecast sensors.
+
+Every ``async_write_ha_state`` goes through the state machine, the recorder and
+every websocket subscriber. A string sensor is recomputed on each reference
+sample, but most of those samples move the estimate by a fraction of a watt. The
+filter only lets a write through when:
+
+* the state moved outside the deadband ``max(absolute, relative · |last|)``;
+* a non-numeric attribute changed or an attribute appeared/disappeared (e.g.
+  the day/night transition);
+* the heartbeat elapsed since the last write, so the latest values (numeric
+  attributes included) still reach the recorder regularly;
+* the caller forces it (e.g. a new forecast summary).
+
+Numeric attributes ride along with those writes; on their own they never trigger
+one. An identical payload (the night state) is therefore written once and then
+only on the heartbeat.
+
+Once started with ``async_start``, a suppressed write also arms a timer for the
+end of the heartbeat, so the last suppressed value is published even if no
+further input arrives (e.g. the reference sensor goes quiet).
+"""
+import time
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_call_later
+from .const import *
+
+
+class StateWriteFilter:
+    """Decides whether an entity state write is worth doing.
+
+    ``settings`` is the integration-wide settings dict of ``PVDatabase``; it is read
+    on every call, so changes made from the options take effect immediately.
+    ``absolute`` overrides the absolute deadband for sensors whose unit is not W and
+    ``relative`` (in %) the relative one, e.g. 0 for ever-growing energy totals.
+    """
+
+    def __init__(self, settings, absolute=None, relative=None):
+        self._settings = settings
+        self._absolute = absolute
+        self._relative = relative
+        self._value = None
+        self._attributes = None
+        self._written_at = None
+        self._pending = None
+        self._hass = None
+        self._write = None
+        self._unsub_heartbeat = None
+        self.written = 0
+        self.suppressed = 0
+
+    @callback
+    def async_start(self, hass, write):
+        """Activa el latido temporizado; ``write()`` publica el estado actual de la entidad.
+
+        Devuelve la función que lo detiene (para ``async_on_remove``).
+        """
+        self._hass = hass
+        self._write = write
+        return self.async_stop
+
+    @callback
+    def async_stop(self):
+        self._async_cancel_heartbeat()
+        self._hass = None
+        self._write = None
+
+    def should_write(self, value, attributes=None, force=False):
+        """True si hay que escribir; en ese caso registra el valor como último escrito."""
+        now = time.monotonic()
+        attributes = attributes or {}
+        if force or self._written_at is None or self._changed(value, attributes) or self._heartbeat_due(now):
+            self._async_cancel_heartbeat()
+            self._mark_written(value, attributes, now)
+            return True
+        self.suppressed += 1
+        self._pending = (value, attributes)
+        if self._unsub_heartbeat is None and self._hass is not None:
+            heartbeat = self._heartbeat()
+            if heartbeat:
+                delay = max(heartbeat - (now - self._written_at), 0)
+                self._unsub_heartbeat = async_call_later(self._hass, delay, self._async_heartbeat)
+        return False
+
+    def reset(self):
+        """Olvida el último valor escrito (la siguiente escritura siempre pasa)."""
+        self._written_at = None
+
+    @callback
+    def _async_heartbeat(self, _now):
+        """Sin más entradas: publica el último valor suprimido al vencer el latido."""
+        self._unsub_heartbeat = None
+        if self._pending is None or self._write is None:
+            return
+        value, attributes = self._pending
+        self._mark_written(value, attributes, time.monotonic())
+        self._write()
+
+    @callback
+    def _async_cancel_heartbeat(self):
+        self._pending = None
+        if self._unsub_heartbeat is not None:
+            self._unsub_heartbeat()
+            self._unsub_heartbeat = None
+
+    def _mark_written(self, value, attributes, now):
+        self._value = value
+        self._attributes = attributes
+        self._written_at = now
+        self.written += 1
+
+    def _heartbeat(self):
+        return self._settings.get(CONF_HEARTBEAT, DEFAULT_HEARTBEAT)
+
+    def _heartbeat_due(self, now):
+        heartbeat = self._heartbeat()
+        return bool(heartbeat) and now - self._written_at >= heartbeat
+
+    def _changed(self, value, attributes):
+        if self._value_changed(self._value, value):
+            return True
+        last = self._attributes
+        if attributes.keys() != last.keys():
+            return True
+        for key, item in attributes.items():
+            if not _is_number(item) and item != last[key]:
+                return True
+        return False
+
+    def _value_changed(self, last, value):
+        if not (_is_number(last) and _is_number(value)):
+            return last != value
+        absolute = self._absolute
+        if absolute is None:
+            absolute = self._settings.get(CONF_DEADBAND_ABSOLUTE, DEFAULT_DEADBAND_ABSOLUTE)
+        relative = self._relative
+        if relative is None:
+            relative = self._settings.get(CONF_DEADBAND_RELATIVE, DEFAULT_DEADBAND_RELATIVE)
+        relative /= 100.0
+        threshold = max(absolute, relative * abs(last))
+        if threshold <= 0:
+            return value != last
+        return abs(value - last) >= threshold
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
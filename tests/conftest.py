@@ -0,0 +1,5 @@
+"""Shared fixtures: the integration and the benchmarks' fake ``hass`` importable from the repo root."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,93 @@
+"""Tests for the roof/inverter/site aggregation hub."""
+from custom_components.accurate_solar_forecast.aggregation import (
+    AGGREGATE_INVERTER,
+    AGGREGATE_ROOF,
+    AGGREGATE_SITE,
+    AggregationHub,
+)
+
+
+class FakeContext:
+    """Lo que el agregador usa de un ``StringContext``: la potencia y sus oyentes."""
+
+    def __init__(self, entry_id, power):
+        self.entry_id = entry_id
+        self.power = power
+        self.listeners = []
+
+    def async_add_power_listener(self, update_callback):
+        self.listeners.append(update_callback)
+        return lambda: self.listeners.remove(update_callback)
+
+    def set_power(self, power):
+        self.power = power
+        for update_callback in list(self.listeners):
+            update_callback()
+
+
+class FakeEntry:
+    """``async_add_entities`` de una entrada de grupo: anota las entidades recibidas."""
+
+    def __init__(self):
+        self.added = []
+
+    def async_add_entities(self, entities, update_before_add=False):
+        self.added.extend(entities)
+
+    def factory(self, aggregates):
+        return [(aggregate.kind, aggregate.key) for aggregate in aggregates]
+
+
+def test_incremental_totals_and_ac_limit():
+    hub = AggregationHub(None)
+    hub.async_add_roofs({"sur": {"name": "Sur"}})
+    contexts = [FakeContext("a", 3000.0), FakeContext("b", 2500.0)]
+    for context in contexts:
+        hub.async_register_string(context, "sur", ("inv1", "Inversor", {("test", "inv1")}), ac_limit=5000)
+
+    roof = hub.async_get_aggregate(AGGREGATE_ROOF, "sur", "Sur")
+    inverter = hub.async_get_aggregate(AGGREGATE_INVERTER, "inv1", "Inversor")
+    assert roof.total == 5500.0
+    assert inverter.value == 5000.0
+    assert hub.site.total == 5000.0
+
+    contexts[0].set_power(1000.0)
+    assert roof.total == 3500.0
+    assert hub.site.total == 3500.0
+
+
+def test_unloading_owner_hands_entities_to_next_group():
+    hub = AggregationHub(None)
+    hub.async_add_roofs({"sur": {"name": "Sur"}})
+    first, second = FakeEntry(), FakeEntry()
+
+    remove_first = hub.async_add_entity_adder("group_1", first.async_add_entities, first.factory)
+    remove_second = hub.async_add_entity_adder("group_2", second.async_add_entities, second.factory)
+    assert hub.owner == "group_1"
+    assert set(first.added) == {(AGGREGATE_SITE, AGGREGATE_SITE), (AGGREGATE_ROOF, "sur")}
+    assert second.added == []
+
+    # La entrada propietaria se descarga: la siguiente vuelve a crear todas las entidades
+    remove_first()
+    assert hub.owner == "group_2"
+    assert set(second.added) == {(AGGREGATE_SITE, AGGREGATE_SITE), (AGGREGATE_ROOF, "sur")}
+
+    # Los agregados nuevos se crean ya con la nueva propietaria
+    hub.async_get_aggregate(AGGREGATE_INVERTER, "inv1", "Inversor")
+    assert (AGGREGATE_INVERTER, "inv1") in second.added
+    assert (AGGREGATE_INVERTER, "inv1") not in first.added
+
+    remove_second()
+    assert hub.owner is None
+
+
+def test_unloading_candidate_keeps_owner():
+    hub = AggregationHub(None)
+    first, second = FakeEntry(), FakeEntry()
+    hub.async_add_entity_adder("group_1", first.async_add_entities, first.factory)
+    remove_second = hub.async_add_entity_adder("group_2", second.async_add_entities, second.factory)
+
+    remove_second()
+    assert hub.owner == "group_1"
+    assert first.added == [(AGGREGATE_SITE, AGGREGATE_SITE)]
+    assert second.added == []
@@ -0,0 +1,27 @@
+"""Recorder exclusion of the diagnostic attributes."""
+from custom_components.accurate_solar_forecast.attributes import sensor_class
+from custom_components.accurate_solar_forecast.const import CONF_UNRECORDED_ATTRIBUTES
+from custom_components.accurate_solar_forecast.pv_database import DEFAULT_SETTINGS
+from custom_components.accurate_solar_forecast.sensor import SensorGroupVirtualSensor, SolarStringSensor
+
+
+def _unrecorded(cls):
+    # Conjunto que Home Assistant pasa al recorder (se calcula al crear la clase)
+    return cls._Entity__combined_unrecorded_attributes
+
+
+def test_diagnostic_attributes_unrecorded_by_default():
+    cls = sensor_class(SolarStringSensor, DEFAULT_SETTINGS)
+
+    assert cls is SolarStringSensor
+    assert "temperatura_celula" in _unrecorded(cls)
+    assert "energia_prevista_hoy" not in _unrecorded(cls)
+
+
+def test_setting_off_records_diagnostic_attributes():
+    settings = {**DEFAULT_SETTINGS, CONF_UNRECORDED_ATTRIBUTES: False}
+    cls = sensor_class(SensorGroupVirtualSensor, settings)
+
+    assert issubclass(cls, SensorGroupVirtualSensor)
+    assert _unrecorded(cls) == SensorGroupVirtualSensor._entity_component_unrecorded_attributes
+    assert sensor_class(SensorGroupVirtualSensor, settings) is cls
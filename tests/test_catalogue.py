@@ -0,0 +1,63 @@
+"""Shard LRU of the module catalogue: modified shards are never dropped before they are written."""
+import asyncio
+
+import homeassistant.core  # noqa: F401 - storage necesita el core importado antes
+
+from benchmarks.fake_hass import FakeHass
+from custom_components.accurate_solar_forecast.catalogue import ModuleCatalogue, model_id_for
+
+STORAGE_KEY = "accurate_solar_forecast_test"
+
+
+def _models(catalogue, count):
+    """Modelos repartidos en shards distintos, uno por shard."""
+    models = {}
+    shards = set()
+    index = 0
+    while len(models) < count:
+        name = f"Modelo {index}"
+        index += 1
+        shard = catalogue.shard_for(model_id_for(name))
+        if shard not in shards:
+            shards.add(shard)
+            models[model_id_for(name)] = {"name": name, "brand": "Marca", "pmax": 400 + index}
+    return models
+
+
+def test_dirty_shards_survive_eviction_until_flushed(tmp_path):
+    async def scenario():
+        hass = FakeHass(str(tmp_path))
+        catalogue = ModuleCatalogue(hass, STORAGE_KEY, shards=8, cache_size=2)
+        models = _models(catalogue, 5)
+        dirty = {catalogue.shard_for(model_id) for model_id in models}
+
+        await catalogue.async_set_models(models)
+
+        # Cinco shards modificados con un LRU de dos: ninguno se descarta
+        assert set(catalogue._shards) == dirty
+        assert catalogue.resident_models == 5
+
+        await catalogue.async_flush()
+        assert not catalogue.dirty
+        assert len(catalogue._shards) <= catalogue.cache_size
+
+        # Un shard modificado sigue residente mientras se recorren los demás con el LRU
+        first, *others = models
+        models[first] = dict(models[first], pmax=999)
+        await catalogue.async_set_models({first: models[first]})
+        for model_id in others:
+            assert await catalogue.async_get_model(model_id) == models[model_id]
+            assert catalogue.shard_for(first) in catalogue._shards
+        assert catalogue.get_resident_model(first)["pmax"] == 999
+
+        await catalogue.async_flush()
+        assert len(catalogue._shards) <= catalogue.cache_size
+
+        # Los expulsados se leen de disco con sus datos
+        reloaded = ModuleCatalogue(hass, STORAGE_KEY, shards=8, cache_size=2)
+        assert await reloaded.async_load()
+        for model_id, model in models.items():
+            assert await reloaded.async_get_model(model_id) == model
+        assert len(reloaded._shards) <= reloaded.cache_size
+
+    asyncio.run(scenario())
@@ -0,0 +1,50 @@
+"""Decomposition of the reference reading and transposition back to its plane."""
+import pytest
+
+from custom_components.accurate_solar_forecast.const import TRANSPOSITION_ISOTROPIC, TRANSPOSITION_PEREZ
+from custom_components.accurate_solar_forecast.decomposition import (
+    INVERSION_TOLERANCE,
+    decompose,
+    plane_irradiance,
+    sky_diffuse_terms,
+)
+from custom_components.accurate_solar_forecast.engine import Surface, sun_trig
+
+DOY = 172
+
+
+def _transpose_back(irr_ref, surface, sun, model):
+    ghi, dni, dhi, kt = decompose(irr_ref, surface, sun, DOY, model)
+    sky = sky_diffuse_terms(dni, dhi, sun["cos_zenith"], DOY, model)
+    return ghi, dni, dhi, plane_irradiance(dni, dhi, ghi, surface.cos_incidence(sun), surface, sky)
+
+
+@pytest.mark.parametrize("model", [TRANSPOSITION_ISOTROPIC, TRANSPOSITION_PEREZ])
+@pytest.mark.parametrize("irr_ref", [150.0, 450.0, 800.0])
+@pytest.mark.parametrize("sun_az, sun_el", [(180, 60), (120, 35)])
+def test_tilted_sensor_round_trip(model, irr_ref, sun_az, sun_el):
+    surface = Surface(30, 180)
+    sun = sun_trig(sun_az, sun_el)
+
+    ghi, dni, dhi, poa = _transpose_back(irr_ref, surface, sun, model)
+
+    assert ghi > 0 and dni >= 0 and dhi > 0
+    assert poa == pytest.approx(irr_ref, abs=INVERSION_TOLERANCE)
+
+
+def test_horizontal_sensor_is_ghi():
+    surface = Surface(0, 180)
+    sun = sun_trig(180, 50)
+
+    ghi, dni, dhi, poa = _transpose_back(600.0, surface, sun, TRANSPOSITION_ISOTROPIC)
+
+    assert ghi == 600.0
+    assert dni * sun["cos_zenith"] + dhi == pytest.approx(ghi)
+    assert poa == pytest.approx(600.0)
+
+
+def test_night_and_dark_readings_decompose_to_zero():
+    surface = Surface(30, 180)
+
+    assert decompose(300.0, surface, sun_trig(180, -5), DOY) == (0.0, 0.0, 0.0, 0.0)
+    assert decompose(0.0, surface, sun_trig(180, 40), DOY) == (0.0, 0.0, 0.0, 0.0)
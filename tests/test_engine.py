@@ -0,0 +1,55 @@
+"""Vectorized string evaluation against the scalar path."""
+import pytest
+
+from custom_components.accurate_solar_forecast.const import TRANSPOSITION_PEREZ
+from custom_components.accurate_solar_forecast.decomposition import sky_diffuse_terms
+from custom_components.accurate_solar_forecast.engine import (
+    BATCH_MIN_SIZE,
+    StringBatch,
+    StringConfig,
+    build_batch,
+    evaluate_string,
+    evaluate_strings,
+    sun_trig,
+)
+
+STRINGS = [
+    StringConfig(30, 180, 450, -0.0035, 45, 41.5, 10.85, 10, 1, "sur"),
+    StringConfig(15, 90, 400, -0.004, 44, 30.0, 10.0, 8, 2, "este"),
+    StringConfig(15, 270, 400, -0.004, 44, 30.0, 10.0, 8, 2, "oeste"),
+    StringConfig(60, 200, 350, -0.0038, 46, 35.0, 9.5, 12, 1, "fachada"),
+    StringConfig(0, 180, 500, -0.0029, 43, 45.0, 11.0, 6, 1, "plano"),
+]
+
+
+def _ref(sun_az, sun_el, irr_ref, model=None):
+    sun = sun_trig(sun_az, sun_el)
+    dni, dhi, ghi = 550.0, 120.0, 600.0
+    f1, f2, circumsolar = sky_diffuse_terms(dni, dhi, sun["cos_zenith"], 172, model)
+    return {"sun": sun, "irr_ref": irr_ref, "ghi": ghi, "dni": dni, "dhi": dhi, "t_amb": 22.0,
+            "f1": f1, "f2": f2, "circumsolar": circumsolar}
+
+
+@pytest.mark.parametrize("model", [None, TRANSPOSITION_PEREZ])
+@pytest.mark.parametrize("sun_az, sun_el, irr_ref", [(180, 55, 650), (100, 12, 200), (250, 30, 0.5)])
+def test_batch_matches_scalar(model, sun_az, sun_el, irr_ref):
+    ref = _ref(sun_az, sun_el, irr_ref, model)
+    arrays = StringBatch(STRINGS).evaluate(ref)
+
+    for index, string in enumerate(STRINGS):
+        expected = evaluate_string(ref, string)
+        for key, value in expected.items():
+            assert arrays[key][index] == pytest.approx(value, abs=1e-9), (string.name, key)
+
+
+def test_small_groups_fall_back_to_scalar_path():
+    ref = _ref(180, 55, 650)
+    small = STRINGS[:BATCH_MIN_SIZE - 1]
+
+    assert build_batch(small) is None
+    assert evaluate_strings(ref, small) == [evaluate_string(ref, string) for string in small]
+
+    batch = build_batch(STRINGS)
+    assert batch is not None
+    for batched, string in zip(evaluate_strings(ref, STRINGS, batch), STRINGS):
+        assert batched == pytest.approx(evaluate_string(ref, string))
@@ -0,0 +1,61 @@
+"""Vectorized day-ahead forecast against the scalar fallback."""
+import pytest
+
+from custom_components.accurate_solar_forecast.const import TRANSPOSITION_PEREZ
+from custom_components.accurate_solar_forecast.engine import StringConfig
+from custom_components.accurate_solar_forecast.forecast import (
+    FORECAST_STEP,
+    _compute_forecast_scalar,
+    compute_forecast,
+    forecast_timestamps,
+)
+from custom_components.accurate_solar_forecast.solar_position import SolarPositionCache
+
+START = 1718928000 # 2024-06-21 00:00 UTC
+STRINGS = [
+    StringConfig(30, 180, 450, -0.0035, 45, 41.5, 10.85, 10, 1, "sur"),
+    StringConfig(20, 95, 400, -0.004, 44, 30.0, 10.0, 8, 2, "este"),
+    StringConfig(90, 250, 350, -0.0038, 46, 35.0, 9.5, 6, 1, "fachada"),
+]
+
+
+def _rows(cloud, temperature):
+    """Previsión horaria de 48 h: ``(timestamp, nubosidad, temperatura, viento)``."""
+    return [(START + hour * 3600, cloud(hour), temperature(hour), 2.0) for hour in range(48)]
+
+
+def _both(rows, model=None):
+    timestamps = forecast_timestamps(START, rows)
+    vectorized = compute_forecast(rows, STRINGS, timestamps, SolarPositionCache(40.4, -3.7, 650, step=FORECAST_STEP), 650, model)
+    scalar = _compute_forecast_scalar(rows, STRINGS, timestamps, SolarPositionCache(40.4, -3.7, 650, step=FORECAST_STEP), 650, model)
+    return timestamps, vectorized, scalar
+
+
+@pytest.mark.parametrize("model", [None, TRANSPOSITION_PEREZ])
+def test_constant_weather_matches_scalar_path(model):
+    timestamps, vectorized, scalar = _both(_rows(lambda hour: 35.0, lambda hour: 24.0), model)
+
+    assert len(vectorized) == len(STRINGS)
+    for string_vectorized, string_scalar in zip(vectorized, scalar):
+        assert len(string_vectorized) == len(timestamps)
+        assert string_vectorized == pytest.approx(string_scalar, rel=1e-9, abs=1e-6)
+    assert max(vectorized[0]) > 1000
+    assert vectorized[0][0] == 0.0 # medianoche
+
+
+def test_hourly_instants_match_with_changing_weather():
+    rows = _rows(lambda hour: (hour * 17) % 100, lambda hour: 12.0 + hour % 24)
+    timestamps, vectorized, scalar = _both(rows)
+
+    # Entre horas el vectorizado interpola la meteo y el escalar la mantiene: solo se comparan las horas en punto
+    on_the_hour = [index for index, ts in enumerate(timestamps) if ts % 3600 == 0]
+    for string_vectorized, string_scalar in zip(vectorized, scalar):
+        for index in on_the_hour:
+            assert string_vectorized[index] == pytest.approx(string_scalar[index], rel=1e-9, abs=1e-6)
+
+
+def test_empty_inputs():
+    cache = SolarPositionCache(40.4, -3.7, 650, step=FORECAST_STEP)
+
+    assert compute_forecast([], STRINGS, [START], cache) == [[], [], []]
+    assert compute_forecast(_rows(lambda hour: 0, lambda hour: 20), STRINGS, [], cache) == [[], [], []]
@@ -0,0 +1,81 @@
+"""Catalogue importer: CEC column aliases, validation and deduplication."""
+import asyncio
+import csv
+
+import homeassistant.core  # noqa: F401 - storage necesita el core importado antes
+
+from benchmarks.fake_hass import FakeHass
+from custom_components.accurate_solar_forecast.importer import async_import_catalogue, map_row
+from custom_components.accurate_solar_forecast.pv_database import PVDatabase
+
+# Cabecera de la librería de módulos CEC (SAM), con la fila de unidades que le sigue
+CEC_HEADER = ["Name", "Manufacturer", "Technology", "STC", "T_NOCT", "V_oc_ref", "I_sc_ref", "V_mp_ref", "I_mp_ref", "gamma_r"]
+CEC_UNITS = ["Units", "", "", "W", "C", "V", "A", "V", "A", "%/K"]
+
+
+def _cec_row(name, stc=400.0, manufacturer="Acme Solar"):
+    return dict(zip(CEC_HEADER, [name, manufacturer, "Mono-c-Si", str(stc), "45.2", "49.1", "10.4", "41.2", "9.71", "-0.35"]))
+
+
+def test_map_row_reads_cec_columns():
+    model = map_row(_cec_row("Acme AS-400M"))
+
+    assert model == {
+        "name": "Acme AS-400M",
+        "brand": "Acme Solar",
+        "p_stc": 400.0,
+        "gamma": -0.35,
+        "noct": 45.2,
+        "voc": 49.1,
+        "isc": 10.4,
+        "vmp": 41.2,
+        "imp": 9.71,
+    }
+
+
+def test_map_row_defaults_and_rejects():
+    minimal = map_row({"model": "Sin Marca", "pmax": "300", "voc": "40", "isc": "9", "vmp": "33", "imp": "8.5"})
+    assert minimal["brand"] == "Generic"
+    assert (minimal["gamma"], minimal["noct"]) == (-0.4, 45)
+
+    assert map_row(dict(zip(CEC_HEADER, CEC_UNITS))) is None # fila de unidades
+    assert map_row(_cec_row("")) is None
+    assert map_row(_cec_row("Negativo", stc=-5)) is None
+    assert map_row(dict(_cec_row("Roto"), V_oc_ref="n/a")) is None
+    assert map_row(["no", "es", "un", "dict"]) is None
+
+
+def test_import_deduplicates_against_batch_and_database(tmp_path):
+    path = tmp_path / "cec_modules.csv"
+    rows = [
+        _cec_row("Acme AS-400M"),
+        _cec_row("Acme AS-400M", stc=405), # repetido en el mismo lote
+        _cec_row("Acme AS-410M", stc=410),
+        _cec_row("Acme AS-300P", stc=999), # ya está en la DB
+        _cec_row("Acme AS-420M", stc=420),
+        _cec_row("Acme AS-400M", stc=401), # lote siguiente: ya importado
+    ]
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(CEC_HEADER)
+        writer.writerow(CEC_UNITS)
+        writer.writerows([row[column] for column in CEC_HEADER] for row in rows)
+
+    async def scenario():
+        hass = FakeHass(str(tmp_path))
+        hass.config.is_allowed_path = lambda path: True
+        db = PVDatabase(hass)
+        await db.async_load()
+        await db.add_models([map_row(_cec_row("Acme AS-300P", stc=300))])
+
+        summary = await async_import_catalogue(hass, db, "cec_modules.csv", batch_size=4)
+        assert summary == {"imported": 3, "updated": 0, "invalid": 1, "duplicates": 1, "existing": 2}
+        assert (await db.async_get_model_by_name("Acme AS-400M"))["p_stc"] == 400.0
+        assert (await db.async_get_model_by_name("Acme AS-300P"))["p_stc"] == 300.0
+
+        summary = await async_import_catalogue(hass, db, str(path), overwrite=True, batch_size=4)
+        assert summary == {"imported": 0, "updated": 5, "invalid": 1, "duplicates": 1, "existing": 0}
+        assert (await db.async_get_model_by_name("Acme AS-400M"))["p_stc"] == 401.0
+        assert not db.catalogue.dirty
+
+    asyncio.run(scenario())
@@ -0,0 +1,61 @@
+"""Tests for the hot-path instrumentation of the update handlers."""
+from types import SimpleNamespace
+
+import pytest
+from homeassistant.core import Context, Event, HassJob, HassJobType, State
+from homeassistant.helpers.entity import Entity
+
+from custom_components.accurate_solar_forecast.const import (
+    CONF_INSTRUMENTATION,
+    CONF_REAL_PRODUCTION_SENSOR,
+    CONF_REF_SENSOR,
+    CONF_SENSOR_GROUP_NAME,
+    CONF_STRING_NAME,
+    DOMAIN,
+)
+from custom_components.accurate_solar_forecast.instrumentation import get_instrumentation
+from custom_components.accurate_solar_forecast.pv_database import DEFAULT_SETTINGS
+from custom_components.accurate_solar_forecast.sensor import (
+    SensorGroupVirtualSensor,
+    SolarStringPerformanceSensor,
+)
+
+
+def _hass(enabled):
+    settings = {**DEFAULT_SETTINGS, CONF_INSTRUMENTATION: enabled}
+    db = SimpleNamespace(settings=settings)
+    states = {"sensor.irr": State("sensor.irr", "800")}
+    return SimpleNamespace(data={DOMAIN: {"db": db}}, states=states), db
+
+
+def _sensors(enabled):
+    hass, db = _hass(enabled)
+    group_entry = SimpleNamespace(entry_id="group", data={CONF_SENSOR_GROUP_NAME: "Grupo", CONF_REF_SENSOR: "sensor.irr"})
+    group = SensorGroupVirtualSensor(hass, group_entry, db=db)
+    performance = SolarStringPerformanceSensor(
+        hass, {CONF_STRING_NAME: "S1", CONF_REAL_PRODUCTION_SENSOR: "sensor.real"}, db, {}
+    )
+    return hass, group, performance
+
+
+@pytest.mark.parametrize("enabled", [False, True])
+def test_instrumented_handlers_stay_callbacks(enabled):
+    _, group, performance = _sensors(enabled)
+    for handler in (group._update_state, performance._update_state, performance._handle_real_change):
+        assert HassJob(handler).job_type is HassJobType.Callback
+
+
+def test_handler_latency_and_event_to_write_lag(monkeypatch):
+    hass, group, _ = _sensors(True)
+    writes = []
+    # Sin plataforma: solo interesa que la escritura pase por la medición
+    monkeypatch.setattr(Entity, "async_write_ha_state", lambda self: writes.append(self))
+
+    group._update_state(Event("state_changed", {"new_state": hass.states["sensor.irr"]}, context=Context()))
+
+    metrics = get_instrumentation(hass).handlers["sensor_group_update"]
+    assert metrics.calls == 1
+    assert metrics.latency.count == 1
+    assert writes == [group]
+    assert metrics.writes == 1
+    assert metrics.lag.count == 1
@@ -0,0 +1,49 @@
+"""Quantized solar position cache."""
+import numpy as np
+import pytest
+
+from custom_components.accurate_solar_forecast.solar_position import SolarPositionCache, solar_position
+
+MADRID = (40.4168, -3.7038, 650)
+NOON = 1718964000 # 2024-06-21 10:00 UTC
+
+
+def test_timestamps_share_the_quantized_instant():
+    cache = SolarPositionCache(*MADRID, step=10)
+
+    first = cache.position(NOON + 1.2)
+    second = cache.position(NOON + 4.9)
+    third = cache.position(NOON + 5.1)
+
+    assert cache.quantize(NOON + 4.9) == NOON
+    assert cache.quantize(NOON + 5.1) == NOON + 10
+    assert second is first
+    assert first == pytest.approx(solar_position(float(NOON), *MADRID))
+    assert third != first
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_vectorized_lookup_counts_and_matches_scalar():
+    cache = SolarPositionCache(*MADRID, step=900)
+    cache.position(NOON)
+
+    timestamps = np.array([NOON, NOON + 100, NOON + 900, NOON + 1800, NOON + 1850], dtype=np.float64)
+    azimuths, elevations = cache.positions(timestamps)
+
+    # Solo NOON + 900 y NOON + 1800 faltan; NOON + 1850 reutiliza el instante calculado en la misma llamada
+    assert (cache.hits, cache.misses) == (3, 3)
+    for ts, azimuth, elevation in zip(timestamps.tolist(), azimuths, elevations):
+        assert (azimuth, elevation) == pytest.approx(solar_position(float(cache.quantize(ts)), *MADRID))
+
+
+def test_lru_is_bounded_and_clear_resets_counters():
+    cache = SolarPositionCache(*MADRID, step=10, maxsize=3)
+    for index in range(5):
+        cache.position(NOON + index * 10)
+
+    assert cache.stats()["size"] == 3
+    cache.position(NOON) # expulsado: se vuelve a calcular
+    assert cache.misses == 6
+
+    cache.clear()
+    assert cache.stats() == {"step": 10, "size": 0, "maxsize": 3, "hits": 0, "misses": 0, "hit_ratio": None}
@@ -0,0 +1,46 @@
+"""Tests for the deadband/heartbeat state write filter."""
+import asyncio
+
+from benchmarks.fake_hass import FakeHass
+from custom_components.accurate_solar_forecast.const import CONF_HEARTBEAT
+from custom_components.accurate_solar_forecast.write_filter import StateWriteFilter
+
+
+def test_deadband_suppresses_small_changes():
+    write_filter = StateWriteFilter({CONF_HEARTBEAT: 0})
+    assert write_filter.should_write(1000.0)
+    assert not write_filter.should_write(1005.0)
+    assert write_filter.should_write(1020.0)
+    assert (write_filter.written, write_filter.suppressed) == (2, 1)
+
+
+def test_heartbeat_flushes_suppressed_value_without_further_input(tmp_path):
+    async def scenario():
+        hass = FakeHass(str(tmp_path))
+        write_filter = StateWriteFilter({CONF_HEARTBEAT: 0.2})
+        published = []
+        state = {"value": 1000.0}
+        stop = write_filter.async_start(hass, lambda: published.append(state["value"]))
+
+        assert write_filter.should_write(state["value"], {"irradiancia": 810.0})
+        state["value"] = 1004.0
+        assert not write_filter.should_write(state["value"], {"irradiancia": 812.0})
+        # No llega ninguna entrada más: el latido publica el último valor suprimido
+        await asyncio.sleep(0.3)
+        assert published == [1004.0]
+        assert write_filter.written == 2
+
+        # Una escritura real cancela el latido pendiente
+        assert not write_filter.should_write(1006.0, {"irradiancia": 815.0})
+        assert write_filter.should_write(2000.0, {"irradiancia": 900.0})
+        await asyncio.sleep(0.3)
+        assert published == [1004.0]
+
+        # Al retirar la entidad tampoco se publica nada
+        assert write_filter.should_write(3000.0, {"irradiancia": 950.0})
+        assert not write_filter.should_write(3005.0, {"irradiancia": 951.0})
+        stop()
+        await asyncio.sleep(0.3)
+        assert published == [1004.0]
+
+    asyncio.run(scenario())